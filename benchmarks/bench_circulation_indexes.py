@@ -0,0 +1,154 @@
+"""Benchmark des index de circulation (migration 7c2d4e8a9b10).
+
+Génère un jeu de données synthétique (1 000 000 d'emprunts par défaut) dans une
+base SQLite, puis affiche le plan d'exécution et le temps des requêtes chaudes
+avant et après la création des index composites.
+
+Usage :
+    python benchmarks/bench_circulation_indexes.py [--emprunts 1000000] [--db /tmp/bench.sqlite]
+"""
+import argparse
+import os
+import random
+import sqlite3
+import time
+from datetime import datetime, timedelta
+
+# Mêmes index que la migration 7c2d4e8a9b10 et les __table_args__ des modèles
+INDEXES = [
+    "CREATE INDEX ix_emprunt_adherent_retour ON emprunt (adherent_id, date_retour_effective, date_retour_prevue)",
+    "CREATE INDEX ix_emprunt_livre_retour ON emprunt (livre_id, date_retour_effective)",
+    "CREATE INDEX ix_emprunt_retour_prevue ON emprunt (date_retour_effective, date_retour_prevue)",
+    "CREATE INDEX ix_emprunt_date_emprunt ON emprunt (date_emprunt)",
+    "CREATE INDEX ix_reservation_status_date ON reservation (status, date_reservation)",
+    "CREATE INDEX ix_reservation_adherent_livre_status ON reservation (adherent_id, livre_id, status)",
+    "CREATE INDEX ix_livre_titre_id ON livre (titre, id)",
+    "CREATE INDEX ix_livre_disponible_titre ON livre (disponible, titre, id)",
+    "CREATE INDEX ix_livre_categorie_titre ON livre (categorie, titre, id)",
+]
+
+CATEGORIES = ['Littérature', 'Sciences', 'Histoire', 'Fantasy', 'Science-Fiction', 'Philosophie']
+
+NOW = datetime(2026, 10, 18, 12, 0, 0)
+
+QUERIES = [
+    ("Emprunts en retard d'un adhérent",
+     "SELECT COUNT(*) FROM emprunt WHERE adherent_id = ? AND date_retour_effective IS NULL AND date_retour_prevue < ?",
+     lambda a: (a['adherent_id'], NOW.isoformat(' '))),
+    ("Emprunt actif d'un livre",
+     "SELECT id FROM emprunt WHERE livre_id = ? AND date_retour_effective IS NULL LIMIT 1",
+     lambda a: (a['livre_id'],)),
+    ("Retards globaux",
+     "SELECT COUNT(*) FROM emprunt WHERE date_retour_effective IS NULL AND date_retour_prevue < ?",
+     lambda a: (NOW.isoformat(' '),)),
+    ("Emprunts des 7 derniers jours",
+     "SELECT COUNT(*) FROM emprunt WHERE date_emprunt >= ?",
+     lambda a: ((NOW - timedelta(days=7)).isoformat(' '),)),
+    ("Réservations actives récentes",
+     "SELECT id FROM reservation WHERE status = 'active' ORDER BY date_reservation DESC LIMIT 50",
+     lambda a: ()),
+    ("Réservation active existante",
+     "SELECT id FROM reservation WHERE adherent_id = ? AND livre_id = ? AND status = 'active' LIMIT 1",
+     lambda a: (a['adherent_id'], a['livre_id'])),
+    ("Livres disponibles par titre",
+     "SELECT id, titre FROM livre WHERE disponible = 1 ORDER BY titre, id LIMIT 24",
+     lambda a: ()),
+    ("Catalogue par catégorie",
+     "SELECT id, titre FROM livre WHERE categorie = ? ORDER BY titre, id LIMIT 24",
+     lambda a: ('Histoire',)),
+]
+
+
+def create_schema(conn):
+    conn.executescript("""
+        CREATE TABLE adherent (id INTEGER PRIMARY KEY, nom TEXT, prenom TEXT, email TEXT UNIQUE, classe TEXT);
+        CREATE TABLE livre (id INTEGER PRIMARY KEY, titre TEXT, auteur TEXT, isbn TEXT UNIQUE,
+                            categorie TEXT, disponible INTEGER);
+        CREATE TABLE emprunt (id INTEGER PRIMARY KEY, adherent_id INTEGER, livre_id INTEGER,
+                              date_emprunt TEXT, date_retour_prevue TEXT, date_retour_effective TEXT,
+                              status TEXT, prolongations INTEGER, amende REAL);
+        CREATE TABLE reservation (id INTEGER PRIMARY KEY, adherent_id INTEGER, livre_id INTEGER,
+                                  date_reservation TEXT, status TEXT);
+    """)
+
+
+def populate(conn, nb_emprunts, nb_adherents, nb_livres, nb_reservations):
+    rng = random.Random(42)
+    conn.executemany(
+        "INSERT INTO adherent (id, nom, prenom, email, classe) VALUES (?, ?, ?, ?, ?)",
+        ((i, f'Nom{i}', f'Prenom{i}', f'adherent{i}@example.org', f'C{i % 40}') for i in range(1, nb_adherents + 1))
+    )
+    conn.executemany(
+        "INSERT INTO livre (id, titre, auteur, isbn, categorie, disponible) VALUES (?, ?, ?, ?, ?, ?)",
+        ((i, f'Titre {rng.randrange(10 ** 6):06d}', f'Auteur {i % 5000}', f'{9780000000000 + i}',
+          rng.choice(CATEGORIES), int(rng.random() > 0.2)) for i in range(1, nb_livres + 1))
+    )
+
+    def emprunts():
+        for i in range(1, nb_emprunts + 1):
+            debut = NOW - timedelta(days=rng.randrange(3 * 365), minutes=rng.randrange(1440))
+            prevue = debut + timedelta(days=14)
+            # ~2 % des emprunts sont encore en cours
+            effective = None if rng.random() < 0.02 else debut + timedelta(days=rng.randrange(20))
+            yield (i, rng.randrange(1, nb_adherents + 1), rng.randrange(1, nb_livres + 1),
+                   debut.isoformat(' '), prevue.isoformat(' '),
+                   effective.isoformat(' ') if effective else None,
+                   'en_cours' if effective is None else 'retourne', 0, 0.0)
+
+    conn.executemany("INSERT INTO emprunt VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", emprunts())
+    conn.executemany(
+        "INSERT INTO reservation VALUES (?, ?, ?, ?, ?)",
+        ((i, rng.randrange(1, nb_adherents + 1), rng.randrange(1, nb_livres + 1),
+          (NOW - timedelta(days=rng.randrange(365))).isoformat(' '),
+          rng.choice(['active', 'fulfilled', 'cancelled'])) for i in range(1, nb_reservations + 1))
+    )
+    conn.commit()
+
+
+def run_queries(conn, label, sample):
+    print(f"\n===== {label} =====")
+    for name, sql, params in QUERIES:
+        args = params(sample)
+        plan = [row[-1] for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}", args)]
+        start = time.perf_counter()
+        for _ in range(5):
+            conn.execute(sql, args).fetchall()
+        elapsed_ms = (time.perf_counter() - start) / 5 * 1000
+        print(f"- {name}: {elapsed_ms:.2f} ms")
+        for step in plan:
+            print(f"    {step}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--emprunts', type=int, default=1_000_000)
+    parser.add_argument('--adherents', type=int, default=30_000)
+    parser.add_argument('--livres', type=int, default=200_000)
+    parser.add_argument('--reservations', type=int, default=100_000)
+    parser.add_argument('--db', default=':memory:')
+    args = parser.parse_args()
+
+    if args.db != ':memory:' and os.path.exists(args.db):
+        os.remove(args.db)
+    conn = sqlite3.connect(args.db)
+    create_schema(conn)
+
+    start = time.perf_counter()
+    populate(conn, args.emprunts, args.adherents, args.livres, args.reservations)
+    print(f"Jeu de données : {args.emprunts} emprunts, {args.adherents} adhérents, {args.livres} livres "
+          f"({time.perf_counter() - start:.1f} s)")
+
+    sample = {'adherent_id': args.adherents // 2, 'livre_id': args.livres // 2}
+    conn.execute("ANALYZE")
+    run_queries(conn, "AVANT (clés primaires et uniques seulement)", sample)
+
+    start = time.perf_counter()
+    for ddl in INDEXES:
+        conn.execute(ddl)
+    conn.execute("ANALYZE")
+    print(f"\nCréation des index : {time.perf_counter() - start:.1f} s")
+    run_queries(conn, "APRÈS (index composites)", sample)
+
+
+if __name__ == '__main__':
+    main()
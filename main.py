@@ -1,24 +1,58 @@
-from flask import Flask, render_template, request, redirect, url_for, flash, session, current_app, Response
+from flask import Flask, render_template, request, redirect, url_for, flash, session, current_app, Response, g, stream_with_context, send_file
 from flask_sqlalchemy import SQLAlchemy
-from sqlalchemy import text, inspect
+from sqlalchemy import text, inspect, event
+from sqlalchemy.orm import Session as SASession, object_session, joinedload, selectinload, contains_eager
 from sqlalchemy.exc import IntegrityError
+from sqlalchemy.dialects import mysql as mysql_dialect, postgresql as postgresql_dialect, sqlite as sqlite_dialect
 from flask_login import LoginManager, UserMixin, login_user, login_required, logout_user, current_user
 from werkzeug.security import generate_password_hash, check_password_hash
 from datetime import datetime, timedelta, date
+from decimal import Decimal
 import os
 from werkzeug.utils import secure_filename
 from flask_migrate import Migrate
 import uuid
 import logging
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed, BrokenExecutor
+from types import SimpleNamespace
 import random
 import smtplib
 from email.message import EmailMessage
 import re
+import json
+import base64
+import hashlib
+import tempfile
+import shutil
+import math
+import heapq
+import bisect
+import unicodedata
 from functools import wraps
+from contextlib import contextmanager
+import click
 import csv
+import zipfile
 from io import StringIO
 import io
 
+try:
+    import fcntl  # verrou inter-processus (absent sous Windows)
+except ImportError:
+    fcntl = None
+
+try:
+    from pypdf import PdfReader  # extraction du texte des PDF (optionnel)
+except ImportError:
+    PdfReader = None
+
+try:
+    from PIL import Image as PILImage, ImageOps  # vignettes de couverture (Pillow, optionnel)
+except ImportError:
+    PILImage = None
+
 # Ajout des imports pour ReportLab (PDF)
 from reportlab.lib.pagesizes import letter, A4
 from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, Image
@@ -36,7 +70,7 @@ login_manager.init_app(app)
 login_manager.login_view = 'login'
 
 # Configuration de la base de données
-app.config['SQLALCHEMY_DATABASE_URI'] = 'mysql://root:@localhost/bibliotheque'
+app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('DATABASE_URL', 'mysql://root:@localhost/bibliotheque')
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 app.config['SECRET_KEY'] = 'votre_cle_secrete'
 
@@ -49,7 +83,9 @@ app.config['MAIL_USE_TLS'] = os.environ.get('MAIL_USE_TLS', '1') in ('1', 'True'
 app.config['EMAIL_FROM'] = os.environ.get('EMAIL_FROM', app.config['MAIL_USERNAME'])
 
 # Configuration des uploads
-UPLOAD_FOLDER = "static/livres/"
+# Les PDF des livres restent hors de static/ : ils ne sont servis que par `lire_pdf`
+UPLOAD_FOLDER = os.environ.get('UPLOAD_FOLDER', "livres/")
+ANCIEN_UPLOAD_FOLDER = "static/livres/"
 COUVERTURE_FOLDER = "static/images/couvertures/"
 PROFILE_FOLDER = "static/uploads/profiles/"
 
@@ -57,10 +93,34 @@ app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 app.config['COUVERTURE_FOLDER'] = COUVERTURE_FOLDER
 app.config['PROFILE_FOLDER'] = PROFILE_FOLDER
 
+# Livraison des PDF (route `lire_pdf`) : vide = Flask/Werkzeug sert le fichier (Range + sendfile
+# via wsgi.file_wrapper) ; 'x-accel' = nginx (X-Accel-Redirect vers PDF_ACCEL_PREFIX, location
+# `internal`) ; 'x-sendfile' = Apache/lighttpd (X-Sendfile).
+app.config['PDF_OFFLOAD'] = os.environ.get('PDF_OFFLOAD', '').lower()
+app.config['PDF_ACCEL_PREFIX'] = os.environ.get('PDF_ACCEL_PREFIX', '/protected/livres/')
+app.config['USE_X_SENDFILE'] = app.config['PDF_OFFLOAD'] == 'x-sendfile'
+
 # Créer les dossiers s'ils n'existent pas
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 os.makedirs(COUVERTURE_FOLDER, exist_ok=True)
 os.makedirs(PROFILE_FOLDER, exist_ok=True)
+os.makedirs(app.instance_path, exist_ok=True)
+
+# PDF déposés sous l'ancien emplacement public : les déplacer une fois vers UPLOAD_FOLDER
+if os.path.isdir(ANCIEN_UPLOAD_FOLDER):
+    for _nom in os.listdir(ANCIEN_UPLOAD_FOLDER):
+        _source = os.path.join(ANCIEN_UPLOAD_FOLDER, _nom)
+        if os.path.isfile(_source) and not os.path.exists(os.path.join(UPLOAD_FOLDER, _nom)):
+            try:
+                shutil.move(_source, os.path.join(UPLOAD_FOLDER, _nom))
+            except OSError:
+                # Un autre processus l'a déjà déplacé, ou droits insuffisants
+                app.logger.warning(f'Impossible de déplacer {_source} vers {UPLOAD_FOLDER}')
+
+# Fichiers témoins partagés entre les workers : leur date de modification sert de
+# numéro de version pour invalider les caches en mémoire (paramètres, état admin).
+CONFIG_VERSION_FILE = os.path.join(app.instance_path, 'config_version')
+ADMIN_VERSION_FILE = os.path.join(app.instance_path, 'admin_version')
 
 # Initialisation de SQLAlchemy
 db = SQLAlchemy(app)
@@ -72,17 +132,58 @@ def load_user(user_id):
     return User.query.get(int(user_id))
 
 
+class LazyQueryList:
+    """Liste paresseuse exposée aux templates.
+
+    La requête n'est exécutée qu'au premier accès (itération, `length`, test
+    booléen...) puis mémorisée dans `g` pour toute la durée de la requête HTTP,
+    de sorte que les pages qui n'ouvrent jamais les modals ne paient rien.
+    """
+
+    def __init__(self, key, loader):
+        self._key = key
+        self._loader = loader
+
+    def _load(self):
+        cache = g.setdefault('_lazy_query_lists', {})
+        if self._key not in cache:
+            try:
+                cache[self._key] = self._loader()
+            except Exception:
+                current_app.logger.exception(f'Erreur chargement paresseux de {self._key}')
+                cache[self._key] = []
+        return cache[self._key]
+
+    def __iter__(self):
+        return iter(self._load())
+
+    def __len__(self):
+        return len(self._load())
+
+    def __bool__(self):
+        return bool(self._load())
+
+    def __getitem__(self, index):
+        return self._load()[index]
+
+    def __contains__(self, item):
+        return item in self._load()
+
+
 @app.context_processor
 def inject_global_adherents_livres():
     """Fournit automatiquement `adherents`, `livres` (disponibles) et `today`
     à tous les templates afin que les modals et menus aient accès aux données.
+    Les listes sont paresseuses : elles ne sont chargées que si le template les utilise.
     """
-    try:
-        adherents = Adherent.query.order_by(Adherent.nom, Adherent.prenom).all()
-        livres = Livre.query.filter_by(disponible=True).order_by(Livre.titre).all()
-    except Exception:
-        adherents = []
-        livres = []
+    adherents = LazyQueryList(
+        'adherents',
+        lambda: Adherent.query.order_by(Adherent.nom, Adherent.prenom).all()
+    )
+    livres = LazyQueryList(
+        'livres_disponibles',
+        lambda: Livre.query.filter_by(disponible=True).order_by(Livre.titre).all()
+    )
     today = datetime.utcnow().date()
     # Récupérer les paramètres de la bibliothèque (pour exposer p.ex. le montant de l'amende)
     try:
@@ -100,30 +201,8 @@ def inject_global_adherents_livres():
     try:
         if current_user.is_authenticated:
             adherent_id = getattr(current_user, 'adherent_id', None) or current_user.id
-            # Mettre à jour les amendes pour les emprunts en retard
-            now = datetime.utcnow()
-            overdues = Emprunt.query.filter(
-                Emprunt.adherent_id == adherent_id,
-                Emprunt.date_retour_effective == None,
-                Emprunt.date_retour_prevue < now
-            ).all()
-            updated = False
-            cfg = get_library_config()
-            for od in overdues:
-                ret_prevue = _to_date(od.date_retour_prevue)
-                days_late = (now.date() - ret_prevue).days if ret_prevue is not None else 0
-                new_amende = cfg.amende_par_jour * days_late if days_late > 0 else 0.0
-                if (od.amende or 0.0) != new_amende:
-                    od.amende = new_amende
-                    updated = True
-            if updated:
-                try:
-                    db.session.commit()
-                except Exception:
-                    db.session.rollback()
-
-            total_amende_user = db.session.query(db.func.coalesce(db.func.sum(Emprunt.amende), 0.0)).filter(Emprunt.adherent_id == adherent_id).scalar() or 0.0
-            retards_user = len(overdues)
+            # Lecture seule : les amendes sont tenues à jour par le moteur d'amendes
+            total_amende_user, retards_user = solde_adherent(adherent_id)
     except Exception:
         current_app.logger.exception('Erreur calcul amendes global')
 
@@ -201,6 +280,8 @@ class Adherent(db.Model):
     classe = db.Column(db.String(50))
     statut = db.Column(db.String(20), default='Actif')
     date_inscription = db.Column(db.DateTime, default=datetime.utcnow)
+    # Suivi des modifications pour les sauvegardes incrémentales
+    date_modification = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)
     emprunts = db.relationship('Emprunt', backref='adherent', lazy=True)
 
 
@@ -237,8 +318,17 @@ class Livre(db.Model):
     contenu_pdf = db.Column(db.String(255))
     image_couverture = db.Column(db.String(255))
     disponible = db.Column(db.Boolean, default=True)
+    # Suivi des modifications pour les sauvegardes incrémentales
+    date_modification = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)
     emprunts = db.relationship('Emprunt', backref='livre', lazy=True)
 
+    __table_args__ = (
+        # Parcours du catalogue (pagination par clé titre, id) filtré par disponibilité ou catégorie
+        db.Index('ix_livre_titre_id', 'titre', 'id'),
+        db.Index('ix_livre_disponible_titre', 'disponible', 'titre', 'id'),
+        db.Index('ix_livre_categorie_titre', 'categorie', 'titre', 'id'),
+    )
+
 class Emprunt(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     adherent_id = db.Column(db.Integer, db.ForeignKey('adherent.id'), nullable=False)
@@ -249,55 +339,1767 @@ class Emprunt(db.Model):
     status = db.Column(db.String(20), default='en_cours')
     prolongations = db.Column(db.Integer, default=0)
     amende = db.Column(db.Float, default=0.0)
+    # Suivi des modifications pour les sauvegardes incrémentales
+    date_modification = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)
+
+    __table_args__ = (
+        # Emprunts actifs / en retard d'un adhérent (éligibilité, amendes, tableau de bord)
+        db.Index('ix_emprunt_adherent_retour', 'adherent_id', 'date_retour_effective', 'date_retour_prevue'),
+        # Emprunt actif d'un livre
+        db.Index('ix_emprunt_livre_retour', 'livre_id', 'date_retour_effective'),
+        # Retards globaux et moteur d'amendes
+        db.Index('ix_emprunt_retour_prevue', 'date_retour_effective', 'date_retour_prevue'),
+        # Statistiques par période
+        db.Index('ix_emprunt_date_emprunt', 'date_emprunt'),
+    )
+
+class Reservation(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    adherent_id = db.Column(db.Integer, db.ForeignKey('adherent.id'), nullable=False)
+    livre_id = db.Column(db.Integer, db.ForeignKey('livre.id'), nullable=False)
+    date_reservation = db.Column(db.DateTime, default=datetime.utcnow)
+    status = db.Column(db.String(20), default='active')
+    # Suivi des modifications pour les sauvegardes incrémentales
+    date_modification = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)
+
+    adherent = db.relationship('Adherent', backref='reservations')
+    livre = db.relationship('Livre', backref='reservations')
+
+    __table_args__ = (
+        db.Index('ix_reservation_status_date', 'status', 'date_reservation'),
+        db.Index('ix_reservation_adherent_livre_status', 'adherent_id', 'livre_id', 'status'),
+    )
+
+
+class Configuration(db.Model):
+    """Singleton table pour stocker les paramètres de la bibliothèque."""
+    id = db.Column(db.Integer, primary_key=True)
+    max_emprunts = db.Column(db.Integer, default=3)
+    duree_emprunt = db.Column(db.Integer, default=14)
+    max_prolongations = db.Column(db.Integer, default=2)
+    jours_prolongation = db.Column(db.Integer, default=7)
+    amende_par_jour = db.Column(db.Float, default=0.5)
+
+
+CONFIG_FIELDS = ('max_emprunts', 'duree_emprunt', 'max_prolongations', 'jours_prolongation', 'amende_par_jour')
+_config_cache = {'values': None, 'version': None}
+_config_lock = threading.Lock()
+
+
+def get_configuration_row():
+    """Retourne la ligne `Configuration` (créée si absente). À utiliser pour modifier les paramètres."""
+    cfg = Configuration.query.first()
+    if not cfg:
+        cfg = Configuration()
+        try:
+            db.session.add(cfg)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+    return cfg
+
+
+def _file_version(path):
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+
+def _touch_version_file(path):
+    try:
+        with open(path, 'w') as f:
+            f.write(uuid.uuid4().hex)
+    except OSError:
+        current_app.logger.exception(f'Impossible de mettre à jour le fichier de version {path}')
+
+
+def get_library_config():
+    """Retourne les paramètres de la bibliothèque (lecture seule) depuis un cache en mémoire.
+
+    Le cache est rechargé quand le fichier témoin `CONFIG_VERSION_FILE` change,
+    ce qui propage l'invalidation à tous les workers sans requête SQL.
+    """
+    version = _file_version(CONFIG_VERSION_FILE)
+    values = _config_cache['values']
+    if values is not None and _config_cache['version'] == version:
+        return values
+    with _config_lock:
+        cfg = get_configuration_row()
+        values = SimpleNamespace(**{field: getattr(cfg, field) for field in CONFIG_FIELDS})
+        _config_cache['values'] = values
+        _config_cache['version'] = version
+    return values
+
+
+def invalidate_library_config():
+    """Invalide le cache des paramètres dans ce processus et dans les autres workers."""
+    with _config_lock:
+        _config_cache['values'] = None
+        _touch_version_file(CONFIG_VERSION_FILE)
+
+
+_admin_cache = {'exists': None, 'version': None}
+
+
+def get_admin_exists():
+    """Indique si un compte administrateur existe, depuis un cache en mémoire.
+
+    L'état n'est relu en base que lorsque `ADMIN_VERSION_FILE` change, c'est-à-dire
+    après la création ou la suppression d'un administrateur (voir les événements ci-dessous).
+    """
+    version = _file_version(ADMIN_VERSION_FILE)
+    if _admin_cache['exists'] is not None and _admin_cache['version'] == version:
+        return _admin_cache['exists']
+    exists = db.session.query(User.query.filter_by(role='admin').exists()).scalar()
+    _admin_cache['exists'] = bool(exists)
+    _admin_cache['version'] = version
+    return _admin_cache['exists']
+
+
+def invalidate_admin_exists():
+    _admin_cache['exists'] = None
+    _touch_version_file(ADMIN_VERSION_FILE)
+
+
+def _flag_admin_change(target):
+    session = object_session(target)
+    if session is not None:
+        session.info['admin_state_changed'] = True
+
+
+@event.listens_for(User, 'after_insert')
+@event.listens_for(User, 'after_delete')
+def _user_admin_inserted_or_deleted(mapper, connection, target):
+    if target.role == 'admin':
+        _flag_admin_change(target)
+
+
+@event.listens_for(User, 'after_update')
+def _user_admin_updated(mapper, connection, target):
+    if inspect(target).attrs.role.history.has_changes():
+        _flag_admin_change(target)
+
+
+@event.listens_for(SASession, 'after_commit')
+def _refresh_admin_state_after_commit(session):
+    if session.info.pop('admin_state_changed', False):
+        invalidate_admin_exists()
+
+
+@event.listens_for(SASession, 'after_rollback')
+def _discard_admin_state_after_rollback(session):
+    session.info.pop('admin_state_changed', None)
+
+
+def _to_date(dt):
+    """Return a date object for a datetime/date-like value or None.
+    Safe helper to handle both datetime and date instances.
+    """
+    if dt is None:
+        return None
+    try:
+        if isinstance(dt, datetime):
+            return dt.date()
+        if isinstance(dt, date):
+            return dt
+        # Fallback: try calling .date() (some DB objects behave like datetimes)
+        return dt.date()
+    except Exception:
+        return None
+
+
+def _jours_retard_expr(reference_date):
+    """Expression SQL du nombre de jours entre `date_retour_prevue` et `reference_date`,
+    adaptée au dialecte de la base (MySQL en production, SQLite en développement).
+    """
+    dialect = db.engine.dialect.name
+    if dialect == 'sqlite':
+        return db.cast(
+            db.func.julianday(reference_date) - db.func.julianday(db.func.date(Emprunt.date_retour_prevue)),
+            db.Integer
+        )
+    if dialect == 'postgresql':
+        return reference_date - db.cast(Emprunt.date_retour_prevue, db.Date)
+    return db.func.datediff(reference_date, Emprunt.date_retour_prevue)
+
+
+def recalculer_amendes(adherent_id=None):
+    """Moteur d'amendes : recalcule toutes les amendes des emprunts en retard
+    en un seul UPDATE ensembliste, puis valide la transaction.
+
+    Appelé une fois par jour (commande `flask recalculer-amendes`) ou à la
+    demande ; les pages se contentent de lire le solde stocké.
+    Retourne le nombre d'emprunts dont l'amende a changé.
+    """
+    cfg = get_library_config()
+    now = datetime.utcnow()
+    nouvelle_amende = cfg.amende_par_jour * _jours_retard_expr(now.date())
+    query = Emprunt.query.filter(
+        Emprunt.date_retour_effective == None,
+        Emprunt.date_retour_prevue < now,
+        db.or_(Emprunt.amende == None, Emprunt.amende != nouvelle_amende)
+    )
+    if adherent_id is not None:
+        query = query.filter(Emprunt.adherent_id == adherent_id)
+    try:
+        updated = query.update({Emprunt.amende: nouvelle_amende}, synchronize_session=False)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return updated
+
+
+def solde_adherent(adherent_id):
+    """Lecture seule : retourne (total des amendes stockées, nombre d'emprunts en retard)
+    pour un adhérent, en une seule requête agrégée.
+    """
+    now = datetime.utcnow()
+    total_amende, retards = db.session.query(
+        db.func.coalesce(db.func.sum(Emprunt.amende), 0.0),
+        db.func.coalesce(db.func.sum(db.case(
+            (db.and_(Emprunt.date_retour_effective == None, Emprunt.date_retour_prevue < now), 1),
+            else_=0
+        )), 0)
+    ).filter(Emprunt.adherent_id == adherent_id).one()
+    return float(total_amende or 0.0), int(retards or 0)
+
+
+@app.cli.command('recalculer-amendes')
+def recalculer_amendes_command():
+    """Recalcule les amendes de tous les emprunts en retard (à planifier chaque jour)."""
+    updated = recalculer_amendes()
+    print(f'{updated} emprunt(s) mis à jour')
+
+# ============================================
+# RECHERCHE PLEIN TEXTE DU CATALOGUE
+# ============================================
+
+# Backend de recherche : 'auto' (FULLTEXT natif sous MySQL, index inversé en mémoire sinon),
+# 'mysql' ou 'memory'.
+app.config.setdefault('SEARCH_BACKEND', os.environ.get('SEARCH_BACKEND', 'auto'))
+# Recherche dans le texte des PDF : index FULLTEXT de `passage_pdf` sous MySQL. Ailleurs, elle
+# n'est faite que si PDF_RECHERCHE_LIKE est activé (LIKE sur tout le texte : développement et
+# petites collections seulement) ; sinon seules les métadonnées sont cherchées.
+app.config.setdefault('PDF_RECHERCHE_LIKE', os.environ.get('PDF_RECHERCHE_LIKE', '0') in ('1', 'True', 'true'))
+
+SEARCH_FIELDS = ('titre', 'auteur', 'resume', 'categorie')
+SEARCH_WEIGHTS = {'titre': 3.0, 'auteur': 2.0, 'categorie': 1.5, 'resume': 1.0}
+SEARCH_MAX_RESULTS = 1000
+SEARCH_MAX_PASSAGES = 200
+# Un terme couvre aussi les mots qu'il commence (« tolk » → « tolkien ») ; au plus
+# SEARCH_MAX_PREFIXES mots par terme, comptés à SEARCH_PREFIX_WEIGHT d'un mot exact.
+SEARCH_MAX_PREFIXES = 50
+SEARCH_PREFIX_WEIGHT = 0.5
+FULLTEXT_INDEX_NAME = 'ft_livre_recherche'
+
+
+def _normalize_search_text(value):
+    """Minuscules sans accents, pour que « Misérables » et « miserables » se correspondent."""
+    if not value:
+        return ''
+    decomposed = unicodedata.normalize('NFKD', str(value))
+    return ''.join(c for c in decomposed if not unicodedata.combining(c)).lower()
+
+
+def _tokenize(value):
+    return [t for t in re.findall(r'\w+', _normalize_search_text(value)) if len(t) > 1]
+
+
+class CatalogueSearchBackend:
+    """Interface commune des moteurs de recherche du catalogue.
+
+    `search()` retourne une liste de couples (livre_id, score) triée par pertinence décroissante.
+    """
+
+    def search(self, terms, limit=SEARCH_MAX_RESULTS):
+        raise NotImplementedError
+
+    def search_passages(self, terms, limit=SEARCH_MAX_PASSAGES):
+        """Passages de PDF contenant tous les termes : liste de (livre_id, page, texte).
+
+        Sans index FULLTEXT, seul un filtre LIKE sur le texte normalisé est possible (le volume
+        du texte intégral ne se prête pas à un index en mémoire) : il parcourt tous les passages,
+        aussi n'est-il utilisé que si PDF_RECHERCHE_LIKE est activé.
+        """
+        tokens = set(_tokenize(terms))
+        if not tokens or not app.config['PDF_RECHERCHE_LIKE']:
+            return []
+        query = db.session.query(PassagePdf.livre_id, PassagePdf.page, PassagePdf.texte)
+        for token in tokens:
+            query = query.filter(PassagePdf.texte_normalise.like(f'%{token}%'))
+        return query.order_by(PassagePdf.livre_id, PassagePdf.page, PassagePdf.position).limit(limit).all()
+
+    def index_livre(self, livre_id, values):
+        pass
+
+    def remove_livre(self, livre_id):
+        pass
+
+    def rebuild(self):
+        pass
+
+
+class MySQLFullTextBackend(CatalogueSearchBackend):
+    """Recherche via l'index FULLTEXT natif de MySQL, maintenu par la base à chaque écriture."""
+
+    def search(self, terms, limit=SEARCH_MAX_RESULTS):
+        # Mode booléen : chaque terme obligatoire et pris comme préfixe (`+tolk*`). Les termes
+        # ne contiennent que des caractères de mot, donc aucun opérateur booléen parasite.
+        tokens = _tokenize(terms)
+        if not tokens:
+            return []
+        match = "MATCH (titre, auteur, resume, categorie) AGAINST (:q IN BOOLEAN MODE)"
+        rows = db.session.execute(
+            text(f"SELECT id, {match} AS score FROM livre WHERE {match} ORDER BY score DESC LIMIT :limit"),
+            {'q': ' '.join(f'+{token}*' for token in tokens), 'limit': limit}
+        ).fetchall()
+        return [(row[0], float(row[1])) for row in rows]
+
+    def search_passages(self, terms, limit=SEARCH_MAX_PASSAGES):
+        # Même requête booléenne que `search` : tous les termes, chacun comme préfixe
+        tokens = _tokenize(terms)
+        if not tokens:
+            return []
+        match = "MATCH (texte) AGAINST (:q IN BOOLEAN MODE)"
+        rows = db.session.execute(
+            text(f"SELECT livre_id, page, texte FROM passage_pdf WHERE {match} ORDER BY {match} DESC LIMIT :limit"),
+            {'q': ' '.join(f'+{token}*' for token in tokens), 'limit': limit}
+        ).fetchall()
+        return [tuple(row) for row in rows]
+
+    def rebuild(self):
+        ensure_fulltext_index()
+
+
+class InMemorySearchBackend(CatalogueSearchBackend):
+    """Index inversé en mémoire, classement TF-IDF pondéré par champ.
+
+    Construit au premier usage puis tenu à jour par les événements SQLAlchemy
+    sur `Livre`. Chaque processus possède son propre index : ce backend convient
+    au développement (SQLite) ou à un déploiement mono-processus.
+    """
+
+    def __init__(self):
+        self._postings = {}
+        self._sorted_tokens = None
+        self._doc_tokens = {}
+        self._built = False
+        self._lock = threading.RLock()
+
+    def _ensure_built(self):
+        if not self._built:
+            self.rebuild()
+
+    def rebuild(self):
+        with self._lock:
+            self._postings = {}
+            self._doc_tokens = {}
+            self._sorted_tokens = None
+            columns = [Livre.id] + [getattr(Livre, field) for field in SEARCH_FIELDS]
+            for row in db.session.query(*columns).yield_per(1000):
+                self._add(row[0], dict(zip(SEARCH_FIELDS, row[1:])))
+            self._built = True
+
+    def _add(self, livre_id, values):
+        weights = {}
+        for field in SEARCH_FIELDS:
+            for token in _tokenize(values.get(field)):
+                weights[token] = weights.get(token, 0.0) + SEARCH_WEIGHTS[field]
+        for token, weight in weights.items():
+            self._postings.setdefault(token, {})[livre_id] = weight
+        self._doc_tokens[livre_id] = list(weights)
+        self._sorted_tokens = None
+
+    def remove_livre(self, livre_id):
+        with self._lock:
+            for token in self._doc_tokens.pop(livre_id, ()):
+                postings = self._postings.get(token)
+                if postings is not None:
+                    postings.pop(livre_id, None)
+                    if not postings:
+                        del self._postings[token]
+                        self._sorted_tokens = None
+
+    def index_livre(self, livre_id, values):
+        with self._lock:
+            if not self._built:
+                return
+            self.remove_livre(livre_id)
+            self._add(livre_id, values)
+
+    def _expand(self, token):
+        """Mots de l'index qui commencent par `token` (le mot exact d'abord), via la liste triée."""
+        if self._sorted_tokens is None:
+            self._sorted_tokens = sorted(self._postings)
+        start = bisect.bisect_left(self._sorted_tokens, token)
+        matches = []
+        for candidate in self._sorted_tokens[start:start + SEARCH_MAX_PREFIXES]:
+            if not candidate.startswith(token):
+                break
+            matches.append(candidate)
+        return matches
+
+    def search(self, terms, limit=SEARCH_MAX_RESULTS):
+        self._ensure_built()
+        with self._lock:
+            total_docs = max(len(self._doc_tokens), 1)
+            scores = {}
+            for token in set(_tokenize(terms)):
+                # Meilleure correspondance par livre pour ce terme (exacte ou préfixe)
+                best = {}
+                for candidate in self._expand(token):
+                    postings = self._postings[candidate]
+                    factor = math.log(1 + total_docs / len(postings))
+                    if candidate != token:
+                        factor *= SEARCH_PREFIX_WEIGHT
+                    for livre_id, weight in postings.items():
+                        best[livre_id] = max(best.get(livre_id, 0.0), weight * factor)
+                for livre_id, score in best.items():
+                    scores[livre_id] = scores.get(livre_id, 0.0) + score
+        return heapq.nlargest(limit, scores.items(), key=lambda item: item[1])
+
+
+_search_backend = None
+
+
+def get_search_backend():
+    global _search_backend
+    if _search_backend is None:
+        choice = app.config.get('SEARCH_BACKEND', 'auto')
+        if choice == 'auto':
+            choice = 'mysql' if db.engine.dialect.name == 'mysql' else 'memory'
+        _search_backend = MySQLFullTextBackend() if choice == 'mysql' else InMemorySearchBackend()
+    return _search_backend
+
+
+def ensure_fulltext_index():
+    """Crée les index FULLTEXT de recherche (`livre`, `passage_pdf`) s'ils manquent (MySQL uniquement)."""
+    if db.engine.dialect.name != 'mysql':
+        return
+    index_names = [i['name'] for i in inspect(db.engine).get_indexes('livre')]
+    if FULLTEXT_INDEX_NAME not in index_names:
+        db.session.execute(text(
+            f"ALTER TABLE livre ADD FULLTEXT INDEX {FULLTEXT_INDEX_NAME} (titre, auteur, resume, categorie)"
+        ))
+        db.session.commit()
+    index_names = [i['name'] for i in inspect(db.engine).get_indexes('passage_pdf')]
+    if PASSAGES_FULLTEXT_INDEX_NAME not in index_names:
+        db.session.execute(text(
+            f"ALTER TABLE passage_pdf ADD FULLTEXT INDEX {PASSAGES_FULLTEXT_INDEX_NAME} (texte)"
+        ))
+        db.session.commit()
+
+
+def search_livre_ids(terms):
+    """Retourne les identifiants des livres correspondant à `terms`, du plus au moins pertinent.
+
+    Les livres dont l'ISBN commence par les chiffres saisis (tirets et espaces ignorés), ou
+    égale leur forme ISBN-13 normalisée, sont placés en tête : préfixe et égalité sur la
+    colonne indexée, jamais de recherche par sous-chaîne.
+    """
+    ids = [livre_id for livre_id, _ in get_search_backend().search(terms)]
+    isbn = terms.replace('-', '').replace(' ', '').upper()
+    if re.fullmatch(r'[0-9X]{4,13}', isbn):
+        critere = Livre.isbn.like(f'{isbn}%')
+        try:
+            critere = db.or_(critere, Livre.isbn == normaliser_isbn(isbn))
+        except ValueError:
+            pass
+        isbn_ids = [row[0] for row in db.session.query(Livre.id).filter(critere).limit(50)]
+        deja = set(isbn_ids)
+        ids = isbn_ids + [i for i in ids if i not in deja]
+    return ids
+
+
+# Synchronisation de l'index avec les écritures sur `Livre` : on note les changements
+# au flush et on les applique après le commit (rien n'est indexé si la transaction échoue).
+def _queue_search_change(target, values):
+    session = object_session(target)
+    if session is not None:
+        session.info.setdefault('search_pending', {})[target.id] = values
+
+
+@event.listens_for(Livre, 'after_insert')
+@event.listens_for(Livre, 'after_update')
+def _livre_saved(mapper, connection, target):
+    _queue_search_change(target, {field: getattr(target, field) for field in SEARCH_FIELDS})
+
+
+@event.listens_for(Livre, 'after_delete')
+def _livre_deleted(mapper, connection, target):
+    _queue_search_change(target, None)
+
+
+@event.listens_for(SASession, 'after_commit')
+def _apply_search_changes_after_commit(session):
+    pending = session.info.pop('search_pending', None)
+    if not pending or _search_backend is None:
+        return
+    for livre_id, values in pending.items():
+        if values is None:
+            _search_backend.remove_livre(livre_id)
+        else:
+            _search_backend.index_livre(livre_id, values)
+
+
+@event.listens_for(SASession, 'after_rollback')
+def _discard_search_changes_after_rollback(session):
+    session.info.pop('search_pending', None)
+
+
+@app.cli.command('reindexer-catalogue')
+def reindexer_catalogue_command():
+    """Reconstruit l'index de recherche plein texte du catalogue."""
+    get_search_backend().rebuild()
+    print('Index de recherche reconstruit')
+
+
+# ============================================
+# FILE D'ENVOI DES EMAILS
+# ============================================
+# Les requêtes HTTP ne font qu'enregistrer les messages dans la table `email_en_attente` ;
+# un worker (thread du processus web, ou `flask envoyer-emails --continu` si
+# MAIL_QUEUE_WORKER=externe) les envoie en réutilisant une seule connexion SMTP.
+# Essai local sans vrai serveur : `python -m aiosmtpd -n -l localhost:1025` puis
+# MAIL_SERVER=localhost MAIL_PORT=1025 MAIL_USE_TLS=0 MAIL_PASSWORD= flask envoyer-emails
+
+app.config.setdefault('MAIL_QUEUE_WORKER', os.environ.get('MAIL_QUEUE_WORKER', 'thread'))
+
+MAIL_QUEUE_BATCH = 50
+MAIL_QUEUE_POLL_SECONDS = 5
+MAIL_QUEUE_MAX_TENTATIVES = 5
+MAIL_QUEUE_ENVOI_EXPIRE = timedelta(minutes=10)
+MAIL_SMTP_IDLE_SECONDS = 60
+
+
+class EmailEnAttente(db.Model):
+    """Email sortant en file d'attente (en_attente, envoi, envoye, echec)."""
+    __tablename__ = 'email_en_attente'
+    id = db.Column(db.Integer, primary_key=True)
+    destinataire = db.Column(db.String(120), nullable=False)
+    sujet = db.Column(db.String(255), nullable=False)
+    corps = db.Column(db.Text, nullable=False)
+    reply_to = db.Column(db.String(120))
+    status = db.Column(db.String(20), default='en_attente', nullable=False)
+    tentatives = db.Column(db.Integer, default=0)
+    derniere_erreur = db.Column(db.Text)
+    date_creation = db.Column(db.DateTime, default=datetime.utcnow)
+    prochain_essai = db.Column(db.DateTime, default=datetime.utcnow)
+    date_envoi = db.Column(db.DateTime)
+
+    __table_args__ = (
+        db.Index('ix_email_status_essai', 'status', 'prochain_essai'),
+    )
+
+
+def mettre_en_file_email(destinataire, sujet, corps, reply_to=None, commit=True):
+    """Ajoute un email à la file d'envoi.
+
+    Avec commit=False, le message est validé avec la transaction de l'appelant et
+    n'est donc envoyé que si celle-ci aboutit.
+    """
+    message = EmailEnAttente(destinataire=destinataire, sujet=sujet, corps=corps, reply_to=reply_to)
+    db.session.add(message)
+    db.session.info['mail_pending'] = True
+    if commit:
+        try:
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+    return message
+
+
+def _construire_email(message, config):
+    msg = EmailMessage()
+    msg['Subject'] = message.sujet
+    msg['From'] = config['EMAIL_FROM']
+    msg['To'] = message.destinataire
+    if message.reply_to:
+        msg['Reply-To'] = message.reply_to
+    msg.set_content(message.corps)
+    return msg
+
+
+class ConnexionSMTP:
+    """Connexion SMTP authentifiée réutilisée d'un message à l'autre.
+
+    Rouverte si le serveur l'a fermée ou après MAIL_SMTP_IDLE_SECONDS d'inactivité ;
+    l'authentification est omise si MAIL_USERNAME ou MAIL_PASSWORD est vide.
+    """
+
+    def __init__(self, config):
+        self.config = config
+        self._server = None
+        self._derniere_utilisation = 0.0
+
+    def _ouvrir(self):
+        server = smtplib.SMTP(self.config['MAIL_SERVER'], self.config['MAIL_PORT'], timeout=30)
+        if self.config['MAIL_USE_TLS']:
+            server.starttls()
+        if self.config.get('MAIL_USERNAME') and self.config.get('MAIL_PASSWORD'):
+            server.login(self.config['MAIL_USERNAME'], self.config['MAIL_PASSWORD'])
+        return server
+
+    def envoyer(self, msg):
+        self.fermer_si_inactive()
+        if self._server is None:
+            self._server = self._ouvrir()
+        try:
+            self._server.send_message(msg)
+        except smtplib.SMTPServerDisconnected:
+            self._server = self._ouvrir()
+            self._server.send_message(msg)
+        self._derniere_utilisation = time.monotonic()
+
+    def fermer_si_inactive(self):
+        if self._server is not None and time.monotonic() - self._derniere_utilisation > MAIL_SMTP_IDLE_SECONDS:
+            self.fermer()
+
+    def fermer(self):
+        if self._server is None:
+            return
+        try:
+            self._server.quit()
+        except Exception:
+            pass
+        self._server = None
+
+
+def envoyer_emails_en_attente(connexion, limite=MAIL_QUEUE_BATCH):
+    """Envoie un lot d'emails dus et retourne le nombre de messages traités.
+
+    Chaque message est d'abord réservé par un UPDATE conditionnel sur son statut,
+    si bien que plusieurs workers peuvent vider la même file sans doublon.
+    """
+    now = datetime.utcnow()
+    # Messages réservés par un worker qui s'est arrêté avant de les envoyer
+    EmailEnAttente.query.filter(
+        EmailEnAttente.status == 'envoi',
+        EmailEnAttente.prochain_essai < now - MAIL_QUEUE_ENVOI_EXPIRE
+    ).update({EmailEnAttente.status: 'en_attente'}, synchronize_session=False)
+    db.session.commit()
+
+    ids = [message_id for (message_id,) in db.session.query(EmailEnAttente.id).filter(
+        EmailEnAttente.status == 'en_attente',
+        EmailEnAttente.prochain_essai <= now
+    ).order_by(EmailEnAttente.id).limit(limite)]
+
+    traites = 0
+    for message_id in ids:
+        pris = EmailEnAttente.query.filter_by(id=message_id, status='en_attente').update(
+            {EmailEnAttente.status: 'envoi', EmailEnAttente.prochain_essai: datetime.utcnow()},
+            synchronize_session=False
+        )
+        db.session.commit()
+        if not pris:
+            continue
+
+        message = EmailEnAttente.query.get(message_id)
+        try:
+            connexion.envoyer(_construire_email(message, connexion.config))
+            message.status = 'envoye'
+            message.date_envoi = datetime.utcnow()
+            message.derniere_erreur = None
+        except Exception as e:
+            connexion.fermer()
+            message.tentatives = (message.tentatives or 0) + 1
+            message.derniere_erreur = str(e)[:1000]
+            if message.tentatives >= MAIL_QUEUE_MAX_TENTATIVES:
+                message.status = 'echec'
+            else:
+                message.status = 'en_attente'
+                message.prochain_essai = datetime.utcnow() + timedelta(seconds=30 * 2 ** message.tentatives)
+            current_app.logger.warning(f"Erreur envoi email {message_id} (essai {message.tentatives}): {str(e)}")
+        db.session.commit()
+        traites += 1
+    return traites
+
+
+_mail_worker = {'thread': None, 'pid': None}
+_mail_worker_event = threading.Event()
+_mail_worker_lock = threading.Lock()
+
+
+def _boucle_envoi_emails(application):
+    """Boucle du worker : vide la file à chaque réveil, ou toutes les MAIL_QUEUE_POLL_SECONDS."""
+    connexion = ConnexionSMTP(application.config)
+    while True:
+        _mail_worker_event.wait(MAIL_QUEUE_POLL_SECONDS)
+        _mail_worker_event.clear()
+        with application.app_context():
+            try:
+                while envoyer_emails_en_attente(connexion):
+                    pass
+            except Exception:
+                db.session.rollback()
+                application.logger.exception('Erreur du worker d\'envoi des emails')
+        connexion.fermer_si_inactive()
+
+
+def demarrer_worker_emails():
+    """Démarre le thread d'envoi dans ce processus (une fois par processus, y compris après fork)."""
+    if app.config['MAIL_QUEUE_WORKER'] != 'thread':
+        return
+    thread = _mail_worker['thread']
+    if thread is not None and thread.is_alive() and _mail_worker['pid'] == os.getpid():
+        return
+    with _mail_worker_lock:
+        thread = _mail_worker['thread']
+        if thread is not None and thread.is_alive() and _mail_worker['pid'] == os.getpid():
+            return
+        thread = threading.Thread(target=_boucle_envoi_emails, args=(app,), name='envoi-emails', daemon=True)
+        thread.start()
+        _mail_worker['thread'] = thread
+        _mail_worker['pid'] = os.getpid()
+
+
+@app.before_request
+def _assurer_worker_emails():
+    demarrer_worker_emails()
+    demarrer_worker_pdf()
+    demarrer_worker_imports()
+
+
+@event.listens_for(SASession, 'after_commit')
+def _reveiller_worker_emails_after_commit(session):
+    if session.info.pop('mail_pending', False):
+        demarrer_worker_emails()
+        _mail_worker_event.set()
+
+
+@event.listens_for(SASession, 'after_rollback')
+def _discard_mail_pending_after_rollback(session):
+    session.info.pop('mail_pending', None)
+
+
+@app.cli.command('envoyer-emails')
+@click.option('--continu', is_flag=True, help='Continuer à vider la file jusqu\'à interruption.')
+def envoyer_emails_command(continu):
+    """Envoie les emails en attente (à utiliser avec MAIL_QUEUE_WORKER=externe)."""
+    if continu:
+        _boucle_envoi_emails(app)
+        return
+    connexion = ConnexionSMTP(app.config)
+    total = 0
+    try:
+        while True:
+            traites = envoyer_emails_en_attente(connexion)
+            if not traites:
+                break
+            total += traites
+    finally:
+        connexion.fermer()
+    print(f'{total} email(s) traité(s)')
+
+
+# ============================================
+# AGRÉGATS QUOTIDIENS DE CIRCULATION
+# ============================================
+# Une ligne par (jour, catégorie, livre, classe de l'adhérent) : nombre d'emprunts du jour,
+# de retours du jour et, parmi ces retours, de retours en retard. Maintenue à chaque
+# emprunt et retour (événements ORM, dans la transaction de l'opération) ; la commande
+# `flask reconstruire-circulation` la recalcule entièrement depuis les emprunts
+# (après une suppression d'emprunts ou une modification en masse, par exemple).
+
+CIRCULATION_BATCH = 1000
+
+
+class CirculationJournaliere(db.Model):
+    """Agrégat quotidien de circulation (catégorie et classe telles qu'au moment de l'opération)."""
+    __tablename__ = 'circulation_journaliere'
+    id = db.Column(db.Integer, primary_key=True)
+    jour = db.Column(db.Date, nullable=False)
+    categorie = db.Column(db.String(50), nullable=False, default='')
+    livre_id = db.Column(db.Integer, nullable=False)
+    classe = db.Column(db.String(50), nullable=False, default='')
+    nb_emprunts = db.Column(db.Integer, nullable=False, default=0)
+    nb_retours = db.Column(db.Integer, nullable=False, default=0)
+    nb_retards = db.Column(db.Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        db.UniqueConstraint('jour', 'categorie', 'livre_id', 'classe', name='uq_circulation_cle'),
+        db.Index('ix_circulation_livre_jour', 'livre_id', 'jour'),
+    )
+
+
+def _incrementer_circulation(connection, jour, categorie, livre_id, classe, **increments):
+    """Ajoute `increments` (nb_emprunts=1, ...) à la ligne d'agrégat, créée au besoin (upsert)."""
+    table = CirculationJournaliere.__table__
+    valeurs = {'jour': jour, 'categorie': categorie or '', 'livre_id': livre_id, 'classe': classe or '',
+               'nb_emprunts': 0, 'nb_retours': 0, 'nb_retards': 0}
+    valeurs.update(increments)
+    maj = {col: table.c[col] + n for col, n in increments.items()}
+    dialect = connection.dialect.name
+    if dialect == 'mysql':
+        stmt = mysql_dialect.insert(table).values(**valeurs).on_duplicate_key_update(**maj)
+    elif dialect in ('postgresql', 'sqlite'):
+        module = postgresql_dialect if dialect == 'postgresql' else sqlite_dialect
+        stmt = module.insert(table).values(**valeurs).on_conflict_do_update(
+            index_elements=['jour', 'categorie', 'livre_id', 'classe'], set_=maj
+        )
+    else:
+        cle = db.and_(*(table.c[col] == valeurs[col] for col in ('jour', 'categorie', 'livre_id', 'classe')))
+        if connection.execute(table.update().where(cle).values(**maj)).rowcount:
+            return
+        stmt = table.insert().values(**valeurs)
+    connection.execute(stmt)
+
+
+def _categorie_et_classe(connection, emprunt):
+    return connection.execute(db.select(
+        db.select(Livre.categorie).where(Livre.id == emprunt.livre_id).scalar_subquery(),
+        db.select(Adherent.classe).where(Adherent.id == emprunt.adherent_id).scalar_subquery(),
+    )).one()
+
+
+@event.listens_for(Emprunt, 'after_insert')
+def _circulation_emprunt(mapper, connection, target):
+    categorie, classe = _categorie_et_classe(connection, target)
+    _incrementer_circulation(connection, (target.date_emprunt or datetime.utcnow()).date(),
+                             categorie, target.livre_id, classe, nb_emprunts=1)
+
+
+@event.listens_for(Emprunt, 'after_update')
+def _circulation_retour(mapper, connection, target):
+    historique = inspect(target).attrs.date_retour_effective.history
+    if not historique.has_changes() or historique.deleted and historique.deleted[0] is not None:
+        return
+    if target.date_retour_effective is None:
+        return
+    categorie, classe = _categorie_et_classe(connection, target)
+    en_retard = 1 if target.date_retour_prevue and target.date_retour_effective > target.date_retour_prevue else 0
+    _incrementer_circulation(connection, target.date_retour_effective.date(),
+                             categorie, target.livre_id, classe, nb_retours=1, nb_retards=en_retard)
+
+
+def _as_date(value):
+    """DATE() renvoie une chaîne sous SQLite et un objet date ailleurs."""
+    if isinstance(value, str):
+        return date.fromisoformat(value[:10])
+    return _to_date(value)
+
+
+def _mois_suivant(jour):
+    return date(jour.year + jour.month // 12, jour.month % 12 + 1, 1)
+
+
+def _agregats_circulation(debut, fin):
+    """Agrégats des emprunts et retours du jour `debut` (inclus) à `fin` (exclu), par clé d'agrégat."""
+    agregats = {}
+
+    def cumuler(colonne_date, extra):
+        jour = db.func.date(colonne_date)
+        lignes = db.session.query(
+            jour, Livre.categorie, Emprunt.livre_id, Adherent.classe, db.func.count(Emprunt.id), *extra
+        ).join(Livre, Livre.id == Emprunt.livre_id).join(
+            Adherent, Adherent.id == Emprunt.adherent_id
+        ).filter(
+            colonne_date >= datetime.combine(debut, datetime.min.time()),
+            colonne_date < datetime.combine(fin, datetime.min.time()),
+        ).group_by(jour, Livre.categorie, Emprunt.livre_id, Adherent.classe)
+        for ligne in lignes.yield_per(CIRCULATION_BATCH):
+            yield (_as_date(ligne[0]), ligne[1] or '', ligne[2], ligne[3] or ''), ligne[4:]
+
+    for cle, (nb,) in cumuler(Emprunt.date_emprunt, ()):
+        agregats.setdefault(cle, [0, 0, 0])[0] += nb
+    retards = db.func.sum(db.case((Emprunt.date_retour_effective > Emprunt.date_retour_prevue, 1), else_=0))
+    for cle, (nb, nb_retards) in cumuler(Emprunt.date_retour_effective, (retards,)):
+        compteurs = agregats.setdefault(cle, [0, 0, 0])
+        compteurs[1] += nb
+        compteurs[2] += int(nb_retards or 0)
+    return agregats
+
+
+def reconstruire_circulation():
+    """Recalcule la table d'agrégats depuis les emprunts ; retourne le nombre de lignes écrites.
+
+    Le recalcul avance d'un mois à la fois : les agrégats du mois sont calculés (au plus un
+    mois de lignes en mémoire), puis remplacent ceux de ce mois dans une transaction courte.
+    """
+    table = CirculationJournaliere.__table__
+    bornes = db.session.query(
+        db.func.min(Emprunt.date_emprunt), db.func.max(Emprunt.date_emprunt),
+        db.func.min(Emprunt.date_retour_effective), db.func.max(Emprunt.date_retour_effective),
+    ).one()
+    dates = [_as_date(valeur) for valeur in bornes if valeur is not None]
+    try:
+        if not dates:
+            db.session.execute(table.delete())
+            db.session.commit()
+            return 0
+
+        premier = min(dates).replace(day=1)
+        dernier = _mois_suivant(max(dates))
+        # Agrégats hors de la période couverte par les emprunts (emprunts supprimés)
+        db.session.execute(table.delete().where(db.or_(table.c.jour < premier, table.c.jour >= dernier)))
+        db.session.commit()
+
+        total = 0
+        mois = premier
+        while mois < dernier:
+            suivant = _mois_suivant(mois)
+            lignes = [
+                {'jour': jour, 'categorie': categorie, 'livre_id': livre_id, 'classe': classe,
+                 'nb_emprunts': nb_emprunts, 'nb_retours': nb_retours, 'nb_retards': nb_retards}
+                for (jour, categorie, livre_id, classe), (nb_emprunts, nb_retours, nb_retards)
+                in _agregats_circulation(mois, suivant).items()
+            ]
+            db.session.execute(table.delete().where(table.c.jour >= mois, table.c.jour < suivant))
+            for debut in range(0, len(lignes), CIRCULATION_BATCH):
+                db.session.execute(table.insert(), lignes[debut:debut + CIRCULATION_BATCH])
+            db.session.commit()
+            total += len(lignes)
+            mois = suivant
+    except Exception:
+        db.session.rollback()
+        raise
+    return total
+
+
+@app.cli.command('reconstruire-circulation')
+def reconstruire_circulation_command():
+    """Reconstruit la table d'agrégats quotidiens de circulation depuis les emprunts."""
+    total = reconstruire_circulation()
+    print(f'{total} ligne(s) d\'agrégat écrites')
+
+
+# ============================================
+# SUIVI DES MODIFICATIONS (SAUVEGARDES INCRÉMENTALES)
+# ============================================
+# Adherent, Livre, Emprunt et Reservation portent `date_modification` (mise à jour aussi par
+# les UPDATE en masse, via `onupdate`) ; les suppressions sont journalisées dans
+# `suppression_journal`. `filigrane_sauvegarde` retient, par table, l'instant de début de la
+# dernière sauvegarde écrite par `flask sauvegarder`.
+
+MODELES_SUIVIS = (Adherent, Livre, Emprunt, Reservation)
+
+
+class FiligraneSauvegarde(db.Model):
+    __tablename__ = 'filigrane_sauvegarde'
+    table_nom = db.Column(db.String(50), primary_key=True)
+    horodatage = db.Column(db.DateTime, nullable=False)
+
+
+class SuppressionJournal(db.Model):
+    __tablename__ = 'suppression_journal'
+    id = db.Column(db.Integer, primary_key=True)
+    table_nom = db.Column(db.String(50), nullable=False)
+    ligne_id = db.Column(db.Integer, nullable=False)
+    date_suppression = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+    __table_args__ = (
+        db.Index('ix_suppression_table_date', 'table_nom', 'date_suppression'),
+    )
+
+
+def _journaliser_suppression(mapper, connection, target):
+    connection.execute(SuppressionJournal.__table__.insert().values(
+        table_nom=mapper.local_table.name, ligne_id=target.id, date_suppression=datetime.utcnow()
+    ))
+
+
+for _modele in MODELES_SUIVIS:
+    event.listen(_modele, 'after_delete', _journaliser_suppression)
+
+
+@event.listens_for(SASession, 'do_orm_execute')
+def _journaliser_suppressions_en_masse(orm_execute_state):
+    # `Query.delete()` / `delete(Modele)` ne déclenche pas `after_delete` : journaliser les
+    # identifiants visés par le même WHERE, dans la même transaction, avant la suppression.
+    if not orm_execute_state.is_delete:
+        return
+    mapper = orm_execute_state.bind_mapper
+    if mapper is None or mapper.class_ not in MODELES_SUIVIS:
+        return
+    modele = mapper.class_
+    ids = db.select(
+        db.literal(modele.__table__.name), modele.id, db.literal(datetime.utcnow())
+    )
+    if orm_execute_state.statement.whereclause is not None:
+        ids = ids.where(orm_execute_state.statement.whereclause)
+    journal = SuppressionJournal.__table__
+    orm_execute_state.session.connection().execute(journal.insert().from_select(
+        [journal.c.table_nom, journal.c.ligne_id, journal.c.date_suppression], ids
+    ))
+
+
+# ============================================
+# TEXTE INTÉGRAL DES PDF
+# ============================================
+# L'upload d'un PDF ne fait qu'enregistrer une tâche dans `extraction_pdf` ; un worker (thread
+# du processus web, ou `flask indexer-pdf --continu` si PDF_EXTRACTION_WORKER=externe) la
+# réserve et confie la lecture du fichier à un pool de processus. Le texte de chaque page est
+# découpé en passages (`passage_pdf`) que la recherche du catalogue interroge pour afficher
+# la page et un extrait (index FULLTEXT sous MySQL, voir PDF_RECHERCHE_LIKE ailleurs).
+# `flask indexer-pdf --rattrapage` planifie les PDF déjà présents.
+
+app.config.setdefault('PDF_EXTRACTION_WORKER', os.environ.get('PDF_EXTRACTION_WORKER', 'thread'))
+app.config.setdefault('PDF_EXTRACTION_PROCESSUS', int(os.environ.get('PDF_EXTRACTION_PROCESSUS', 2)))
+
+PDF_PASSAGE_TAILLE = 1000
+PDF_PASSAGES_BATCH = 500
+PDF_EXTRACTION_POLL_SECONDS = 10
+PDF_EXTRACTION_MAX_TENTATIVES = 3
+PDF_EXTRACTION_EXPIRE = timedelta(minutes=30)
+PDF_EXTRAITS_PAR_LIVRE = 2
+PDF_EXTRAIT_LARGEUR = 160
+PASSAGES_FULLTEXT_INDEX_NAME = 'ft_passage_pdf'
+
+
+class ExtractionPdf(db.Model):
+    """Tâche d'extraction du texte du PDF d'un livre (en_attente, en_cours, indexe, echec)."""
+    __tablename__ = 'extraction_pdf'
+    livre_id = db.Column(db.Integer, db.ForeignKey('livre.id', ondelete='CASCADE'), primary_key=True)
+    fichier = db.Column(db.String(255), nullable=False)
+    status = db.Column(db.String(20), default='en_attente', nullable=False)
+    tentatives = db.Column(db.Integer, default=0)
+    nb_pages = db.Column(db.Integer)
+    nb_passages = db.Column(db.Integer)
+    derniere_erreur = db.Column(db.Text)
+    date_demande = db.Column(db.DateTime, default=datetime.utcnow)
+    date_traitement = db.Column(db.DateTime)
+
+    __table_args__ = (
+        db.Index('ix_extraction_pdf_status', 'status', 'date_demande'),
+    )
+
+
+class PassagePdf(db.Model):
+    """Passage du texte d'une page : `texte` pour l'extrait affiché, `texte_normalise` pour la recherche."""
+    __tablename__ = 'passage_pdf'
+    id = db.Column(db.Integer, primary_key=True)
+    livre_id = db.Column(db.Integer, db.ForeignKey('livre.id', ondelete='CASCADE'), nullable=False)
+    page = db.Column(db.Integer, nullable=False)
+    position = db.Column(db.Integer, nullable=False, default=0)
+    texte = db.Column(db.Text, nullable=False)
+    texte_normalise = db.Column(db.Text, nullable=False)
+
+    __table_args__ = (
+        db.Index('ix_passage_pdf_livre_page', 'livre_id', 'page', 'position'),
+    )
+
+
+@event.listens_for(Livre, 'before_delete')
+def _supprimer_texte_pdf(mapper, connection, target):
+    # ON DELETE CASCADE n'est pas appliqué par SQLite sans PRAGMA foreign_keys
+    connection.execute(PassagePdf.__table__.delete().where(PassagePdf.livre_id == target.id))
+    connection.execute(ExtractionPdf.__table__.delete().where(ExtractionPdf.livre_id == target.id))
+
+
+def planifier_extraction_pdf(livre_id, fichier):
+    """Planifie (ou relance) l'extraction du PDF d'un livre.
+
+    La tâche est validée avec la transaction de l'appelant ; le worker est réveillé au commit.
+    """
+    tache = ExtractionPdf.query.get(livre_id) or ExtractionPdf(livre_id=livre_id)
+    tache.fichier = fichier
+    tache.status = 'en_attente'
+    tache.tentatives = 0
+    tache.derniere_erreur = None
+    tache.date_demande = datetime.utcnow()
+    db.session.add(tache)
+    db.session.info['pdf_pending'] = True
+    return tache
+
+
+def planifier_rattrapage_pdf(forcer=False):
+    """Planifie les PDF de UPLOAD_FOLDER jamais indexés (ou remplacés depuis) ; tous avec `forcer`."""
+    presents = set(os.listdir(app.config['UPLOAD_FOLDER']))
+    deja_planifies = dict(db.session.query(ExtractionPdf.livre_id, ExtractionPdf.fichier))
+    livres = [(livre_id, fichier) for livre_id, fichier in
+              db.session.query(Livre.id, Livre.contenu_pdf).filter(Livre.contenu_pdf != None)
+              if fichier in presents and (forcer or deja_planifies.get(livre_id) != fichier)]
+    for numero, (livre_id, fichier) in enumerate(livres, start=1):
+        planifier_extraction_pdf(livre_id, fichier)
+        if numero % PDF_PASSAGES_BATCH == 0:
+            db.session.commit()
+    db.session.commit()
+    return len(livres)
+
+
+def _extraire_pages_pdf(chemin):
+    """Lit un PDF et retourne (nombre de pages, [(numéro de page, texte), ...]).
+
+    Exécutée dans un processus du pool : ni application ni session ici.
+    """
+    lecteur = PdfReader(chemin)
+    pages = []
+    for numero, page in enumerate(lecteur.pages, start=1):
+        texte = ' '.join((page.extract_text() or '').split())
+        if texte:
+            pages.append((numero, texte))
+    return len(lecteur.pages), pages
+
+
+def _decouper_passages(texte, taille=PDF_PASSAGE_TAILLE):
+    """Découpe le texte d'une page en passages d'environ `taille` caractères, sans couper les mots."""
+    debut = 0
+    while debut < len(texte):
+        fin = min(debut + taille, len(texte))
+        if fin < len(texte):
+            espace = texte.rfind(' ', debut, fin)
+            if espace > debut:
+                fin = espace
+        passage = texte[debut:fin].strip()
+        if passage:
+            yield passage
+        debut = fin
+
+
+def _enregistrer_passages(livre_id, pages):
+    """Remplace les passages d'un livre (non validé) et retourne leur nombre."""
+    table = PassagePdf.__table__
+    db.session.execute(table.delete().where(table.c.livre_id == livre_id))
+    lot, total = [], 0
+    for numero, texte in pages:
+        for position, passage in enumerate(_decouper_passages(texte)):
+            lot.append({'livre_id': livre_id, 'page': numero, 'position': position,
+                        'texte': passage, 'texte_normalise': _normalize_search_text(passage)})
+            if len(lot) >= PDF_PASSAGES_BATCH:
+                db.session.execute(table.insert(), lot)
+                total += len(lot)
+                lot = []
+    if lot:
+        db.session.execute(table.insert(), lot)
+        total += len(lot)
+    return total
+
+
+def _reserver_extractions(limite):
+    """Réserve jusqu'à `limite` tâches par UPDATE conditionnel ; retourne [(livre_id, fichier)]."""
+    now = datetime.utcnow()
+    # Tâches réservées par un worker arrêté avant la fin
+    ExtractionPdf.query.filter(
+        ExtractionPdf.status == 'en_cours',
+        ExtractionPdf.date_traitement < now - PDF_EXTRACTION_EXPIRE
+    ).update({ExtractionPdf.status: 'en_attente'}, synchronize_session=False)
+    db.session.commit()
+
+    candidates = db.session.query(ExtractionPdf.livre_id, ExtractionPdf.fichier).filter(
+        ExtractionPdf.status == 'en_attente'
+    ).order_by(ExtractionPdf.date_demande).limit(limite).all()
+
+    reservees = []
+    for livre_id, fichier in candidates:
+        pris = ExtractionPdf.query.filter_by(livre_id=livre_id, status='en_attente', fichier=fichier).update(
+            {ExtractionPdf.status: 'en_cours', ExtractionPdf.date_traitement: datetime.utcnow()},
+            synchronize_session=False
+        )
+        db.session.commit()
+        if pris:
+            reservees.append((livre_id, fichier))
+    return reservees
+
+
+def extraire_pdf_en_attente(pool, limite=None):
+    """Traite un lot de tâches d'extraction et retourne le nombre de tâches traitées.
+
+    Les fichiers sont lus en parallèle par `pool` ; les passages sont écrits ici, un livre
+    par transaction, au fur et à mesure que les résultats arrivent.
+    """
+    taches = _reserver_extractions(limite or app.config['PDF_EXTRACTION_PROCESSUS'] * 2)
+    futurs = {
+        pool.submit(_extraire_pages_pdf, os.path.join(os.path.abspath(app.config['UPLOAD_FOLDER']), fichier)):
+            (livre_id, fichier)
+        for livre_id, fichier in taches
+    }
+    traites = 0
+    for futur in as_completed(futurs):
+        livre_id, fichier = futurs[futur]
+        try:
+            nb_pages, pages = futur.result()
+            nb_passages = _enregistrer_passages(livre_id, pages)
+            # Ne rien valider si le PDF a été remplacé pendant l'extraction
+            fini = ExtractionPdf.query.filter_by(livre_id=livre_id, status='en_cours', fichier=fichier).update({
+                ExtractionPdf.status: 'indexe',
+                ExtractionPdf.nb_pages: nb_pages,
+                ExtractionPdf.nb_passages: nb_passages,
+                ExtractionPdf.derniere_erreur: None,
+                ExtractionPdf.date_traitement: datetime.utcnow(),
+            }, synchronize_session=False)
+            if fini:
+                db.session.commit()
+            else:
+                db.session.rollback()
+        except Exception as e:
+            db.session.rollback()
+            tache = ExtractionPdf.query.filter_by(livre_id=livre_id, status='en_cours', fichier=fichier).first()
+            if tache is not None:
+                tache.tentatives = (tache.tentatives or 0) + 1
+                tache.derniere_erreur = str(e)[:1000]
+                tache.status = 'echec' if tache.tentatives >= PDF_EXTRACTION_MAX_TENTATIVES else 'en_attente'
+                tache.date_traitement = datetime.utcnow()
+                db.session.commit()
+            current_app.logger.warning(f"Erreur extraction PDF du livre {livre_id} ({fichier}): {str(e)}")
+        traites += 1
+    return traites
+
+
+def _nouveau_pool_extraction():
+    try:
+        return ProcessPoolExecutor(max_workers=app.config['PDF_EXTRACTION_PROCESSUS'])
+    except (OSError, NotImplementedError):
+        app.logger.warning('Pool de processus indisponible : extraction des PDF dans un thread')
+        return ThreadPoolExecutor(max_workers=1)
+
+
+_pdf_worker = {'thread': None, 'pid': None}
+_pdf_worker_event = threading.Event()
+_pdf_worker_lock = threading.Lock()
+
+
+def _boucle_extraction_pdf(application):
+    """Boucle du worker : traite la file à chaque réveil, ou toutes les PDF_EXTRACTION_POLL_SECONDS."""
+    pool = _nouveau_pool_extraction()
+    try:
+        while True:
+            _pdf_worker_event.wait(PDF_EXTRACTION_POLL_SECONDS)
+            _pdf_worker_event.clear()
+            with application.app_context():
+                try:
+                    while extraire_pdf_en_attente(pool):
+                        pass
+                except BrokenExecutor:
+                    # Un processus du pool est mort (PDF pathologique) : repartir d'un pool neuf,
+                    # les tâches réservées seront reprises après PDF_EXTRACTION_EXPIRE
+                    db.session.rollback()
+                    application.logger.exception('Pool d\'extraction des PDF interrompu')
+                    pool.shutdown(wait=False)
+                    pool = _nouveau_pool_extraction()
+                except Exception:
+                    db.session.rollback()
+                    application.logger.exception('Erreur du worker d\'extraction des PDF')
+    finally:
+        pool.shutdown(wait=False)
+
+
+def demarrer_worker_pdf():
+    """Démarre le thread d'extraction dans ce processus (une fois par processus, y compris après fork)."""
+    if app.config['PDF_EXTRACTION_WORKER'] != 'thread' or PdfReader is None:
+        return
+    thread = _pdf_worker['thread']
+    if thread is not None and thread.is_alive() and _pdf_worker['pid'] == os.getpid():
+        return
+    with _pdf_worker_lock:
+        thread = _pdf_worker['thread']
+        if thread is not None and thread.is_alive() and _pdf_worker['pid'] == os.getpid():
+            return
+        thread = threading.Thread(target=_boucle_extraction_pdf, args=(app,), name='extraction-pdf', daemon=True)
+        thread.start()
+        _pdf_worker['thread'] = thread
+        _pdf_worker['pid'] = os.getpid()
+
+
+@event.listens_for(SASession, 'after_commit')
+def _reveiller_worker_pdf_after_commit(session):
+    if session.info.pop('pdf_pending', False):
+        demarrer_worker_pdf()
+        _pdf_worker_event.set()
+
+
+@event.listens_for(SASession, 'after_rollback')
+def _discard_pdf_pending_after_rollback(session):
+    session.info.pop('pdf_pending', None)
+
+
+def _extrait_passage(texte, terms, largeur=PDF_EXTRAIT_LARGEUR):
+    """Fenêtre de `texte` autour de la première occurrence d'un des termes (sans accents ni casse)."""
+    normalise, positions = [], []
+    for i, caractere in enumerate(texte):
+        forme = _normalize_search_text(caractere)
+        normalise.append(forme)
+        positions.extend([i] * len(forme))
+    normalise = ''.join(normalise)
+    occurrences = [normalise.find(token) for token in _tokenize(terms)]
+    occurrences = [o for o in occurrences if o >= 0]
+    centre = positions[min(occurrences)] if occurrences else 0
+    debut = max(0, centre - largeur // 3)
+    fin = min(len(texte), debut + largeur)
+    if debut > 0:
+        espace = texte.find(' ', debut, centre)
+        debut = espace + 1 if espace >= 0 else debut
+    if fin < len(texte):
+        espace = texte.rfind(' ', centre, fin)
+        fin = espace if espace > centre else fin
+    return ('… ' if debut > 0 else '') + texte[debut:fin].strip() + (' …' if fin < len(texte) else '')
+
+
+def rechercher_dans_pdf(terms):
+    """Recherche dans le texte des PDF : {livre_id: [(page, texte du passage), ...]}.
+
+    Les livres sont dans l'ordre de pertinence du backend, avec au plus
+    PDF_EXTRAITS_PAR_LIVRE passages chacun.
+    """
+    resultats = {}
+    for livre_id, page, texte in get_search_backend().search_passages(terms):
+        passages = resultats.setdefault(livre_id, [])
+        if len(passages) < PDF_EXTRAITS_PAR_LIVRE:
+            passages.append((page, texte))
+    return resultats
+
+
+def extraits_pdf_visibles(passages_pdf, livres, terms):
+    """Extraits à afficher pour les livres d'une page de résultats : {livre_id: [{'page', 'extrait'}]}.
+
+    Le texte n'est montré que pour les PDF que l'utilisateur peut lire (`livres_pdf_lisibles`) ;
+    pour les autres, la liste est vide et signale seulement que le contenu correspond.
+    """
+    trouves = [livre.id for livre in livres if livre.id in passages_pdf]
+    lisibles = livres_pdf_lisibles(trouves)
+    return {
+        livre_id: [{'page': page, 'extrait': _extrait_passage(texte, terms)}
+                   for page, texte in passages_pdf[livre_id]] if livre_id in lisibles else []
+        for livre_id in trouves
+    }
+
+
+@app.cli.command('indexer-pdf')
+@click.option('--rattrapage', is_flag=True, help='Planifier d\'abord les PDF de UPLOAD_FOLDER pas encore indexés.')
+@click.option('--forcer', is_flag=True, help='Avec --rattrapage, réindexer aussi les PDF déjà indexés.')
+@click.option('--continu', is_flag=True, help='Continuer à traiter la file jusqu\'à interruption.')
+def indexer_pdf_command(rattrapage, forcer, continu):
+    """Extrait le texte des PDF en attente (à utiliser avec PDF_EXTRACTION_WORKER=externe ou en rattrapage)."""
+    if PdfReader is None:
+        raise click.ClickException('pypdf n\'est pas installé (pip install pypdf)')
+    if rattrapage:
+        print(f'{planifier_rattrapage_pdf(forcer)} PDF planifié(s)')
+    if continu:
+        _boucle_extraction_pdf(app)
+        return
+    pool = _nouveau_pool_extraction()
+    total = 0
+    try:
+        while True:
+            traites = extraire_pdf_en_attente(pool)
+            if not traites:
+                break
+            total += traites
+            print(f'  {total} tâche(s) traitée(s)')
+    finally:
+        pool.shutdown()
+    echecs = ExtractionPdf.query.filter_by(status='echec').count()
+    print(f'{total} tâche(s) traitée(s), {echecs} PDF en échec')
+
+
+# ============================================
+# TÉLÉVERSEMENT DES PDF PAR BLOCS
+# ============================================
+# Les gros PDF sont envoyés par blocs à une API JSON réservée au personnel :
+#   POST   /api/televersements        {nom, taille, sha256?} → id, taille de bloc, offset
+#   GET    /api/televersements/<id>   offset déjà reçu, pour reprendre après une coupure
+#   PUT    /api/televersements/<id>   un bloc ; en-têtes Upload-Offset et Bloc-SHA256
+#   DELETE /api/televersements/<id>   abandon
+# Taille et extension sont refusées dès la création, la signature %PDF- dès le premier bloc ;
+# chaque bloc est écrit à sa place dans un fichier partiel, lu par morceaux depuis la requête.
+# Un bloc est d'abord réservé (UPDATE conditionnel sur l'offset, validé aussitôt) : aucune
+# transaction ni verrou de ligne n'est tenu pendant la lecture du corps de la requête.
+# Le formulaire d'ajout de livre transmet ensuite `televersement_id` et le fichier complet
+# rejoint le stockage par empreinte (`terminer_televersement`).
+
+app.config.setdefault('PDF_TAILLE_MAX', int(os.environ.get('PDF_TAILLE_MAX', 500 * 1024 * 1024)))
+
+TELEVERSEMENT_BLOC = 8 * 1024 * 1024
+TELEVERSEMENT_LECTURE = 64 * 1024
+TELEVERSEMENT_EXPIRE = timedelta(days=1)
+# Réservation d'un bloc abandonnée (processus tué pendant l'écriture) : reprise possible après
+TELEVERSEMENT_ECRITURE_EXPIRE = timedelta(minutes=5)
+# Dans le dossier des PDF (même système de fichiers : le fichier final y est renommé, pas copié)
+TELEVERSEMENTS_FOLDER = os.path.join(UPLOAD_FOLDER, '.partiels')
+
+
+class TeleversementPdf(db.Model):
+    """Téléversement d'un PDF par blocs (en_cours, termine)."""
+    __tablename__ = 'televersement_pdf'
+    id = db.Column(db.String(32), primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    nom_original = db.Column(db.String(255))
+    taille = db.Column(db.BigInteger, nullable=False)
+    recu = db.Column(db.BigInteger, default=0, nullable=False)
+    sha256 = db.Column(db.String(64))
+    status = db.Column(db.String(20), default='en_cours', nullable=False)
+    fichier = db.Column(db.String(255))
+    # Début de l'écriture du bloc à l'offset `recu` ; NULL quand aucun bloc n'est en cours
+    ecriture_depuis = db.Column(db.DateTime)
+    date_creation = db.Column(db.DateTime, default=datetime.utcnow)
+    date_maj = db.Column(db.DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        db.Index('ix_televersement_status_maj', 'status', 'date_maj'),
+    )
+
+    @property
+    def chemin_partiel(self):
+        return os.path.join(TELEVERSEMENTS_FOLDER, f'{self.id}.part')
+
+    def etat(self):
+        return {
+            'id': self.id,
+            'taille': self.taille,
+            'offset': self.recu,
+            'taille_bloc': TELEVERSEMENT_BLOC,
+            'status': self.status,
+        }
+
+
+def _televersement_de_l_utilisateur(televersement_id, verrouiller=False):
+    query = TeleversementPdf.query.filter_by(id=televersement_id, user_id=current_user.id)
+    return query.with_for_update().first() if verrouiller else query.first()
+
+
+@app.route('/api/televersements', methods=['POST'])
+@login_required
+def creer_televersement():
+    if not has_roles('admin', 'bibliothecaire'):
+        return {'error': 'Accès non autorisé'}, 403
+    donnees = request.get_json(silent=True) or {}
+    nom = str(donnees.get('nom') or '')
+    sha256 = str(donnees.get('sha256') or '').lower() or None
+    try:
+        taille = int(donnees.get('taille'))
+    except (TypeError, ValueError):
+        return {'error': 'Taille du fichier manquante'}, 400
+    if not nom.lower().endswith('.pdf'):
+        return {'error': 'Le fichier doit être au format PDF'}, 415
+    if taille <= 0 or taille > app.config['PDF_TAILLE_MAX']:
+        return {'error': f"Le PDF dépasse la taille maximale ({app.config['PDF_TAILLE_MAX'] // (1024 * 1024)} Mo)"}, 413
+    if sha256 and not re.fullmatch(r'[0-9a-f]{64}', sha256):
+        return {'error': 'Empreinte SHA-256 invalide'}, 400
+    os.makedirs(TELEVERSEMENTS_FOLDER, exist_ok=True)
+    if shutil.disk_usage(TELEVERSEMENTS_FOLDER).free < taille:
+        return {'error': 'Espace disque insuffisant'}, 507
+
+    televersement = TeleversementPdf(id=uuid.uuid4().hex, user_id=current_user.id,
+                                     nom_original=secure_filename(nom), taille=taille, sha256=sha256)
+    open(televersement.chemin_partiel, 'wb').close()
+    db.session.add(televersement)
+    db.session.commit()
+    return televersement.etat(), 201, {'Location': url_for('etat_televersement', televersement_id=televersement.id)}
+
+
+@app.route('/api/televersements/<televersement_id>', methods=['GET'])
+@login_required
+def etat_televersement(televersement_id):
+    televersement = _televersement_de_l_utilisateur(televersement_id)
+    if televersement is None:
+        return {'error': 'Téléversement introuvable'}, 404
+    return televersement.etat(), 200, {'Upload-Offset': str(televersement.recu), 'Cache-Control': 'no-store'}
+
+
+@app.route('/api/televersements/<televersement_id>', methods=['PUT'])
+@login_required
+def envoyer_bloc_televersement(televersement_id):
+    """Reçoit un bloc à l'offset courant ; un bloc incomplet ou corrompu est annulé."""
+    televersement = _televersement_de_l_utilisateur(televersement_id)
+    if televersement is None or televersement.status != 'en_cours':
+        return {'error': 'Téléversement introuvable'}, 404
+    offset = request.headers.get('Upload-Offset', type=int)
+    longueur = request.content_length
+    empreinte_attendue = (request.headers.get('Bloc-SHA256') or '').lower()
+
+    if offset != televersement.recu:
+        return {'error': 'Offset inattendu', 'offset': televersement.recu}, 409
+    if not longueur or longueur > TELEVERSEMENT_BLOC or offset + longueur > televersement.taille:
+        return {'error': f'Bloc vide ou trop grand (maximum {TELEVERSEMENT_BLOC} octets)'}, 413
+    if empreinte_attendue and not re.fullmatch(r'[0-9a-f]{64}', empreinte_attendue):
+        return {'error': 'Empreinte SHA-256 du bloc invalide'}, 400
+
+    # Réserver le bloc et valider tout de suite : deux envois concurrents ne peuvent pas
+    # s'entrelacer, et la connexion n'est pas retenue pendant la lecture du corps
+    debut = datetime.utcnow().replace(microsecond=0)  # comparable à un DATETIME MySQL
+    chemin = televersement.chemin_partiel
+    ligne = TeleversementPdf.query.filter_by(id=televersement_id, status='en_cours', recu=offset)
+    reserve = ligne.filter(db.or_(
+        TeleversementPdf.ecriture_depuis == None,
+        TeleversementPdf.ecriture_depuis < debut - TELEVERSEMENT_ECRITURE_EXPIRE
+    )).update({TeleversementPdf.ecriture_depuis: debut, TeleversementPdf.date_maj: debut},
+              synchronize_session=False)
+    db.session.commit()
+    if not reserve:
+        return {'error': 'Un autre envoi est en cours pour ce téléversement', 'offset': offset}, 409
+
+    empreinte = hashlib.sha256()
+    ecrits = 0
+    erreur = None
+    try:
+        with open(chemin, 'r+b') as sortie:
+            sortie.seek(offset)
+            while ecrits < longueur:
+                morceau = request.stream.read(min(TELEVERSEMENT_LECTURE, longueur - ecrits))
+                if not morceau:
+                    break
+                empreinte.update(morceau)
+                sortie.write(morceau)
+                ecrits += len(morceau)
+            if ecrits != longueur:
+                erreur = ({'error': 'Bloc incomplet', 'offset': offset}, 400)
+            elif empreinte_attendue and empreinte.hexdigest() != empreinte_attendue:
+                erreur = ({'error': 'Somme de contrôle du bloc incorrecte', 'offset': offset}, 422)
+            elif offset == 0:
+                sortie.seek(0)
+                if sortie.read(5) != b'%PDF-':
+                    erreur = ({'error': 'Le fichier n\'est pas un PDF'}, 415)
+            if erreur:
+                sortie.truncate(offset)
+    except OSError:
+        current_app.logger.exception(f'Erreur d\'écriture du téléversement {televersement_id}')
+        erreur = ({'error': 'Erreur d\'écriture du bloc', 'offset': offset}, 500)
+
+    # Ne rien changer si la réservation a expiré et a été reprise entre-temps
+    ligne = ligne.filter(TeleversementPdf.ecriture_depuis == debut)
+    if erreur:
+        ligne.update({TeleversementPdf.ecriture_depuis: None}, synchronize_session=False)
+        db.session.commit()
+        return erreur
+    fini = ligne.update({
+        TeleversementPdf.recu: offset + ecrits,
+        TeleversementPdf.ecriture_depuis: None,
+        TeleversementPdf.date_maj: datetime.utcnow(),
+    }, synchronize_session=False)
+    db.session.commit()
+    if not fini:
+        return {'error': 'Réservation du bloc perdue', 'offset': offset}, 409
+    televersement = db.session.get(TeleversementPdf, televersement_id)
+    return televersement.etat(), 200, {'Upload-Offset': str(televersement.recu)}
+
+
+@app.route('/api/televersements/<televersement_id>', methods=['DELETE'])
+@login_required
+def abandonner_televersement(televersement_id):
+    televersement = _televersement_de_l_utilisateur(televersement_id)
+    if televersement is None:
+        return {'error': 'Téléversement introuvable'}, 404
+    if os.path.exists(televersement.chemin_partiel):
+        os.remove(televersement.chemin_partiel)
+    db.session.delete(televersement)
+    db.session.commit()
+    return '', 204
+
+
+def terminer_televersement(televersement_id):
+    """Range le PDF complet d'un téléversement dans le stockage par empreinte et retourne son nom.
+
+    Lève ValueError si le téléversement est inconnu, incomplet ou ne correspond pas à
+    l'empreinte annoncée à sa création.
+    """
+    televersement = _televersement_de_l_utilisateur(televersement_id, verrouiller=True)
+    if televersement is None:
+        raise ValueError('Téléversement du PDF introuvable')
+    if televersement.status == 'termine':
+        return televersement.fichier
+    if televersement.recu != televersement.taille:
+        raise ValueError('Le PDF n\'a pas été entièrement envoyé')
+    chemin = televersement.chemin_partiel
+    with open(chemin, 'r+b') as partiel:
+        partiel.truncate(televersement.taille)
+    empreinte = _empreinte_fichier(chemin)
+    if televersement.sha256 and empreinte != televersement.sha256:
+        raise ValueError('Le PDF reçu ne correspond pas à son empreinte SHA-256')
+    televersement.fichier = _ranger_sous_empreinte(chemin, app.config['UPLOAD_FOLDER'], empreinte, 'pdf')
+    televersement.status = 'termine'
+    televersement.date_maj = datetime.utcnow()
+    db.session.commit()
+    return televersement.fichier
+
+
+def purger_televersements():
+    """Supprime les téléversements inactifs depuis TELEVERSEMENT_EXPIRE et leurs fichiers partiels."""
+    limite = datetime.utcnow() - TELEVERSEMENT_EXPIRE
+    anciens = TeleversementPdf.query.filter(TeleversementPdf.date_maj < limite).all()
+    for televersement in anciens:
+        if os.path.exists(televersement.chemin_partiel):
+            os.remove(televersement.chemin_partiel)
+        db.session.delete(televersement)
+    db.session.commit()
+    return len(anciens)
+
+
+@app.cli.command('purger-televersements')
+def purger_televersements_command():
+    """Supprime les téléversements par blocs abandonnés."""
+    print(f'{purger_televersements()} téléversement(s) supprimé(s)')
+
+
+# ============================================
+# IMPORTS D'ADHÉRENTS EN ARRIÈRE-PLAN
+# ============================================
+# Imports lancés depuis l'interface : la requête ne fait qu'enregistrer le CSV et une tâche
+# `import_adherents` ; un worker (thread du processus web, ou `flask traiter-imports --continu`
+# si IMPORT_ADHERENTS_WORKER=externe) la réserve par UPDATE conditionnel et l'exécute, une
+# seule à la fois, avec son propre pool de hachage (`importer_adherents_csv`, plus bas).
+# Le rapport s'affiche sur la page des adhérents.
+
+app.config.setdefault('IMPORT_ADHERENTS_WORKER', os.environ.get('IMPORT_ADHERENTS_WORKER', 'thread'))
+
+IMPORTS_FOLDER = os.path.join(app.instance_path, 'imports')
+IMPORT_POLL_SECONDS = 10
+# Un import réservé par un worker arrêté est repris (les adhérents déjà créés sont des doublons)
+IMPORT_EXPIRE = timedelta(hours=2)
+
+
+class ImportAdherents(db.Model):
+    """Import d'une liste d'adhérents demandé depuis l'interface (en_attente, en_cours, termine, echec)."""
+    __tablename__ = 'import_adherents'
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    fichier = db.Column(db.String(255), nullable=False)
+    nom_original = db.Column(db.String(255))
+    creer_comptes = db.Column(db.Boolean, default=True, nullable=False)
+    classe_defaut = db.Column(db.String(50))
+    status = db.Column(db.String(20), default='en_attente', nullable=False)
+    lues = db.Column(db.Integer, default=0)
+    importees = db.Column(db.Integer, default=0)
+    doublons = db.Column(db.Integer, default=0)
+    nb_erreurs = db.Column(db.Integer, default=0)
+    erreurs = db.Column(db.Text)  # JSON : [[ligne, message], ...]
+    derniere_erreur = db.Column(db.Text)
+    date_demande = db.Column(db.DateTime, default=datetime.utcnow)
+    date_debut = db.Column(db.DateTime)
+    date_fin = db.Column(db.DateTime)
+
+    __table_args__ = (
+        db.Index('ix_import_adherents_status', 'status', 'date_demande'),
+    )
+
+    def resume(self):
+        return (f'{self.lues or 0} ligne(s) lue(s), {self.importees or 0} importée(s), '
+                f'{self.doublons or 0} doublon(s), {self.nb_erreurs or 0} erreur(s)')
+
+    def liste_erreurs(self):
+        return json.loads(self.erreurs) if self.erreurs else []
+
+
+def _reserver_import():
+    """Réserve l'import en attente le plus ancien par UPDATE conditionnel ; None si la file est vide."""
+    ImportAdherents.query.filter(
+        ImportAdherents.status == 'en_cours',
+        ImportAdherents.date_debut < datetime.utcnow() - IMPORT_EXPIRE
+    ).update({ImportAdherents.status: 'en_attente'}, synchronize_session=False)
+    db.session.commit()
+
+    candidats = db.session.query(ImportAdherents.id).filter(
+        ImportAdherents.status == 'en_attente'
+    ).order_by(ImportAdherents.date_demande).limit(5).all()
+    for (import_id,) in candidats:
+        pris = ImportAdherents.query.filter_by(id=import_id, status='en_attente').update(
+            {ImportAdherents.status: 'en_cours', ImportAdherents.date_debut: datetime.utcnow()},
+            synchronize_session=False
+        )
+        db.session.commit()
+        if pris:
+            return db.session.get(ImportAdherents, import_id)
+    return None
+
+
+def traiter_import_adherents(tache):
+    """Exécute un import réservé et enregistre son rapport ; le CSV est supprimé ensuite."""
+    import_id = tache.id
+    chemin = os.path.join(IMPORTS_FOLDER, tache.fichier)
+
+    def progression(rapport):
+        ImportAdherents.query.filter_by(id=import_id).update({
+            ImportAdherents.lues: rapport.lues,
+            ImportAdherents.importees: rapport.importees,
+            ImportAdherents.doublons: rapport.doublons,
+            ImportAdherents.nb_erreurs: rapport.nb_erreurs,
+        }, synchronize_session=False)
+        db.session.commit()
+
+    valeurs = {ImportAdherents.date_fin: datetime.utcnow()}
+    try:
+        with open(chemin, encoding='utf-8-sig', newline='') as flux:
+            rapport = importer_adherents_csv(flux, creer_comptes=tache.creer_comptes,
+                                             classe_defaut=tache.classe_defaut, progression=progression)
+        valeurs.update({
+            ImportAdherents.status: 'termine',
+            ImportAdherents.lues: rapport.lues,
+            ImportAdherents.importees: rapport.importees,
+            ImportAdherents.doublons: rapport.doublons,
+            ImportAdherents.nb_erreurs: rapport.nb_erreurs,
+            ImportAdherents.erreurs: json.dumps(rapport.erreurs),
+        })
+    except (OSError, ValueError, UnicodeDecodeError, csv.Error) as e:
+        db.session.rollback()
+        valeurs.update({ImportAdherents.status: 'echec', ImportAdherents.derniere_erreur: str(e)[:1000]})
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.exception(f'Erreur lors de l\'import des adhérents n°{import_id}')
+        valeurs.update({ImportAdherents.status: 'echec', ImportAdherents.derniere_erreur: str(e)[:1000]})
+    ImportAdherents.query.filter_by(id=import_id).update(valeurs, synchronize_session=False)
+    db.session.commit()
+    try:
+        os.remove(chemin)
+    except OSError:
+        pass
+
+
+def traiter_imports_en_attente():
+    """Exécute les imports en file l'un après l'autre ; retourne le nombre d'imports traités."""
+    traites = 0
+    while (tache := _reserver_import()) is not None:
+        traiter_import_adherents(tache)
+        traites += 1
+    return traites
 
-class Reservation(db.Model):
-    id = db.Column(db.Integer, primary_key=True)
-    adherent_id = db.Column(db.Integer, db.ForeignKey('adherent.id'), nullable=False)
-    livre_id = db.Column(db.Integer, db.ForeignKey('livre.id'), nullable=False)
-    date_reservation = db.Column(db.DateTime, default=datetime.utcnow)
-    status = db.Column(db.String(20), default='active')
 
-    adherent = db.relationship('Adherent', backref='reservations')
-    livre = db.relationship('Livre', backref='reservations')
+_import_worker = {'thread': None, 'pid': None}
+_import_worker_event = threading.Event()
+_import_worker_lock = threading.Lock()
 
 
-class Configuration(db.Model):
-    """Singleton table pour stocker les paramètres de la bibliothèque."""
-    id = db.Column(db.Integer, primary_key=True)
-    max_emprunts = db.Column(db.Integer, default=3)
-    duree_emprunt = db.Column(db.Integer, default=14)
-    max_prolongations = db.Column(db.Integer, default=2)
-    jours_prolongation = db.Column(db.Integer, default=7)
-    amende_par_jour = db.Column(db.Float, default=0.5)
+def _boucle_imports(application):
+    """Boucle du worker : traite la file à chaque réveil, ou toutes les IMPORT_POLL_SECONDS."""
+    while True:
+        _import_worker_event.wait(IMPORT_POLL_SECONDS)
+        _import_worker_event.clear()
+        with application.app_context():
+            try:
+                traiter_imports_en_attente()
+            except Exception:
+                db.session.rollback()
+                application.logger.exception('Erreur du worker des imports d\'adhérents')
 
 
-def get_library_config():
-    cfg = Configuration.query.first()
-    if not cfg:
-        cfg = Configuration()
-        try:
-            db.session.add(cfg)
-            db.session.commit()
-        except Exception:
-            db.session.rollback()
-    return cfg
+def demarrer_worker_imports():
+    """Démarre le thread des imports dans ce processus (une fois par processus, y compris après fork)."""
+    if app.config['IMPORT_ADHERENTS_WORKER'] != 'thread':
+        return
+    thread = _import_worker['thread']
+    if thread is not None and thread.is_alive() and _import_worker['pid'] == os.getpid():
+        return
+    with _import_worker_lock:
+        thread = _import_worker['thread']
+        if thread is not None and thread.is_alive() and _import_worker['pid'] == os.getpid():
+            return
+        thread = threading.Thread(target=_boucle_imports, args=(app,), name='imports-adherents', daemon=True)
+        thread.start()
+        _import_worker['thread'] = thread
+        _import_worker['pid'] = os.getpid()
 
 
-def _to_date(dt):
-    """Return a date object for a datetime/date-like value or None.
-    Safe helper to handle both datetime and date instances.
-    """
-    if dt is None:
-        return None
-    try:
-        if isinstance(dt, datetime):
-            return dt.date()
-        if isinstance(dt, date):
-            return dt
-        # Fallback: try calling .date() (some DB objects behave like datetimes)
-        return dt.date()
-    except Exception:
-        return None
+@event.listens_for(SASession, 'after_commit')
+def _reveiller_worker_imports_after_commit(session):
+    if session.info.pop('import_pending', False):
+        demarrer_worker_imports()
+        _import_worker_event.set()
+
+
+@event.listens_for(SASession, 'after_rollback')
+def _discard_import_pending_after_rollback(session):
+    session.info.pop('import_pending', None)
+
+
+@app.cli.command('traiter-imports')
+@click.option('--continu', is_flag=True, help='Continuer à traiter la file jusqu\'à interruption.')
+def traiter_imports_command(continu):
+    """Exécute les imports d'adhérents en file (à utiliser avec IMPORT_ADHERENTS_WORKER=externe)."""
+    if continu:
+        _boucle_imports(app)
+        return
+    print(f'{traiter_imports_en_attente()} import(s) traité(s)')
+
 
 # Création des tables
 with app.app_context():
@@ -325,6 +2127,28 @@ with app.app_context():
     except Exception:
         current_app.logger.exception('Impossible d\'ajouter automatiquement les colonnes de confirmation')
 
+    # Colonne de suivi des modifications (sauvegardes incrémentales) sur les bases existantes
+    try:
+        inspector = inspect(db.engine)
+        for modele in MODELES_SUIVIS:
+            nom = modele.__table__.name
+            if 'date_modification' not in [c['name'] for c in inspector.get_columns(nom)]:
+                db.session.execute(text(f'ALTER TABLE {nom} ADD COLUMN date_modification DATETIME'))
+                db.session.execute(text(f'UPDATE {nom} SET date_modification = :maintenant'),
+                                   {'maintenant': datetime.utcnow()})
+                db.session.execute(text(f'CREATE INDEX ix_{nom}_date_modification ON {nom} (date_modification)'))
+                db.session.commit()
+    except Exception:
+        db.session.rollback()
+        current_app.logger.exception('Impossible d\'ajouter automatiquement les colonnes date_modification')
+
+    # Index FULLTEXT pour la recherche dans le catalogue
+    try:
+        ensure_fulltext_index()
+    except Exception:
+        db.session.rollback()
+        current_app.logger.exception('Impossible de créer l\'index FULLTEXT du catalogue')
+
 # Fonctions pour générer les PDF
 def generate_bibliothecaires_pdf(bibliothecaires):
     """Générer un PDF avec la liste des bibliothécaires"""
@@ -604,12 +2428,64 @@ def generate_detailed_bibliothecaire_pdf(bibliothecaire):
 def index():
     return render_template("index.html", title="Accueil")
 
+CATALOGUE_PAGE_SIZE = 24
+CATALOGUE_COUNT_CAP = 10000
+
+
+def _keyset_page_livres(query, apres_id, avant_id, per_page):
+    """Pagination par clé (titre, id) : chaque page coûte un parcours d'index de `per_page`
+    lignes, quelle que soit sa position. Retourne (livres, has_prev, has_next).
+    """
+    repere_id = apres_id or avant_id
+    repere = db.session.query(Livre.titre, Livre.id).filter(Livre.id == repere_id).first() if repere_id else None
+
+    if repere and avant_id:
+        titre, livre_id = repere
+        rows = query.filter(db.or_(
+            Livre.titre < titre,
+            db.and_(Livre.titre == titre, Livre.id < livre_id)
+        )).order_by(Livre.titre.desc(), Livre.id.desc()).limit(per_page + 1).all()
+        has_prev = len(rows) > per_page
+        return list(reversed(rows[:per_page])), has_prev, True
+
+    if repere:
+        titre, livre_id = repere
+        query = query.filter(db.or_(
+            Livre.titre > titre,
+            db.and_(Livre.titre == titre, Livre.id > livre_id)
+        ))
+    rows = query.order_by(Livre.titre.asc(), Livre.id.asc()).limit(per_page + 1).all()
+    return rows[:per_page], repere is not None, len(rows) > per_page
+
+
+def _estimer_total_livres(query, filtre_actif):
+    """Estimation bon marché du nombre de livres : statistiques de table MySQL sans filtre,
+    sinon comptage plafonné à `CATALOGUE_COUNT_CAP`. Retourne (total, précision).
+    """
+    if not filtre_actif and db.engine.dialect.name == 'mysql':
+        estimation = db.session.execute(text(
+            "SELECT TABLE_ROWS FROM information_schema.TABLES "
+            "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'livre'"
+        )).scalar()
+        if estimation is not None:
+            return int(estimation), 'estimation'
+    sous_requete = query.with_entities(Livre.id).limit(CATALOGUE_COUNT_CAP + 1).subquery()
+    total = db.session.query(db.func.count()).select_from(sous_requete).scalar() or 0
+    if total > CATALOGUE_COUNT_CAP:
+        return CATALOGUE_COUNT_CAP, 'minimum'
+    return total, 'exact'
+
+
 # CATALOGUE - ACCÈS PUBLIC
 @app.route("/catalogue")
 def catalogue():
     categorie = request.args.get('categorie', 'Toutes')
     statut = request.args.get('statut', 'Tous')
-    recherche = request.args.get('recherche', '')
+    recherche = request.args.get('recherche', '').strip()
+    apres_id = request.args.get('apres', type=int)
+    avant_id = request.args.get('avant', type=int)
+    page = max(request.args.get('page', 1, type=int) or 1, 1)
+    per_page = CATALOGUE_PAGE_SIZE
     
     query = Livre.query
     
@@ -623,15 +2499,41 @@ def catalogue():
             query = query.filter(Livre.disponible == False)
     
     if recherche:
-        query = query.filter(
-            db.or_(
-                Livre.titre.ilike(f'%{recherche}%'),
-                Livre.auteur.ilike(f'%{recherche}%'),
-                Livre.isbn.ilike(f'%{recherche}%')
-            )
+        # Recherche plein texte classée par pertinence (titre, auteur, résumé, catégorie, ISBN).
+        # Le classement est borné à SEARCH_MAX_RESULTS : on pagine par rang dans cette liste.
+        # Les livres trouvés seulement dans le texte de leur PDF viennent après.
+        passages_pdf = rechercher_dans_pdf(recherche)
+        classement = search_livre_ids(recherche)
+        deja_classes = set(classement)
+        classement += [livre_id for livre_id in passages_pdf if livre_id not in deja_classes]
+        rangs = {livre_id: rang for rang, livre_id in enumerate(classement)}
+        ids = [row[0] for row in query.with_entities(Livre.id).filter(Livre.id.in_(list(rangs)))] if rangs else []
+        ids.sort(key=rangs.get)
+        page_ids = ids[(page - 1) * per_page:page * per_page]
+        livres = query.filter(Livre.id.in_(page_ids)).all() if page_ids else []
+        livres.sort(key=lambda l: rangs[l.id])
+        extraits_pdf = extraits_pdf_visibles(passages_pdf, livres, recherche)
+        total_livres, total_precision = len(ids), 'exact'
+        pagination = {
+            'mode': 'rang',
+            'page': page,
+            'has_prev': page > 1,
+            'has_next': page * per_page < len(ids)
+        }
+    else:
+        extraits_pdf = {}
+        # Parcours du catalogue : pagination par clé (titre, id)
+        livres, has_prev, has_next = _keyset_page_livres(query, apres_id, avant_id, per_page)
+        total_livres, total_precision = _estimer_total_livres(
+            query, filtre_actif=(categorie != 'Toutes' or statut != 'Tous')
         )
-    
-    livres = query.all()
+        pagination = {
+            'mode': 'curseur',
+            'has_prev': has_prev,
+            'has_next': has_next,
+            'premier': livres[0].id if livres else None,
+            'dernier': livres[-1].id if livres else None
+        }
     
     livres_empruntes = []
     if current_user.is_authenticated:
@@ -650,7 +2552,11 @@ def catalogue():
         current_user=current_user,
         categorie_selected=categorie,
         statut_selected=statut,
-        recherche_term=recherche
+        recherche_term=recherche,
+        extraits_pdf=extraits_pdf,
+        pagination=pagination,
+        total_livres=total_livres,
+        total_precision=total_precision
     )
 
 # VERIFICATION EMAIL
@@ -699,7 +2605,7 @@ def resend_code():
     if user and not user.confirmed:
         code = _generate_confirmation_code()
         user.confirmation_code = code
-        user.confirmation_expires = datetime.utcnow() + timedelta(minutes=30)
+        user.confirmation_expires = datetime.utcnow() + CODE_VERIFICATION_DUREE
         db.session.commit()
         
         sent = send_verification_email(user.email, user.username, code)
@@ -716,36 +2622,104 @@ def _generate_confirmation_code():
     """Génère un code de confirmation à 6 chiffres"""
     return ''.join([str(random.randint(0, 9)) for _ in range(6)])
 
-def send_verification_email(to_email, username, code):
-    """Envoie l'email de vérification"""
+CODE_VERIFICATION_DUREE = timedelta(minutes=30)
+
+
+def send_verification_email(to_email, username, code, commit=True):
+    """Met en file l'email de vérification (avec commit=False, dans la transaction de l'appelant)"""
     try:
-        msg = EmailMessage()
-        msg['Subject'] = 'Vérification de votre email - Bibliothèque'
-        msg['From'] = app.config['EMAIL_FROM']
-        msg['To'] = to_email
-        
-        msg.set_content(f"""
+        mettre_en_file_email(to_email, 'Vérification de votre email - Bibliothèque', f"""
         Bonjour {username},
         
         Votre code de vérification est : {code}
         
-        Ce code expirera dans 30 minutes.
+        Ce code expirera dans {int(CODE_VERIFICATION_DUREE.total_seconds() // 60)} minutes.
         
         Cordialement,
         L'équipe de la Bibliothèque
-        """)
-        
-        with smtplib.SMTP(app.config['MAIL_SERVER'], app.config['MAIL_PORT']) as server:
-            if app.config['MAIL_USE_TLS']:
-                server.starttls()
-            server.login(app.config['MAIL_USERNAME'], app.config['MAIL_PASSWORD'])
-            server.send_message(msg)
-        
+        """, commit=commit)
         return True
     except Exception as e:
-        current_app.logger.error(f"Erreur envoi email: {str(e)}")
+        current_app.logger.error(f"Erreur mise en file email: {str(e)}")
         return False
 
+# ============================================
+# MOTEUR D'EMPRUNT
+# ============================================
+
+class EmpruntRefuse(Exception):
+    """Emprunt refusé par les règles de prêt ; le message est destiné à l'utilisateur."""
+
+
+def _agregat_emprunts_adherent(expr, *conditions):
+    """Sous-requête scalaire sur les emprunts de l'adhérent de la requête englobante."""
+    return db.select(expr).where(
+        Emprunt.adherent_id == Adherent.id, *conditions
+    ).correlate(Adherent).scalar_subquery()
+
+
+def effectuer_emprunt(adherent_id, livre_id, date_retour_prevue=None, reservation=None):
+    """Moteur d'emprunt partagé par le catalogue, le guichet et les réservations.
+
+    L'éligibilité (amendes, retards, quota, doublon, disponibilité) est lue en une
+    seule requête qui verrouille la ligne de l'adhérent ; l'exemplaire est ensuite
+    pris par un UPDATE conditionnel sur `disponible`, de sorte que deux emprunts
+    simultanés du même livre ne peuvent pas réussir tous les deux. L'emprunt (et la
+    réservation honorée, le cas échéant) est validé dans la même transaction.
+
+    Retourne le nouvel emprunt ; lève EmpruntRefuse si l'emprunt n'est pas permis.
+    """
+    cfg = get_library_config()
+    now = datetime.utcnow()
+    en_cours = Emprunt.date_retour_effective == None
+    try:
+        eligibilite = db.session.query(
+            Adherent.id,
+            _agregat_emprunts_adherent(db.func.coalesce(db.func.sum(Emprunt.amende), 0.0)).label('total_amende'),
+            _agregat_emprunts_adherent(db.func.count(Emprunt.id), en_cours,
+                                       Emprunt.date_retour_prevue < now).label('retards'),
+            _agregat_emprunts_adherent(db.func.count(Emprunt.id), en_cours).label('en_cours'),
+            _agregat_emprunts_adherent(db.func.count(Emprunt.id), en_cours,
+                                       Emprunt.livre_id == livre_id).label('deja_emprunte'),
+            db.select(Livre.disponible).where(Livre.id == livre_id).scalar_subquery().label('disponible'),
+        ).filter(Adherent.id == adherent_id).with_for_update().first()
+
+        if eligibilite is None:
+            raise EmpruntRefuse('Adhérent introuvable')
+        if eligibilite.disponible is None:
+            raise EmpruntRefuse('Livre introuvable')
+        if eligibilite.deja_emprunte:
+            raise EmpruntRefuse('Ce livre est déjà emprunté par cet adhérent')
+        if not eligibilite.disponible:
+            raise EmpruntRefuse('Ce livre n\'est pas disponible pour le moment')
+        if float(eligibilite.total_amende or 0) > 0 or eligibilite.retards:
+            raise EmpruntRefuse('Impossible d\'effectuer un emprunt: adhérent en retard ou amendes impayées')
+        if eligibilite.en_cours >= (cfg.max_emprunts or 3):
+            raise EmpruntRefuse('Nombre maximum d\'emprunts atteint pour cet adhérent')
+
+        # Prise atomique de l'exemplaire : une seule transaction concurrente peut réussir
+        pris = Livre.query.filter(
+            Livre.id == livre_id, Livre.disponible == True
+        ).update({Livre.disponible: False}, synchronize_session=False)
+        if not pris:
+            raise EmpruntRefuse('Ce livre n\'est pas disponible pour le moment')
+
+        emprunt = Emprunt(
+            adherent_id=adherent_id,
+            livre_id=livre_id,
+            date_retour_prevue=date_retour_prevue or now + timedelta(days=(cfg.duree_emprunt or 14)),
+            status='en_cours'
+        )
+        db.session.add(emprunt)
+        if reservation is not None:
+            reservation.status = 'fulfilled'
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return emprunt
+
+
 # EMPRUNTER LIVRE
 @app.route('/emprunter_livre/<int:livre_id>', methods=['POST'])
 @login_required
@@ -755,89 +2729,19 @@ def emprunter_livre(livre_id):
 
 def _perform_emprunt(livre_id):
     """Logique partagée pour effectuer un emprunt (utilisée par plusieurs routes)."""
-    livre = Livre.query.get_or_404(livre_id)
-    
-    if not livre.disponible:
-        flash('Ce livre n\'est pas disponible pour le moment', 'error')
-        return redirect(url_for('catalogue'))
-    
     adherent_id_for_query = getattr(current_user, 'adherent_id', None) or current_user.id
 
-    # Charger la configuration de la bibliothèque
-    cfg = get_library_config()
-
-    # Mettre à jour les amendes pour les emprunts en retard (actifs) et calculer total amendes
     try:
-        now = datetime.utcnow()
-        overdues = Emprunt.query.filter(
-            Emprunt.adherent_id == adherent_id_for_query,
-            Emprunt.date_retour_effective == None,
-            Emprunt.date_retour_prevue < now
-        ).all()
-        updated = False
-        for od in overdues:
-            ret_prevue = _to_date(od.date_retour_prevue)
-            days_late = (now.date() - ret_prevue).days if ret_prevue is not None else 0
-            if days_late > 0:
-                new_amende = cfg.amende_par_jour * days_late
-            else:
-                new_amende = 0.0
-            if (od.amende or 0.0) != new_amende:
-                od.amende = new_amende
-                updated = True
-        if updated:
-            try:
-                db.session.commit()
-            except Exception:
-                db.session.rollback()
-    except Exception:
-        current_app.logger.exception('Erreur mise à jour amendes en amont emprunt')
-
-    total_amende = db.session.query(db.func.coalesce(db.func.sum(Emprunt.amende), 0.0)).filter(Emprunt.adherent_id == adherent_id_for_query).scalar() or 0.0
-
-    # Empêcher un nouvel emprunt si l'adhérent a des amendes impayées ou des retards actifs
-    has_overdue_active = Emprunt.query.filter(
-        Emprunt.adherent_id == adherent_id_for_query,
-        Emprunt.date_retour_effective == None,
-        Emprunt.date_retour_prevue < datetime.utcnow()
-    ).count() > 0
-    if total_amende > 0 or has_overdue_active:
-        flash('Impossible d\'effectuer un emprunt: adhérent en retard ou amendes impayées', 'error')
+        nouvel_emprunt = effectuer_emprunt(adherent_id_for_query, livre_id)
+    except EmpruntRefuse as e:
+        flash(str(e), 'error')
         return redirect(url_for('catalogue'))
-
-    # Vérifier le nombre d'emprunts en cours pour cet adhérent
-    emprunts_en_cours = Emprunt.query.filter_by(adherent_id=adherent_id_for_query, date_retour_effective=None).count()
-    if emprunts_en_cours >= (cfg.max_emprunts or 3):
-        flash('Nombre maximum d\'emprunts atteint pour cet adhérent', 'error')
+    except Exception:
+        current_app.logger.exception('Erreur lors de l\'emprunt')
+        flash('Erreur lors de l\'emprunt', 'error')
         return redirect(url_for('catalogue'))
 
-    emprunt_existant = Emprunt.query.filter_by(
-        adherent_id=adherent_id_for_query,
-        livre_id=livre_id,
-        date_retour_effective=None
-    ).first()
-    
-    if emprunt_existant:
-        flash('Vous avez déjà emprunté ce livre', 'error')
-        return redirect(url_for('catalogue'))
-    
-    nouvel_emprunt = Emprunt(
-        adherent_id=adherent_id_for_query,
-        livre_id=livre_id,
-        date_retour_prevue=datetime.utcnow() + timedelta(days=(cfg.duree_emprunt or 14)),
-        status='en_cours'
-    )
-    
-    livre.disponible = False
-    
-    try:
-        db.session.add(nouvel_emprunt)
-        db.session.commit()
-        flash(f'Livre "{livre.titre}" emprunté avec succès! Date de retour: {nouvel_emprunt.date_retour_prevue.strftime("%d/%m/%Y")}', 'success')
-    except Exception as e:
-        db.session.rollback()
-        flash('Erreur lors de l\'emprunt', 'error')
-    
+    flash(f'Livre "{nouvel_emprunt.livre.titre}" emprunté avec succès! Date de retour: {nouvel_emprunt.date_retour_prevue.strftime("%d/%m/%Y")}', 'success')
     return redirect(url_for('catalogue'))
 
 
@@ -852,7 +2756,7 @@ def emprunter_compat(livre_id):
 @login_required
 def mes_emprunts():
     adherent_id_for_query = getattr(current_user, 'adherent_id', None) or current_user.id
-    emprunts_utilisateur = Emprunt.query.filter_by(
+    emprunts_utilisateur = Emprunt.query.options(joinedload(Emprunt.livre)).filter_by(
         adherent_id=adherent_id_for_query
     ).order_by(Emprunt.date_emprunt.desc()).all()
     
@@ -889,15 +2793,9 @@ def contact():
             flash('Veuillez utiliser une adresse email personnelle pour nous contacter', 'danger')
             return render_template("contact.html", title="Contact")
         
-        # Envoi de l'email
+        # Mise en file de l'email (envoyé à la bibliothèque, réponse directe à l'expéditeur)
         try:
-            msg = EmailMessage()
-            msg['Subject'] = f'Message de contact - {sujet}'
-            msg['From'] = app.config['EMAIL_FROM']
-            msg['To'] = app.config['EMAIL_FROM']  # Envoi à la bibliothèque
-            msg['Reply-To'] = email  # Pour pouvoir répondre directement à l'expéditeur
-            
-            msg.set_content(f"""
+            mettre_en_file_email(app.config['EMAIL_FROM'], f'Message de contact - {sujet}', f"""
             Nouveau message de contact reçu :
             
             Nom complet : {nom_complet}
@@ -909,13 +2807,7 @@ def contact():
             
             ---
             Ce message a été envoyé via le formulaire de contact du site web.
-            """)
-            
-            with smtplib.SMTP(app.config['MAIL_SERVER'], app.config['MAIL_PORT']) as server:
-                if app.config['MAIL_USE_TLS']:
-                    server.starttls()
-                server.login(app.config['MAIL_USERNAME'], app.config['MAIL_PASSWORD'])
-                server.send_message(msg)
+            """, reply_to=email)
             
             flash('Votre message a été envoyé avec succès ! Nous vous répondrons dans les plus brefs délais.', 'success')
             return redirect(url_for('contact'))
@@ -933,7 +2825,7 @@ def register():
         return redirect(url_for('dashboard'))
 
     # Vérifier si un administrateur existe déjà
-    admin_exists = User.query.filter_by(role='admin').first() is not None
+    admin_exists = get_admin_exists()
 
     # Si aucun admin n'existe, afficher la page de choix (permet de créer le premier admin)
     if not admin_exists:
@@ -955,7 +2847,7 @@ def register_with_type(user_type):
         return redirect(url_for('index'))
     
     # Vérifier si un admin existe déjà (pour éviter les doublons)
-    admin_exists = User.query.filter_by(role='admin').first() is not None
+    admin_exists = get_admin_exists()
     if user_type == 'admin' and admin_exists:
         flash('Un administrateur existe déjà. Contactez l\'administrateur actuel pour créer un nouveau compte admin.', 'warning')
         return redirect(url_for('login'))
@@ -1028,7 +2920,7 @@ def register_with_type(user_type):
         if not confirmed:
             code = _generate_confirmation_code()
             user.confirmation_code = code
-            user.confirmation_expires = datetime.utcnow() + timedelta(minutes=30)
+            user.confirmation_expires = datetime.utcnow() + CODE_VERIFICATION_DUREE
         
         user.set_password(password)
         
@@ -1124,7 +3016,7 @@ def login():
                     # Générer et envoyer un nouveau code
                     code = _generate_confirmation_code()
                     user.confirmation_code = code
-                    user.confirmation_expires = datetime.utcnow() + timedelta(minutes=30)
+                    user.confirmation_expires = datetime.utcnow() + CODE_VERIFICATION_DUREE
                     
                     try:
                         db.session.commit()
@@ -1154,12 +3046,6 @@ def login():
 
     return render_template("login.html", title="Connexion")
 
-@app.context_processor
-def inject_admin_exists():
-    """Injecte la variable admin_exists dans tous les templates"""
-    admin_exists = User.query.filter_by(role='admin').first() is not None
-    return dict(admin_exists=admin_exists)
-
 @app.route("/deconnexion")
 @login_required
 def logout():
@@ -1337,7 +3223,7 @@ def adherents():
                     if not confirmed_flag:
                         code = _generate_confirmation_code()
                         user.confirmation_code = code
-                        user.confirmation_expires = datetime.utcnow() + timedelta(minutes=30)
+                        user.confirmation_expires = datetime.utcnow() + CODE_VERIFICATION_DUREE
 
                     user.set_password(password if password else uuid.uuid4().hex)
                     user.adherent = nouveau_adherent
@@ -1412,8 +3298,18 @@ def adherents():
     if emprunteurs_only:
         query = query.join(Emprunt).group_by(Adherent.id)
 
-    adherents_liste = query.order_by(Adherent.nom.asc()).all()
+    # Nombre d'emprunts en cours calculé par sous-requête et comptes utilisateurs chargés
+    # en lot : la page coûte un nombre constant de requêtes quel que soit le nombre d'adhérents
+    nb_en_cours = db.select(db.func.count(Emprunt.id)).where(
+        Emprunt.adherent_id == Adherent.id,
+        Emprunt.date_retour_effective == None
+    ).correlate(Adherent).scalar_subquery()
+    rows = query.options(selectinload(Adherent.user)).add_columns(nb_en_cours).order_by(Adherent.nom.asc()).all()
+    adherents_liste = [a for a, _ in rows]
+    emprunts_en_cours = {a.id: nb for a, nb in rows}
+    imports = ImportAdherents.query.order_by(ImportAdherents.date_demande.desc()).limit(5).all()
     return render_template("adherents.html", title="Adhérents", adherents=adherents_liste,
+                           emprunts_en_cours=emprunts_en_cours, imports=imports,
                            recherche_term=recherche, classe_selected=classe, statut_selected=statut,
                            emprunteurs_selected= ('1' if emprunteurs_only else '0'))
 
@@ -1499,7 +3395,7 @@ def new_adherent():
                     if not confirmed_flag:
                         code = _generate_confirmation_code()
                         user.confirmation_code = code
-                        user.confirmation_expires = datetime.utcnow() + timedelta(minutes=30)
+                        user.confirmation_expires = datetime.utcnow() + CODE_VERIFICATION_DUREE
 
                     user.set_password(password if password else uuid.uuid4().hex)
                     user.adherent = nouveau_adherent
@@ -1548,35 +3444,7 @@ def new_adherent():
 @login_required
 def view_adherent(adherent_id):
     a = Adherent.query.get_or_404(adherent_id)
-    # Mettre à jour et calculer les amendes courantes pour l'adhérent
-    try:
-        cfg = get_library_config()
-        now = datetime.utcnow()
-        overdues = Emprunt.query.filter(
-            Emprunt.adherent_id == a.id,
-            Emprunt.date_retour_effective == None,
-            Emprunt.date_retour_prevue < now
-        ).all()
-        updated = False
-        for od in overdues:
-            ret_prevue = _to_date(od.date_retour_prevue)
-            days_late = (now.date() - ret_prevue).days if ret_prevue is not None else 0
-            if days_late > 0:
-                new_amende = cfg.amende_par_jour * days_late
-            else:
-                new_amende = 0.0
-            if (od.amende or 0.0) != new_amende:
-                od.amende = new_amende
-                updated = True
-        if updated:
-            try:
-                db.session.commit()
-            except Exception:
-                db.session.rollback()
-    except Exception:
-        current_app.logger.exception('Erreur calcul amendes vue adherent')
-
-    total_amende = db.session.query(db.func.coalesce(db.func.sum(Emprunt.amende), 0.0)).filter(Emprunt.adherent_id == a.id).scalar() or 0.0
+    total_amende, _ = solde_adherent(a.id)
 
     return render_template('adherent_view.html', title=f"Adhérent {a.nom}", adherent=a, total_amende=total_amende)
 
@@ -1604,10 +3472,128 @@ def edit_adherent(adherent_id):
 @login_required
 def adherent_emprunts(adherent_id):
     a = Adherent.query.get_or_404(adherent_id)
-    emprunts_liste = Emprunt.query.filter_by(adherent_id=adherent_id).order_by(Emprunt.date_emprunt.desc()).all()
+    emprunts_liste = Emprunt.query.options(joinedload(Emprunt.livre)).filter_by(adherent_id=adherent_id).order_by(Emprunt.date_emprunt.desc()).all()
     livres_disponibles = Livre.query.filter_by(disponible=True).all()
     return render_template('adherent_emprunts.html', title=f"Emprunts {a.nom}", adherent=a, emprunts=emprunts_liste, livres=livres_disponibles)
 
+EMPRUNTS_PAGE_SIZE = 50
+RESERVATIONS_ACTIVES_LIMITE = 100
+
+# Tris autorisés pour la liste des emprunts : colonne SQL et lecture de la valeur sur une ligne
+EMPRUNTS_TRIS = {
+    'date_emprunt': (Emprunt.date_emprunt, lambda e: e.date_emprunt),
+    'date_retour_prevue': (Emprunt.date_retour_prevue, lambda e: e.date_retour_prevue),
+    'livre': (Livre.titre, lambda e: e.livre.titre),
+    'adherent': (Adherent.nom, lambda e: e.adherent.nom),
+    'statut': (Emprunt.status, lambda e: e.status),
+}
+
+
+def _encode_curseur(valeur, emprunt_id):
+    if isinstance(valeur, datetime):
+        valeur = {'dt': valeur.isoformat()}
+    return base64.urlsafe_b64encode(json.dumps([valeur, emprunt_id]).encode()).decode()
+
+
+def _decode_curseur(curseur):
+    try:
+        valeur, emprunt_id = json.loads(base64.urlsafe_b64decode(curseur.encode()))
+        if isinstance(valeur, dict):
+            valeur = datetime.fromisoformat(valeur['dt'])
+        return valeur, int(emprunt_id)
+    except Exception:
+        return None
+
+
+def _filtres_emprunts(args):
+    """Lit les filtres, le tri et l'ordre de la liste des emprunts depuis la query string."""
+    def _date(nom):
+        try:
+            return datetime.strptime(args.get(nom, ''), '%Y-%m-%d')
+        except ValueError:
+            return None
+
+    tri = args.get('tri', 'date_emprunt')
+    return {
+        'statut': args.get('statut', 'tous'),
+        'retard': args.get('retard') == '1',
+        'adherent_id': args.get('adherent_id', type=int),
+        'livre_id': args.get('livre_id', type=int),
+        'date_debut': _date('date_debut'),
+        'date_fin': _date('date_fin'),
+        'tri': tri if tri in EMPRUNTS_TRIS else 'date_emprunt',
+        'ordre': 'asc' if args.get('ordre') == 'asc' else 'desc',
+    }
+
+
+def page_emprunts(filtres, curseur=None, per_page=EMPRUNTS_PAGE_SIZE):
+    """Une page de la liste des emprunts, filtrée et triée côté serveur.
+
+    Pagination par clé (valeur de tri, id) : le coût d'une page ne dépend pas de la
+    taille de l'historique. Retourne (emprunts, curseur de la page suivante ou None).
+    """
+    now = datetime.utcnow()
+    query = Emprunt.query.join(Emprunt.livre).join(Emprunt.adherent).options(
+        contains_eager(Emprunt.livre), contains_eager(Emprunt.adherent)
+    )
+
+    if filtres['statut'] == 'en_cours':
+        query = query.filter(Emprunt.date_retour_effective == None)
+    elif filtres['statut'] == 'rendu':
+        query = query.filter(Emprunt.date_retour_effective != None)
+    if filtres['statut'] == 'en_retard' or filtres['retard']:
+        query = query.filter(Emprunt.date_retour_effective == None, Emprunt.date_retour_prevue < now)
+    if filtres['adherent_id']:
+        query = query.filter(Emprunt.adherent_id == filtres['adherent_id'])
+    if filtres['livre_id']:
+        query = query.filter(Emprunt.livre_id == filtres['livre_id'])
+    if filtres['date_debut']:
+        query = query.filter(Emprunt.date_emprunt >= filtres['date_debut'])
+    if filtres['date_fin']:
+        query = query.filter(Emprunt.date_emprunt < filtres['date_fin'] + timedelta(days=1))
+
+    colonne, lire_valeur = EMPRUNTS_TRIS[filtres['tri']]
+    descendant = filtres['ordre'] == 'desc'
+    repere = _decode_curseur(curseur) if curseur else None
+    if repere:
+        valeur, dernier_id = repere
+        if descendant:
+            query = query.filter(db.or_(colonne < valeur, db.and_(colonne == valeur, Emprunt.id < dernier_id)))
+        else:
+            query = query.filter(db.or_(colonne > valeur, db.and_(colonne == valeur, Emprunt.id > dernier_id)))
+
+    if descendant:
+        query = query.order_by(colonne.desc(), Emprunt.id.desc())
+    else:
+        query = query.order_by(colonne.asc(), Emprunt.id.asc())
+
+    rows = query.limit(per_page + 1).all()
+    suivant = None
+    if len(rows) > per_page:
+        rows = rows[:per_page]
+        suivant = _encode_curseur(lire_valeur(rows[-1]), rows[-1].id)
+    return rows, suivant
+
+
+def stats_emprunts():
+    """Compteurs de la page des emprunts, calculés sur les emprunts actifs (index
+    `ix_emprunt_retour_prevue`) et les retours récents plutôt que sur tout l'historique.
+    """
+    now = datetime.utcnow()
+    en_cours, en_retard, prolongations = db.session.query(
+        db.func.count(Emprunt.id),
+        db.func.coalesce(db.func.sum(db.case((Emprunt.date_retour_prevue < now, 1), else_=0)), 0),
+        db.func.coalesce(db.func.sum(Emprunt.prolongations), 0)
+    ).filter(Emprunt.date_retour_effective == None).one()
+    rendus_30j = Emprunt.query.filter(Emprunt.date_retour_effective >= now - timedelta(days=30)).count()
+    return {
+        'en_cours': en_cours,
+        'en_retard': int(en_retard),
+        'prolongations': int(prolongations),
+        'rendus_30j': rendus_30j
+    }
+
+
 @app.route("/dashboard/emprunts", methods=['GET', 'POST'])
 @login_required
 def emprunts():
@@ -1626,56 +3612,38 @@ def emprunts():
             return redirect(url_for('emprunts'))
 
         try:
-            adherent = Adherent.query.get(int(adherent_id))
-            livre = Livre.query.get(int(livre_id))
             date_retour_prevue = datetime.strptime(date_retour_str, '%Y-%m-%d')
-
-            if not adherent or not livre:
-                flash('Adhérent ou livre introuvable', 'danger')
-                return redirect(url_for('emprunts'))
-
-            if not livre.disponible:
-                flash('Le livre sélectionné n\'est pas disponible', 'danger')
-                return redirect(url_for('emprunts'))
-
-            # Vérifier qu'il n'y a pas déjà un emprunt actif pour ce livre
-            emprunt_actif = Emprunt.query.filter_by(livre_id=livre.id, date_retour_effective=None).first()
-            if emprunt_actif:
-                flash('Le livre est déjà emprunté', 'danger')
-                return redirect(url_for('emprunts'))
-
-            nouvel_emprunt = Emprunt(
-                adherent_id=adherent.id,
-                livre_id=livre.id,
-                date_retour_prevue=date_retour_prevue,
-                status='en_cours'
-            )
-
-            livre.disponible = False
-
-            db.session.add(nouvel_emprunt)
-            db.session.commit()
-            flash(f'Emprunt créé: "{livre.titre}" pour {adherent.nom} {adherent.prenom}', 'success')
+            nouvel_emprunt = effectuer_emprunt(int(adherent_id), int(livre_id), date_retour_prevue=date_retour_prevue)
+            adherent = nouvel_emprunt.adherent
+            flash(f'Emprunt créé: "{nouvel_emprunt.livre.titre}" pour {adherent.nom} {adherent.prenom}', 'success')
+            return redirect(url_for('emprunts'))
+        except EmpruntRefuse as e:
+            flash(str(e), 'danger')
             return redirect(url_for('emprunts'))
         except Exception:
-            db.session.rollback()
             current_app.logger.exception('Erreur lors de la création de l\'emprunt')
             flash('Erreur lors de la création de l\'emprunt', 'danger')
             return redirect(url_for('emprunts'))
 
-    emprunts_liste = Emprunt.query.all()
-    adherents_liste = Adherent.query.all()
-    livres_disponibles = Livre.query.filter_by(disponible=True).all()
-    reservations_liste = Reservation.query.order_by(Reservation.date_reservation.desc()).all()
+    filtres = _filtres_emprunts(request.args)
+    emprunts_liste, curseur_suivant = page_emprunts(filtres)
+    reservations_liste = Reservation.query.options(
+        joinedload(Reservation.livre), joinedload(Reservation.adherent)
+    ).filter(Reservation.status == 'active').order_by(
+        Reservation.date_reservation.desc()
+    ).limit(RESERVATIONS_ACTIVES_LIMITE).all()
+    nb_reservations_actives = Reservation.query.filter_by(status='active').count()
     cfg = get_library_config()
 
     return render_template(
         "emprunts.html",
         title="Emprunts",
         emprunts=emprunts_liste,
-        adherents=adherents_liste,
-        livres=livres_disponibles,
+        curseur_suivant=curseur_suivant,
+        filtres=filtres,
+        stats=stats_emprunts(),
         reservations=reservations_liste,
+        nb_reservations_actives=nb_reservations_actives,
         now=datetime.utcnow(),
         today=datetime.utcnow().date(),
         timedelta=timedelta
@@ -1688,6 +3656,52 @@ def emprunts():
         }
     )
 
+@app.route("/dashboard/emprunts/api")
+@login_required
+def emprunts_api():
+    """Page suivante de la liste des emprunts en JSON (chargement incrémental)."""
+    if not has_roles('admin', 'bibliothecaire'):
+        return {'error': 'Accès non autorisé'}, 403
+
+    filtres = _filtres_emprunts(request.args)
+    emprunts_liste, curseur_suivant = page_emprunts(filtres, curseur=request.args.get('curseur'))
+    now = datetime.utcnow()
+    return {
+        'items': [{
+            'id': e.id,
+            'livre_id': e.livre_id,
+            'livre': e.livre.titre,
+            'adherent_id': e.adherent_id,
+            'adherent': f"{e.adherent.nom} {e.adherent.prenom}",
+            'date_emprunt': e.date_emprunt.isoformat() if e.date_emprunt else None,
+            'date_retour_prevue': e.date_retour_prevue.isoformat() if e.date_retour_prevue else None,
+            'date_retour_effective': e.date_retour_effective.isoformat() if e.date_retour_effective else None,
+            'en_retard': e.date_retour_effective is None and e.date_retour_prevue < now,
+            'prolongations': e.prolongations,
+            'amende': e.amende,
+            'status': e.status
+        } for e in emprunts_liste],
+        'html': render_template('emprunts_rows.html', emprunts=emprunts_liste, now=now),
+        'curseur_suivant': curseur_suivant
+    }
+
+
+@app.route("/dashboard/emprunts/choix/<string:type_choix>")
+@login_required
+def choix_emprunt(type_choix):
+    """Options des listes déroulantes des modals d'emprunt/réservation, chargées à l'ouverture."""
+    if not has_roles('admin', 'bibliothecaire'):
+        return {'error': 'Accès non autorisé'}, 403
+
+    if type_choix == 'adherents':
+        rows = db.session.query(Adherent.id, Adherent.nom, Adherent.prenom).order_by(Adherent.nom, Adherent.prenom)
+        return {'options': [{'id': i, 'label': f"{nom} {prenom}"} for i, nom, prenom in rows]}
+    if type_choix == 'livres':
+        rows = db.session.query(Livre.id, Livre.titre, Livre.auteur).filter(Livre.disponible == True).order_by(Livre.titre)
+        return {'options': [{'id': i, 'label': f"{titre} - {auteur}"} for i, titre, auteur in rows]}
+    return {'error': 'Type inconnu'}, 404
+
+
 # ============================================
 # ROUTES POUR LES BIBLIOTHÉCAIRES
 # ============================================
@@ -1827,10 +3841,7 @@ def create_bibliothecaire():
         if photo and photo.filename:
             filename = secure_filename(photo.filename)
             if filename:
-                unique_filename = f"{uuid.uuid4().hex}_{filename}"
-                photo_path = os.path.join(app.config['PROFILE_FOLDER'], unique_filename)
-                photo.save(photo_path)
-                nouveau_bibliothecaire.image = unique_filename
+                nouveau_bibliothecaire.image = stocker_fichier(photo, app.config['PROFILE_FOLDER'], _extension(filename))
         
         db.session.add(nouveau_bibliothecaire)
         db.session.flush()  # Pour obtenir l'ID
@@ -1875,14 +3886,9 @@ def create_bibliothecaire():
             user.bibliothecaire = nouveau_bibliothecaire
             db.session.add(user)
             
-            # Envoyer un email de bienvenue
+            # Email de bienvenue, validé avec la création du compte
             try:
-                msg = EmailMessage()
-                msg['Subject'] = 'Bienvenue dans l\'équipe de la bibliothèque'
-                msg['From'] = app.config['EMAIL_FROM']
-                msg['To'] = email
-                
-                msg.set_content(f"""
+                mettre_en_file_email(email, 'Bienvenue dans l\'équipe de la bibliothèque', f"""
                 Bonjour {prenom} {nom},
                 
                 Votre compte bibliothécaire a été créé avec succès.
@@ -1896,15 +3902,9 @@ def create_bibliothecaire():
                 
                 Cordialement,
                 L\'équipe de la Bibliothèque
-                """)
-                
-                with smtplib.SMTP(app.config['MAIL_SERVER'], app.config['MAIL_PORT']) as server:
-                    if app.config['MAIL_USE_TLS']:
-                        server.starttls()
-                    server.login(app.config['MAIL_USERNAME'], app.config['MAIL_PASSWORD'])
-                    server.send_message(msg)
+                """, commit=False)
             except Exception as e:
-                current_app.logger.error(f"Erreur lors de l'envoi de l'email de bienvenue : {str(e)}")
+                current_app.logger.error(f"Erreur lors de la mise en file de l'email de bienvenue : {str(e)}")
                 # Ne pas bloquer la création si l'email échoue
         
         db.session.commit()
@@ -1987,21 +3987,17 @@ def edit_bibliothecaire(id):
             
             # Gérer l'upload de la photo
             photo = request.files.get('photo')
+            ancienne_photo = None
             if photo and photo.filename:
                 filename = secure_filename(photo.filename)
                 if filename:
-                    # Supprimer l'ancienne photo si elle existe
-                    if bibliothecaire.image:
-                        old_photo_path = os.path.join(app.config['PROFILE_FOLDER'], bibliothecaire.image)
-                        if os.path.exists(old_photo_path):
-                            os.remove(old_photo_path)
-                    
-                    unique_filename = f"{uuid.uuid4().hex}_{filename}"
-                    photo_path = os.path.join(app.config['PROFILE_FOLDER'], unique_filename)
-                    photo.save(photo_path)
-                    bibliothecaire.image = unique_filename
+                    ancienne_photo = bibliothecaire.image
+                    bibliothecaire.image = stocker_fichier(photo, app.config['PROFILE_FOLDER'], _extension(filename))
             
             db.session.commit()
+            # L'ancienne photo n'est supprimée que si plus aucun profil ne l'utilise
+            if ancienne_photo and ancienne_photo != bibliothecaire.image:
+                supprimer_fichier_orphelin('PROFILE_FOLDER', ancienne_photo)
             flash('Bibliothécaire mis à jour avec succès', 'success')
             return redirect(url_for('view_bibliothecaire', id=bibliothecaire.id))
             
@@ -2025,11 +4021,7 @@ def delete_bibliothecaire(id):
     bibliothecaire = Bibliothecaire.query.get_or_404(id)
     
     try:
-        # Supprimer la photo si elle existe
-        if bibliothecaire.image:
-            photo_path = os.path.join(app.config['PROFILE_FOLDER'], bibliothecaire.image)
-            if os.path.exists(photo_path):
-                os.remove(photo_path)
+        photo = bibliothecaire.image
         
         # Supprimer le compte utilisateur associé s'il existe
         user = User.query.filter_by(bibliothecaire_id=id).first()
@@ -2039,6 +4031,8 @@ def delete_bibliothecaire(id):
         # Supprimer le bibliothécaire
         db.session.delete(bibliothecaire)
         db.session.commit()
+        # Supprimer la photo si plus aucun profil ne l'utilise
+        supprimer_fichier_orphelin('PROFILE_FOLDER', photo)
         
         flash('Bibliothécaire supprimé avec succès', 'success')
     except Exception as e:
@@ -2208,12 +4202,7 @@ def create_bibliothecaire_account(id):
         
         # Envoyer un email avec les informations de connexion
         try:
-            msg = EmailMessage()
-            msg['Subject'] = 'Votre compte bibliothécaire a été créé'
-            msg['From'] = app.config['EMAIL_FROM']
-            msg['To'] = bibliothecaire.email
-            
-            msg.set_content(f"""
+            mettre_en_file_email(bibliothecaire.email, 'Votre compte bibliothécaire a été créé', f"""
             Bonjour {bibliothecaire.prenom} {bibliothecaire.nom},
             
             Un compte utilisateur a été créé pour vous sur le système de la bibliothèque.
@@ -2227,14 +4216,8 @@ def create_bibliothecaire_account(id):
             Cordialement,
             L\'équipe de la Bibliothèque
             """)
-            
-            with smtplib.SMTP(app.config['MAIL_SERVER'], app.config['MAIL_PORT']) as server:
-                if app.config['MAIL_USE_TLS']:
-                    server.starttls()
-                server.login(app.config['MAIL_USERNAME'], app.config['MAIL_PASSWORD'])
-                server.send_message(msg)
         except Exception as e:
-            current_app.logger.error(f"Erreur lors de l'envoi de l'email : {str(e)}")
+            current_app.logger.error(f"Erreur lors de la mise en file de l'email : {str(e)}")
         
     except Exception as e:
         db.session.rollback()
@@ -2315,7 +4298,9 @@ def reservations_list():
     if not has_roles('admin', 'bibliothecaire'):
         flash('Accès non autorisé', 'danger')
         return redirect(url_for('dashboard'))
-    res = Reservation.query.order_by(Reservation.date_reservation.desc()).all()
+    res = Reservation.query.options(
+        joinedload(Reservation.livre), joinedload(Reservation.adherent)
+    ).order_by(Reservation.date_reservation.desc()).all()
     return render_template('reservations.html', title='Réservations', reservations=res)
 
 @app.route('/mes_reservations')
@@ -2326,7 +4311,7 @@ def mes_reservations():
         flash('Aucun profil adhérent lié à votre compte. Impossible d\'afficher les réservations.', 'warning')
         return redirect(url_for('mes_emprunts'))
 
-    reservations = Reservation.query.filter_by(adherent_id=adherent_id).order_by(Reservation.date_reservation.desc()).all()
+    reservations = Reservation.query.options(joinedload(Reservation.livre)).filter_by(adherent_id=adherent_id).order_by(Reservation.date_reservation.desc()).all()
     return render_template('mes_reservations.html', title='Mes Réservations', reservations=reservations)
 
 @app.route('/reservation/cancel/<int:res_id>', methods=['POST'])
@@ -2365,70 +4350,337 @@ def fulfill_reservation(res_id):
         flash('Réservation non active', 'warning')
         return redirect(url_for('reservations_list'))
 
-    if not r.livre.disponible:
-        flash('Livre non disponible pour prêt', 'danger')
+    try:
+        effectuer_emprunt(r.adherent_id, r.livre_id, reservation=r)
+        flash('Réservation transformée en emprunt', 'success')
+    except EmpruntRefuse as e:
+        flash(f'Impossible de transformer la réservation en emprunt: {e}', 'danger')
+    except Exception:
+        current_app.logger.exception('Erreur lors de la transformation de la réservation')
+        flash('Erreur lors du traitement', 'danger')
+    return redirect(url_for('reservations_list'))
+
+@app.route('/dashboard/reservations/cancel/<int:res_id>', methods=['POST'])
+@login_required
+def cancel_reservation(res_id):
+    if not has_roles('admin', 'bibliothecaire'):
+        flash('Accès non autorisé', 'danger')
+        return redirect(url_for('dashboard'))
+    r = Reservation.query.get_or_404(res_id)
+    if r.status != 'active':
+        flash('Réservation non active', 'warning')
         return redirect(url_for('reservations_list'))
+    r.status = 'cancelled'
+    try:
+        db.session.commit()
+        flash('Réservation annulée', 'success')
+    except Exception:
+        db.session.rollback()
+        flash('Erreur lors de l\'annulation', 'danger')
+    return redirect(url_for('reservations_list'))
 
-    cfg = get_library_config()
-    # Vérifier amendes/retards pour l'adhérent de la réservation
+# ============================================
+# STOCKAGE DES FICHIERS TÉLÉVERSÉS
+# ============================================
+# PDF, couvertures et photos de profil sont enregistrés sous l'empreinte SHA-256 de leur
+# contenu (`<empreinte>.<extension>`) : un même fichier n'est stocké qu'une fois quel que soit
+# le nombre de livres ou de profils qui le référencent, un upload ne peut plus écraser le
+# fichier d'un autre, et l'URL d'un fichier ne change jamais de contenu (cache illimité).
+# `flask adresser-fichiers` convertit les fichiers enregistrés avant ce schéma ;
+# `flask purger-fichiers` supprime les fichiers que plus aucune ligne ne référence.
+
+STOCKAGE_CHUNK_SIZE = 1024 * 1024
+# Un fichier (re)déposé depuis moins longtemps n'est jamais supprimé comme orphelin : l'upload
+# qui le réutilise n'a peut-être pas encore validé la ligne qui le référence.
+STOCKAGE_DELAI_GRACE = timedelta(hours=1)
+NOM_ADRESSE = re.compile(r'(^|/)[0-9a-f]{64}[._]')
+
+# Colonnes qui référencent les fichiers de chaque dossier d'upload
+STOCKAGE_REFERENCES = {
+    'UPLOAD_FOLDER': ((Livre, 'contenu_pdf'), (ExtractionPdf, 'fichier'), (TeleversementPdf, 'fichier')),
+    'COUVERTURE_FOLDER': ((Livre, 'image_couverture'),),
+    'PROFILE_FOLDER': ((User, 'image'), (Bibliothecaire, 'image')),
+}
+
+
+def stocker_fichier(fichier, dossier, extension):
+    """Enregistre un upload (FileStorage ou flux binaire) sous l'empreinte de son contenu.
+
+    Le flux est copié par blocs dans un fichier temporaire du dossier tout en étant haché,
+    puis renommé ; si ce contenu est déjà stocké, le temporaire est simplement supprimé.
+    Retourne le nom à enregistrer en base.
+    """
+    flux = getattr(fichier, 'stream', fichier)
+    empreinte = hashlib.sha256()
+    os.makedirs(dossier, exist_ok=True)
+    descripteur, temporaire = tempfile.mkstemp(dir=dossier, prefix='.upload-')
     try:
-        now = datetime.utcnow()
-        overdues = Emprunt.query.filter(
-            Emprunt.adherent_id == r.adherent_id,
-            Emprunt.date_retour_effective == None,
-            Emprunt.date_retour_prevue < now
-        ).all()
-        updated = False
-        for od in overdues:
-            ret_prevue = _to_date(od.date_retour_prevue)
-            days_late = (now.date() - ret_prevue).days if ret_prevue is not None else 0
-            new_amende = cfg.amende_par_jour * days_late if days_late > 0 else 0.0
-            if (od.amende or 0.0) != new_amende:
-                od.amende = new_amende
-                updated = True
-        if updated:
+        with os.fdopen(descripteur, 'wb') as sortie:
+            for bloc in iter(lambda: flux.read(STOCKAGE_CHUNK_SIZE), b''):
+                empreinte.update(bloc)
+                sortie.write(bloc)
+        return _ranger_sous_empreinte(temporaire, dossier, empreinte.hexdigest(), extension)
+    except BaseException:
+        if os.path.exists(temporaire):
+            os.remove(temporaire)
+        raise
+
+
+def _empreinte_fichier(chemin):
+    empreinte = hashlib.sha256()
+    with open(chemin, 'rb') as source:
+        for bloc in iter(lambda: source.read(STOCKAGE_CHUNK_SIZE), b''):
+            empreinte.update(bloc)
+    return empreinte.hexdigest()
+
+
+_verrou_thread_stockage = threading.Lock()
+
+
+@contextmanager
+def _verrou_stockage(dossier):
+    """Sérialise, entre threads et processus, le dépôt d'un fichier et la suppression d'un orphelin."""
+    with _verrou_thread_stockage:
+        fichier = None
+        try:
+            if fcntl is not None:
+                fichier = open(os.path.join(dossier, '.verrou'), 'a')
+                fcntl.flock(fichier, fcntl.LOCK_EX)
+            yield
+        finally:
+            if fichier is not None:
+                fichier.close()
+
+
+def _ranger_sous_empreinte(chemin, dossier, empreinte, extension):
+    """Renomme `chemin` (même système de fichiers que `dossier`) en `<empreinte>.<extension>`."""
+    nom = empreinte + (f'.{extension.lower()}' if extension else '')
+    destination = os.path.join(dossier, nom)
+    with _verrou_stockage(dossier):
+        if os.path.exists(destination):
+            os.remove(chemin)
+            # Rafraîchir la date : protège le fichier du nettoyage des orphelins (STOCKAGE_DELAI_GRACE)
+            os.utime(destination)
+        else:
+            os.chmod(chemin, 0o644)
+            os.replace(chemin, destination)
+    return nom
+
+
+def _extension(nom_fichier):
+    nom_fichier = secure_filename(nom_fichier or '')
+    return nom_fichier.rsplit('.', 1)[1].lower() if '.' in nom_fichier else ''
+
+
+def supprimer_fichier_orphelin(cle_dossier, nom):
+    """Supprime un fichier d'upload qui n'est plus référencé (à appeler après le commit)."""
+    if not nom:
+        return False
+    for modele, attribut in STOCKAGE_REFERENCES[cle_dossier]:
+        if db.session.query(modele.query.filter(getattr(modele, attribut) == nom).exists()).scalar():
+            return False
+    chemin = os.path.join(app.config[cle_dossier], nom)
+    try:
+        with _verrou_stockage(app.config[cle_dossier]):
+            if not os.path.exists(chemin):
+                return False
+            if time.time() - os.path.getmtime(chemin) < STOCKAGE_DELAI_GRACE.total_seconds():
+                return False
+            os.remove(chemin)
+            return True
+    except OSError:
+        current_app.logger.exception(f'Impossible de supprimer le fichier {chemin}')
+    return False
+
+
+@app.after_request
+def _cache_fichiers_adresses(response):
+    # Fichier nommé d'après son contenu (ou vignette dérivée) : l'URL est immuable
+    if request.endpoint == 'static' and response.status_code in (200, 304) and \
+            NOM_ADRESSE.search((request.view_args or {}).get('filename', '')):
+        response.headers['Cache-Control'] = 'public, max-age=31536000, immutable'
+    return response
+
+
+def adresser_fichiers_existants():
+    """Renomme les uploads existants d'après leur contenu et met à jour leurs références.
+
+    Les doublons convergent vers un seul fichier. Retourne (fichiers traités, doublons supprimés).
+    """
+    traites, doublons = 0, 0
+    for cle_dossier, colonnes in STOCKAGE_REFERENCES.items():
+        dossier = app.config[cle_dossier]
+        with os.scandir(dossier) as entrees:
+            noms = [e.name for e in entrees
+                    if e.is_file() and not e.name.startswith('.') and not NOM_ADRESSE.match(e.name)]
+        deja_stockes = set(os.listdir(dossier))
+        for nom in noms:
+            chemin = os.path.join(dossier, nom)
+            with open(chemin, 'rb') as source:
+                nouveau = stocker_fichier(source, dossier, _extension(nom))
+            for modele, attribut in colonnes:
+                colonne = getattr(modele, attribut)
+                modele.query.filter(colonne == nom).update({colonne: nouveau}, synchronize_session=False)
+            db.session.commit()
+            os.remove(chemin)
+            traites += 1
+            doublons += nouveau in deja_stockes
+            deja_stockes.add(nouveau)
+    return traites, doublons
+
+
+@app.cli.command('adresser-fichiers')
+def adresser_fichiers_command():
+    """Convertit les uploads existants au stockage par empreinte de contenu."""
+    traites, doublons = adresser_fichiers_existants()
+    print(f'{traites} fichier(s) renommé(s), dont {doublons} doublon(s) fusionné(s)')
+    if traites:
+        print('Relancer `flask generer-vignettes` pour les couvertures renommées')
+
+
+def _noms_references(cle_dossier):
+    noms = set()
+    for modele, attribut in STOCKAGE_REFERENCES[cle_dossier]:
+        colonne = getattr(modele, attribut)
+        noms.update(nom for (nom,) in db.session.query(colonne).filter(colonne != None).distinct())
+    return noms
+
+
+def _purger_dossier(dossier, conserves, simulation):
+    """Supprime les fichiers de `dossier` absents de `conserves` et plus vieux que le délai de grâce."""
+    limite = time.time() - STOCKAGE_DELAI_GRACE.total_seconds()
+    with os.scandir(dossier) as entrees:
+        candidats = [e.name for e in entrees if e.is_file() and not e.name.startswith('.')
+                     and e.name not in conserves and e.stat().st_mtime < limite]
+    if simulation:
+        return candidats
+    supprimes = []
+    with _verrou_stockage(dossier):
+        for nom in candidats:
+            chemin = os.path.join(dossier, nom)
             try:
-                db.session.commit()
-            except Exception:
-                db.session.rollback()
+                # Réutilisé depuis l'inventaire : `_ranger_sous_empreinte` a rafraîchi sa date
+                if os.path.getmtime(chemin) >= limite:
+                    continue
+                os.remove(chemin)
+                supprimes.append(nom)
+            except OSError:
+                current_app.logger.exception(f'Impossible de supprimer le fichier {chemin}')
+    return supprimes
+
+
+def purger_fichiers(simulation=False):
+    """Supprime les fichiers d'upload qu'aucune ligne ne référence, ainsi que leurs vignettes.
+
+    Rattrape ce que `supprimer_fichier_orphelin` n'a pas pu faire (fichier encore dans le délai
+    de grâce, erreur entre le commit et la suppression). Retourne {dossier: [noms]}.
+    """
+    resultat = {}
+    for cle_dossier in STOCKAGE_REFERENCES:
+        references = _noms_references(cle_dossier)
+        resultat[app.config[cle_dossier]] = _purger_dossier(app.config[cle_dossier], references, simulation)
+        if cle_dossier == 'COUVERTURE_FOLDER' and os.path.isdir(VIGNETTES_FOLDER):
+            attendues = {_nom_vignette(nom, taille, extension) for nom in references
+                         for taille in COUVERTURE_TAILLES for extension, _, _ in VIGNETTE_FORMATS}
+            resultat[VIGNETTES_FOLDER] = _purger_dossier(VIGNETTES_FOLDER, attendues, simulation)
+    return resultat
+
+
+@app.cli.command('purger-fichiers')
+@click.option('--simulation', is_flag=True, help='Lister les fichiers orphelins sans les supprimer.')
+def purger_fichiers_command(simulation):
+    """Supprime les uploads non référencés déposés depuis plus de STOCKAGE_DELAI_GRACE."""
+    for dossier, noms in purger_fichiers(simulation).items():
+        for nom in noms:
+            print(f'  {os.path.join(dossier, nom)}')
+        print(f"{dossier} : {len(noms)} fichier(s) {'à supprimer' if simulation else 'supprimé(s)'}")
+
+
+# ============================================
+# VIGNETTES DE COUVERTURE
+# ============================================
+# Chaque couverture téléversée est déclinée en quelques tailles fixes, recadrées et
+# recompressées en WebP et JPEG dans `couvertures/vignettes/`. Les gabarits choisissent la
+# taille via `couverture(nom, taille)` et retombent sur l'original si la vignette manque
+# (Pillow absent, image illisible, ancienne image pas encore traitée).
 
-        total_amende_for_adherent = db.session.query(db.func.coalesce(db.func.sum(Emprunt.amende), 0.0)).filter(Emprunt.adherent_id == r.adherent_id).scalar() or 0.0
-        if total_amende_for_adherent > 0 or len(overdues) > 0:
-            flash('Impossible de transformer la réservation en emprunt: adhérent en retard ou amendes impayées', 'danger')
-            return redirect(url_for('reservations_list'))
-    except Exception:
-        current_app.logger.exception('Erreur vérification amendes fulfil reservation')
+VIGNETTES_FOLDER = os.path.join(COUVERTURE_FOLDER, 'vignettes')
+# Deux fois la taille d'affichage (écrans haute densité)
+COUVERTURE_TAILLES = {'mini': (100, 140), 'carte': (400, 560), 'grande': (800, 1120)}
+VIGNETTE_FORMATS = (
+    ('webp', 'WEBP', {'quality': 80, 'method': 4}),
+    ('jpg', 'JPEG', {'quality': 82, 'optimize': True, 'progressive': True}),
+)
 
-    empr = Emprunt(adherent_id=r.adherent_id, livre_id=r.livre_id, date_retour_prevue=datetime.utcnow() + timedelta(days=(cfg.duree_emprunt or 14)), status='en_cours')
-    r.status = 'fulfilled'
-    r.livre.disponible = False
-    db.session.add(empr)
-    try:
-        db.session.commit()
-        flash('Réservation transformée en emprunt', 'success')
-    except Exception:
-        db.session.rollback()
-        flash('Erreur lors du traitement', 'danger')
-    return redirect(url_for('reservations_list'))
 
-@app.route('/dashboard/reservations/cancel/<int:res_id>', methods=['POST'])
-@login_required
-def cancel_reservation(res_id):
-    if not has_roles('admin', 'bibliothecaire'):
-        flash('Accès non autorisé', 'danger')
-        return redirect(url_for('dashboard'))
-    r = Reservation.query.get_or_404(res_id)
-    if r.status != 'active':
-        flash('Réservation non active', 'warning')
-        return redirect(url_for('reservations_list'))
-    r.status = 'cancelled'
+def _nom_vignette(nom_fichier, taille, extension):
+    # L'extension d'origine fait partie du nom : « a.jpg » et « a.png » ne se confondent pas
+    return f"{nom_fichier.replace('.', '_')}-{taille}.{extension}"
+
+
+def generer_vignettes(nom_fichier, forcer=False):
+    """Crée les vignettes d'une couverture ; retourne False si Pillow n'est pas installé."""
+    if PILImage is None:
+        return False
+    os.makedirs(VIGNETTES_FOLDER, exist_ok=True)
+    with PILImage.open(os.path.join(app.config['COUVERTURE_FOLDER'], nom_fichier)) as image:
+        image = ImageOps.exif_transpose(image).convert('RGB')
+        for taille, dimensions in COUVERTURE_TAILLES.items():
+            cibles = [(os.path.join(VIGNETTES_FOLDER, _nom_vignette(nom_fichier, taille, extension)), format_pil, options)
+                      for extension, format_pil, options in VIGNETTE_FORMATS]
+            if not forcer and all(os.path.exists(chemin) for chemin, _, _ in cibles):
+                continue
+            vignette = ImageOps.fit(image, dimensions, method=PILImage.LANCZOS)
+            for chemin, format_pil, options in cibles:
+                vignette.save(chemin, format_pil, **options)
+    return True
+
+
+def _traiter_couverture(nom_fichier):
+    """Génère les vignettes après un téléversement ; un échec n'empêche pas l'enregistrement."""
     try:
-        db.session.commit()
-        flash('Réservation annulée', 'success')
+        generer_vignettes(nom_fichier)
     except Exception:
-        db.session.rollback()
-        flash('Erreur lors de l\'annulation', 'danger')
-    return redirect(url_for('reservations_list'))
+        current_app.logger.exception(f'Impossible de générer les vignettes de {nom_fichier}')
+
+
+@app.context_processor
+def inject_couverture():
+    def couverture(nom_fichier, taille='carte'):
+        """URLs d'une couverture : {'webp': ... ou None, 'jpeg': ...} pour un élément <picture>."""
+        if not nom_fichier:
+            return {'webp': None, 'jpeg': url_for('static', filename='images/default-book.jpg')}
+        urls = {}
+        for extension, cle in (('webp', 'webp'), ('jpg', 'jpeg')):
+            nom = _nom_vignette(nom_fichier, taille, extension)
+            if os.path.exists(os.path.join(VIGNETTES_FOLDER, nom)):
+                urls[cle] = url_for('static', filename=f'images/couvertures/vignettes/{nom}')
+        return {
+            'webp': urls.get('webp'),
+            'jpeg': urls.get('jpeg') or url_for('static', filename='images/couvertures/' + nom_fichier),
+        }
+    return dict(couverture=couverture)
+
+
+@app.cli.command('generer-vignettes')
+@click.option('--forcer', is_flag=True, help='Régénérer aussi les vignettes existantes.')
+def generer_vignettes_command(forcer):
+    """Génère les vignettes des couvertures déjà présentes sur le disque."""
+    if PILImage is None:
+        raise click.ClickException('Pillow n\'est pas installé (pip install Pillow)')
+    traitees, erreurs = 0, 0
+    with os.scandir(app.config['COUVERTURE_FOLDER']) as entrees:
+        for entree in entrees:
+            if not entree.is_file() or entree.name.startswith('.'):
+                continue
+            try:
+                generer_vignettes(entree.name, forcer=forcer)
+                traitees += 1
+            except Exception as e:
+                erreurs += 1
+                print(f'  {entree.name} : {e}')
+    print(f'{traitees} couverture(s) traitée(s), {erreurs} erreur(s)')
+
 
 # LIVRES - ADMIN
 @app.route("/dashboard/livres", methods=['GET', 'POST'])
@@ -2439,6 +4691,11 @@ def livres():
         return redirect(url_for("dashboard"))
 
     if request.method == "POST":
+        # Refuser un envoi trop gros avant d'en lire le corps (les gros PDF passent par l'API par blocs)
+        if request.content_length and request.content_length > app.config['PDF_TAILLE_MAX']:
+            flash(f"Fichier trop volumineux (maximum {app.config['PDF_TAILLE_MAX'] // (1024 * 1024)} Mo)", "error")
+            return redirect(url_for("livres"))
+
         titre = request.form['titre']
         auteur = request.form['auteur']
         isbn = request.form['isbn']
@@ -2448,11 +4705,18 @@ def livres():
 
         fichier_pdf = request.files.get("contenu_pdf")
         fichier_pdf_nom = None
+        televersement_id = request.form.get("televersement_id")
 
-        if fichier_pdf and fichier_pdf.filename:
+        if televersement_id:
+            try:
+                fichier_pdf_nom = terminer_televersement(televersement_id)
+            except ValueError as e:
+                db.session.rollback()
+                flash(str(e), "error")
+                return redirect(url_for("livres"))
+        elif fichier_pdf and fichier_pdf.filename:
             if fichier_pdf.filename.lower().endswith('.pdf'):
-                fichier_pdf_nom = secure_filename(fichier_pdf.filename)
-                fichier_pdf.save(os.path.join(app.config['UPLOAD_FOLDER'], fichier_pdf_nom))
+                fichier_pdf_nom = stocker_fichier(fichier_pdf, app.config['UPLOAD_FOLDER'], 'pdf')
             else:
                 flash("Le fichier doit être au format PDF", "error")
                 return redirect(url_for("livres"))
@@ -2464,8 +4728,9 @@ def livres():
             allowed_extensions = {'png', 'jpg', 'jpeg', 'gif', 'webp'}
             if '.' in fichier_image.filename and \
                fichier_image.filename.rsplit('.', 1)[1].lower() in allowed_extensions:
-                fichier_image_nom = secure_filename(fichier_image.filename)
-                fichier_image.save(os.path.join(app.config['COUVERTURE_FOLDER'], fichier_image_nom))
+                fichier_image_nom = stocker_fichier(fichier_image, app.config['COUVERTURE_FOLDER'],
+                                                    _extension(fichier_image.filename))
+                _traiter_couverture(fichier_image_nom)
             else:
                 flash("Le fichier image doit être au format PNG, JPG, JPEG, GIF ou WEBP", "error")
                 return redirect(url_for("livres"))
@@ -2483,6 +4748,9 @@ def livres():
 
         try:
             db.session.add(nouveau_livre)
+            if fichier_pdf_nom:
+                db.session.flush()
+                planifier_extraction_pdf(nouveau_livre.id, fichier_pdf_nom)
             db.session.commit()
             flash("Livre ajouté avec succès", "success")
         except Exception as e:
@@ -2494,6 +4762,384 @@ def livres():
     livres_liste = Livre.query.all()
     return render_template("livres.html", title="Livres", livres=livres_liste)
 
+
+# ============================================
+# IMPORT EN MASSE (CSV)
+# ============================================
+
+IMPORT_BATCH = 2000
+IMPORT_MAX_ERREURS_DETAILLEES = 200
+IMPORT_LIVRES_COLONNES = ('titre', 'auteur', 'isbn', 'annee', 'categorie', 'resume')
+
+
+def _lecteur_csv(flux):
+    """DictReader sur un flux texte, séparateur détecté (« , » ou « ; » d'Excel en français)
+    et en-têtes normalisés (minuscules, sans accents ni espaces superflus)."""
+    debut = flux.readline()
+    try:
+        dialecte = csv.Sniffer().sniff(debut, delimiters=',;\t')
+    except csv.Error:
+        dialecte = csv.excel
+    entetes = [_normalize_search_text(h).strip() for h in next(csv.reader([debut], dialecte))]
+    return csv.DictReader(flux, fieldnames=entetes, dialect=dialecte)
+
+
+def normaliser_isbn(valeur):
+    """Retourne l'ISBN-13 (chiffres seuls) d'un ISBN-10 ou ISBN-13 valide, sinon lève ValueError."""
+    brut = re.sub(r'[\s-]', '', valeur or '').upper()
+    if re.fullmatch(r'[0-9]{9}[0-9X]', brut):
+        somme = sum((10 - i) * (10 if c == 'X' else int(c)) for i, c in enumerate(brut))
+        if somme % 11:
+            raise ValueError(f'ISBN-10 invalide : {valeur}')
+        brut = '978' + brut[:9]
+        return brut + str((10 - sum(int(c) * (3 if i % 2 else 1) for i, c in enumerate(brut)) % 10) % 10)
+    if re.fullmatch(r'[0-9]{13}', brut):
+        if sum(int(c) * (3 if i % 2 else 1) for i, c in enumerate(brut)) % 10:
+            raise ValueError(f'ISBN-13 invalide : {valeur}')
+        return brut
+    raise ValueError(f'ISBN mal formé : {valeur}')
+
+
+def _isbn_existants():
+    """Ensemble des ISBN du catalogue, normalisés (une seule requête)."""
+    existants = set()
+    for (isbn,) in db.session.query(Livre.isbn).filter(Livre.isbn != None, Livre.isbn != '').yield_per(EXPORT_CHUNK_SIZE):
+        try:
+            existants.add(normaliser_isbn(isbn))
+        except ValueError:
+            existants.add(isbn)
+    return existants
+
+
+class RapportImport:
+    """Compteurs et erreurs (numéro de ligne, message) d'un import en masse."""
+
+    def __init__(self):
+        self.lues = 0
+        self.importees = 0
+        self.doublons = 0
+        self.nb_erreurs = 0
+        self.erreurs = []
+
+    def erreur(self, ligne, message):
+        self.nb_erreurs += 1
+        if len(self.erreurs) < IMPORT_MAX_ERREURS_DETAILLEES:
+            self.erreurs.append((ligne, message))
+
+    def resume(self):
+        return (f'{self.lues} ligne(s) lue(s), {self.importees} importée(s), '
+                f'{self.doublons} doublon(s), {self.nb_erreurs} erreur(s)')
+
+
+def _livre_depuis_csv(ligne):
+    titre = (ligne.get('titre') or '').strip()
+    auteur = (ligne.get('auteur') or '').strip()
+    if not titre or not auteur:
+        raise ValueError('titre et auteur sont obligatoires')
+    if len(titre) > 200 or len(auteur) > 100:
+        raise ValueError('titre (200) ou auteur (100) trop long')
+    annee = (ligne.get('annee') or ligne.get('annee_publication') or '').strip()
+    if annee and not re.fullmatch(r'-?[0-9]{1,4}', annee):
+        raise ValueError(f'année invalide : {annee}')
+    categorie = (ligne.get('categorie') or '').strip() or None
+    if categorie and len(categorie) > 50:
+        raise ValueError('catégorie trop longue (50)')
+    isbn = (ligne.get('isbn') or '').strip()
+    return {
+        'titre': titre,
+        'auteur': auteur,
+        'isbn': normaliser_isbn(isbn) if isbn else None,
+        'annee_publication': int(annee) if annee else None,
+        'categorie': categorie,
+        'resume': (ligne.get('resume') or '').strip() or None,
+        'disponible': True,
+    }
+
+
+def importer_livres_csv(flux, progression=None):
+    """Importe des livres depuis un flux CSV texte, lu ligne à ligne.
+
+    Colonnes : titre, auteur, isbn, annee, categorie, resume. Les ISBN sont validés et
+    normalisés en ISBN-13 ; les doublons (catalogue existant ou fichier) sont ignorés grâce
+    à un ensemble chargé une fois. Les livres sont insérés par lots de IMPORT_BATCH, chaque
+    lot validé séparément ; `progression(rapport)` est appelé après chaque lot.
+    """
+    rapport = RapportImport()
+    lecteur = _lecteur_csv(flux)
+    if not {'titre', 'auteur'} <= set(lecteur.fieldnames or ()):
+        raise ValueError('Colonnes obligatoires absentes : titre, auteur')
+    connus = _isbn_existants()
+    table = Livre.__table__
+    lot = []
+
+    def inserer():
+        if not lot:
+            return
+        try:
+            db.session.execute(table.insert(), lot)
+            db.session.commit()
+            rapport.importees += len(lot)
+        except Exception as e:
+            db.session.rollback()
+            rapport.erreur(rapport.lues, f'lot de {len(lot)} livre(s) rejeté : {e}')
+        lot.clear()
+        if progression:
+            progression(rapport)
+
+    for ligne in lecteur:
+        rapport.lues += 1
+        numero = lecteur.line_num + 1  # + la ligne d'en-tête lue à part
+        try:
+            livre = _livre_depuis_csv(ligne)
+        except ValueError as e:
+            rapport.erreur(numero, str(e))
+            continue
+        if livre['isbn']:
+            if livre['isbn'] in connus:
+                rapport.doublons += 1
+                continue
+            connus.add(livre['isbn'])
+        lot.append(livre)
+        if len(lot) >= IMPORT_BATCH:
+            inserer()
+    inserer()
+
+    # Les insertions en masse ne passent pas par les événements ORM
+    if rapport.importees:
+        get_search_backend().rebuild()
+    return rapport
+
+
+@app.cli.command('importer-livres')
+@click.argument('fichier', type=click.Path(exists=True, dir_okay=False))
+def importer_livres_command(fichier):
+    """Importe un fichier CSV de livres (titre, auteur, isbn, annee, categorie, resume)."""
+    with open(fichier, encoding='utf-8-sig', newline='') as f:
+        rapport = importer_livres_csv(f, progression=lambda r: print(r.resume()))
+    for numero, message in rapport.erreurs:
+        print(f'  ligne {numero} : {message}')
+    if rapport.nb_erreurs > len(rapport.erreurs):
+        print(f'  ... {rapport.nb_erreurs - len(rapport.erreurs)} autre(s) erreur(s)')
+    print(f'Terminé : {rapport.resume()}')
+
+
+@app.route("/dashboard/livres/import", methods=['POST'])
+@login_required
+def import_livres():
+    if not has_roles('admin', 'bibliothecaire'):
+        flash("Accès non autorisé", "danger")
+        return redirect(url_for("dashboard"))
+
+    fichier = request.files.get('fichier_csv')
+    if not fichier or not fichier.filename.lower().endswith('.csv'):
+        flash("Veuillez choisir un fichier CSV", "error")
+        return redirect(url_for("livres"))
+
+    try:
+        flux = io.TextIOWrapper(fichier.stream, encoding='utf-8-sig', newline='')
+        rapport = importer_livres_csv(flux)
+    except (ValueError, UnicodeDecodeError, csv.Error) as e:
+        flash(f"Import impossible : {e}", "error")
+        return redirect(url_for("livres"))
+    except Exception:
+        current_app.logger.exception("Erreur lors de l'import des livres")
+        flash("Erreur lors de l'import des livres", "error")
+        return redirect(url_for("livres"))
+
+    flash(f"Import terminé : {rapport.resume()}", "success" if not rapport.nb_erreurs else "warning")
+    for numero, message in rapport.erreurs[:10]:
+        flash(f"Ligne {numero} : {message}", "warning")
+    return redirect(url_for("livres"))
+
+IMPORT_ADHERENTS_BATCH = 500
+app.config.setdefault('IMPORT_HASH_WORKERS', int(os.environ.get('IMPORT_HASH_WORKERS', 0)) or os.cpu_count() or 1)
+
+
+def _hacher_mot_de_passe(mot_de_passe):
+    """Même empreinte que `User.set_password` ; fonction de module pour le pool de processus."""
+    return generate_password_hash(mot_de_passe, method='pbkdf2:sha256')
+
+
+IMPORT_HASH_PARALLELE_MIN = 32
+
+
+def _nouveau_pool_hachage():
+    """Pool de processus de hachage pour un import ; None si un seul processus est configuré."""
+    if app.config['IMPORT_HASH_WORKERS'] <= 1:
+        return None
+    try:
+        return ProcessPoolExecutor(max_workers=app.config['IMPORT_HASH_WORKERS'])
+    except (OSError, NotImplementedError):
+        app.logger.warning('Pool de processus indisponible : hachage séquentiel')
+        return None
+
+
+def _nom_utilisateur_libre(email, pris):
+    base = re.sub(r'[^A-Za-z0-9_.-]', '', email.split('@')[0])[:70] or 'adherent'
+    candidat, suffixe = base, 1
+    while candidat.lower() in pris:
+        suffixe += 1
+        candidat = f'{base}{suffixe}'
+    pris.add(candidat.lower())
+    return candidat
+
+
+def importer_adherents_csv(flux, creer_comptes=True, classe_defaut=None, progression=None):
+    """Inscrit des adhérents depuis un flux CSV texte (nom, prenom, email, telephone, classe,
+    et optionnellement username, mot_de_passe), lu ligne à ligne.
+
+    Par lot de IMPORT_ADHERENTS_BATCH : les empreintes pbkdf2 sont calculées dans un pool de
+    IMPORT_HASH_WORKERS processus, adhérents et comptes sont insérés et les codes de
+    vérification mis en file d'envoi dans la même transaction ; le worker d'emails les
+    envoie ensuite sur une seule connexion SMTP. Les emails déjà connus sont ignorés.
+    Le pool n'existe que le temps de l'import : appeler cette fonction depuis la commande
+    ou le worker des imports (`traiter_imports_en_attente`), jamais dans une requête web.
+    """
+    rapport = RapportImport()
+    lecteur = _lecteur_csv(flux)
+    if not {'nom', 'prenom', 'email'} <= set(lecteur.fieldnames or ()):
+        raise ValueError('Colonnes obligatoires absentes : nom, prenom, email')
+
+    emails_connus = {e.lower() for (e,) in db.session.query(Adherent.email)}
+    emails_connus |= {e.lower() for (e,) in db.session.query(User.email)}
+    noms_pris = {u.lower() for (u,) in db.session.query(User.username)}
+    lot = []
+    hachage = {'pool': None, 'cree': False}
+
+    def hacher(mots_de_passe):
+        # Petits lots : démarrer des processus coûterait plus que le hachage lui-même
+        if len(mots_de_passe) >= IMPORT_HASH_PARALLELE_MIN and not hachage['cree']:
+            hachage.update(pool=_nouveau_pool_hachage(), cree=True)
+        if hachage['pool'] is not None and len(mots_de_passe) >= IMPORT_HASH_PARALLELE_MIN:
+            try:
+                return list(hachage['pool'].map(_hacher_mot_de_passe, mots_de_passe, chunksize=16))
+            except BrokenExecutor:
+                app.logger.exception('Pool de hachage interrompu : suite de l\'import en séquentiel')
+                hachage['pool'].shutdown(wait=False)
+                hachage['pool'] = None
+        return [_hacher_mot_de_passe(m) for m in mots_de_passe]
+
+    def inserer():
+        if not lot:
+            return
+        try:
+            adherents = [Adherent(**ligne['adherent']) for ligne in lot]
+            db.session.add_all(adherents)
+            if creer_comptes:
+                empreintes = hacher([ligne['mot_de_passe'] for ligne in lot])
+                expiration = datetime.utcnow() + CODE_VERIFICATION_DUREE
+                for ligne, adherent, empreinte in zip(lot, adherents, empreintes):
+                    code = _generate_confirmation_code()
+                    db.session.add(User(
+                        username=ligne['username'], email=adherent.email, role='user',
+                        password_hash=empreinte, confirmed=False, confirmation_code=code,
+                        confirmation_expires=expiration, adherent=adherent
+                    ))
+                    if not send_verification_email(adherent.email, ligne['username'], code, commit=False):
+                        raise RuntimeError(f'email de vérification non mis en file pour {adherent.email}')
+            db.session.commit()
+            rapport.importees += len(lot)
+        except Exception as e:
+            db.session.rollback()
+            rapport.erreur(rapport.lues, f'lot de {len(lot)} adhérent(s) rejeté : {e}')
+        lot.clear()
+        if progression:
+            progression(rapport)
+
+    try:
+        for ligne in lecteur:
+            rapport.lues += 1
+            numero = lecteur.line_num + 1  # + la ligne d'en-tête lue à part
+            nom = (ligne.get('nom') or '').strip()
+            prenom = (ligne.get('prenom') or '').strip()
+            email = (ligne.get('email') or '').strip()
+            if not nom or not prenom or not email:
+                rapport.erreur(numero, 'nom, prénom et email sont obligatoires')
+                continue
+            if not is_valid_email(email):
+                rapport.erreur(numero, f'email invalide : {email}')
+                continue
+            if email.lower() in emails_connus:
+                rapport.doublons += 1
+                continue
+            emails_connus.add(email.lower())
+
+            username = (ligne.get('username') or '').strip()
+            if username and username.lower() in noms_pris:
+                rapport.erreur(numero, f"nom d'utilisateur déjà pris : {username}")
+                continue
+            if username:
+                noms_pris.add(username.lower())
+            elif creer_comptes:
+                username = _nom_utilisateur_libre(email, noms_pris)
+
+            lot.append({
+                'adherent': {
+                    'nom': nom[:100], 'prenom': prenom[:100], 'email': email,
+                    'telephone': (ligne.get('telephone') or '').strip()[:20] or None,
+                    'classe': (ligne.get('classe') or '').strip()[:50] or classe_defaut,
+                    'statut': 'Actif',
+                },
+                'username': username,
+                'mot_de_passe': (ligne.get('mot_de_passe') or '').strip() or uuid.uuid4().hex,
+            })
+            if len(lot) >= IMPORT_ADHERENTS_BATCH:
+                inserer()
+        inserer()
+    finally:
+        if hachage['pool'] is not None:
+            hachage['pool'].shutdown()
+    return rapport
+
+
+@app.cli.command('importer-adherents')
+@click.argument('fichier', type=click.Path(exists=True, dir_okay=False))
+@click.option('--classe', default=None, help='Classe des adhérents dont la ligne n\'en précise pas.')
+@click.option('--sans-comptes', is_flag=True, help='Ne pas créer de comptes utilisateurs.')
+def importer_adherents_command(fichier, classe, sans_comptes):
+    """Importe une liste d'adhérents (nom, prenom, email, telephone, classe)."""
+    with open(fichier, encoding='utf-8-sig', newline='') as f:
+        rapport = importer_adherents_csv(f, creer_comptes=not sans_comptes, classe_defaut=classe,
+                                         progression=lambda r: print(r.resume()))
+    for numero, message in rapport.erreurs:
+        print(f'  ligne {numero} : {message}')
+    if rapport.nb_erreurs > len(rapport.erreurs):
+        print(f'  ... {rapport.nb_erreurs - len(rapport.erreurs)} autre(s) erreur(s)')
+    print(f'Terminé : {rapport.resume()}')
+
+
+@app.route("/dashboard/adherents/import", methods=['POST'])
+@login_required
+def import_adherents():
+    if not has_roles('admin', 'bibliothecaire'):
+        flash('Accès non autorisé', 'danger')
+        return redirect(url_for('dashboard'))
+
+    fichier = request.files.get('fichier_csv')
+    if not fichier or not fichier.filename.lower().endswith('.csv'):
+        flash('Veuillez choisir un fichier CSV', 'danger')
+        return redirect(url_for('adherents'))
+
+    try:
+        os.makedirs(IMPORTS_FOLDER, exist_ok=True)
+        nom = f'{uuid.uuid4().hex}.csv'
+        fichier.save(os.path.join(IMPORTS_FOLDER, nom))
+        db.session.add(ImportAdherents(
+            user_id=current_user.id, fichier=nom, nom_original=fichier.filename[:255],
+            creer_comptes=bool(request.form.get('creer_comptes')),
+            classe_defaut=(request.form.get('classe') or '').strip()[:50] or None
+        ))
+        db.session.info['import_pending'] = True
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        current_app.logger.exception('Erreur lors de la mise en file de l\'import des adhérents')
+        flash('Erreur lors de l\'import des adhérents', 'danger')
+        return redirect(url_for('adherents'))
+
+    flash('Import mis en file : le rapport apparaîtra sur cette page une fois terminé', 'info')
+    return redirect(url_for('adherents'))
+
 @app.route("/dashboard/emprunts/retour/<int:emprunt_id>")
 @login_required
 def retourner_livre(emprunt_id):
@@ -2574,151 +5220,345 @@ def view_emprunt(emprunt_id):
     is_staff = has_roles('admin', 'bibliothecaire')
     return render_template('emprunt_detail.html', title=f"Emprunt {e.id}", emprunt=e, is_staff=is_staff)
 
+
+# LECTURE DES PDF
+def livres_pdf_lisibles(livre_ids):
+    """Parmi `livre_ids`, ceux dont l'utilisateur courant peut lire le PDF (une seule requête).
+
+    Le personnel lit tous les PDF ; un adhérent seulement ceux qu'il a en cours d'emprunt.
+    """
+    livre_ids = set(livre_ids)
+    if not livre_ids:
+        return set()
+    if has_roles('admin', 'bibliothecaire'):
+        return livre_ids
+    adherent = getattr(current_user, 'adherent', None)
+    if not adherent:
+        return set()
+    return {livre_id for (livre_id,) in db.session.query(Emprunt.livre_id).filter(
+        Emprunt.adherent_id == adherent.id,
+        Emprunt.livre_id.in_(livre_ids),
+        Emprunt.date_retour_effective == None,
+    )}
+
+
+def peut_lire_pdf(livre_id):
+    return livre_id in livres_pdf_lisibles([livre_id])
+
+
+@app.route('/livres/<int:livre_id>/pdf')
+@login_required
+def lire_pdf(livre_id):
+    livre = Livre.query.get_or_404(livre_id)
+    if not peut_lire_pdf(livre.id):
+        flash('Vous devez avoir ce livre en cours d\'emprunt pour le lire', 'danger')
+        return redirect(url_for('mes_emprunts'))
+
+    nom_fichier = secure_filename(livre.contenu_pdf or '')
+    chemin = os.path.join(os.path.abspath(app.config['UPLOAD_FOLDER']), nom_fichier)
+    if not nom_fichier or not os.path.isfile(chemin):
+        flash('Aucun PDF disponible pour ce livre', 'warning')
+        return redirect(request.referrer or url_for('mes_emprunts'))
+
+    nom_telechargement = f"{secure_filename(livre.titre) or 'livre'}.pdf"
+    if app.config['PDF_OFFLOAD'] == 'x-accel':
+        # nginx relit le fichier lui-même (sendfile, Range, reprise) : on ne renvoie que l'en-tête
+        response = Response(mimetype='application/pdf')
+        response.headers['X-Accel-Redirect'] = app.config['PDF_ACCEL_PREFIX'].rstrip('/') + '/' + nom_fichier
+        response.headers['Content-Disposition'] = f'inline; filename="{nom_telechargement}"'
+    else:
+        # conditional=True : réponses 206/304 (Range, If-Range, ETag) ; avec USE_X_SENDFILE,
+        # send_file pose l'en-tête X-Sendfile au lieu de lire le fichier
+        response = send_file(chemin, mimetype='application/pdf', as_attachment=False,
+                             download_name=nom_telechargement, conditional=True, max_age=0)
+    # Contenu soumis à autorisation : pas de cache partagé
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
 # STATISTIQUES
+STATS_PERIODES = {'week': 7, 'month': 30, 'quarter': 90, 'year': 365}
+
+
+# Granularité de l'histogramme affiché pour chaque période
+STATS_GRANULARITE = {'week': 'jour', 'month': 'jour', 'quarter': 'semaine', 'year': 'mois'}
+MOIS_COURTS = ('janv.', 'févr.', 'mars', 'avr.', 'mai', 'juin',
+               'juil.', 'août', 'sept.', 'oct.', 'nov.', 'déc.')
+
+
+def _debut_periode(period, now_dt):
+    return now_dt - timedelta(days=STATS_PERIODES.get(period, 30))
+
+
+def histogrammes_circulation(debut, fin):
+    """Emprunts et retours par jour, semaine (du lundi) et mois entre `debut` et `fin` inclus.
+
+    Une seule requête par plage sur `circulation_journaliere.jour` (clé d'index), groupée par
+    jour ; les jours sans activité et les regroupements sont complétés en Python.
+    """
+    lignes = db.session.query(
+        CirculationJournaliere.jour,
+        db.func.sum(CirculationJournaliere.nb_emprunts),
+        db.func.sum(CirculationJournaliere.nb_retours),
+    ).filter(
+        CirculationJournaliere.jour >= debut, CirculationJournaliere.jour <= fin
+    ).group_by(CirculationJournaliere.jour).all()
+    par_jour = {_as_date(jour): (int(emprunts or 0), int(retours or 0)) for jour, emprunts, retours in lignes}
+
+    histogrammes = {'jour': [], 'semaine': [], 'mois': []}
+    jour = debut
+    while jour <= fin:
+        emprunts, retours = par_jour.get(jour, (0, 0))
+        buckets = (
+            ('jour', jour, jour.strftime('%d/%m')),
+            ('semaine', jour - timedelta(days=jour.weekday()),
+             'Sem. du ' + (jour - timedelta(days=jour.weekday())).strftime('%d/%m')),
+            ('mois', jour.replace(day=1), f'{MOIS_COURTS[jour.month - 1]} {jour.year}'),
+        )
+        for granularite, cle, label in buckets:
+            serie = histogrammes[granularite]
+            if not serie or serie[-1]['debut'] != cle:
+                serie.append({'debut': cle, 'label': label, 'emprunts': 0, 'retours': 0})
+            serie[-1]['emprunts'] += emprunts
+            serie[-1]['retours'] += retours
+        jour += timedelta(days=1)
+    for serie in histogrammes.values():
+        for bucket in serie:
+            bucket['debut'] = bucket['debut'].isoformat()
+    return histogrammes
+
+
+def _barres_histogramme(serie):
+    """Format attendu par le gabarit : une barre par intervalle, largeur relative au maximum."""
+    maximum = max([b['emprunts'] for b in serie] + [1])
+    return [{
+        'label': b['label'],
+        'bars': [{'width': round(b['emprunts'] / maximum * 100), 'color': 'var(--primary)', 'count': b['emprunts']}]
+    } for b in serie]
+
+
+def calculer_statistiques(period):
+    """Service de statistiques du tableau de bord : retourne tous les chiffres de la page
+    pour une période, en un nombre fixe de requêtes agrégées (indépendant du nombre de
+    catégories, d'adhérents ou de livres).
+    """
+    now_dt = datetime.utcnow()
+    start = _debut_periode(period, now_dt)
+
+    # 1. Totaux : une ligne, compteurs en sous-requêtes scalaires
+    totaux = db.session.query(
+        db.select(db.func.count(Adherent.id)).scalar_subquery().label('total_adherents'),
+        db.select(db.func.count(Bibliothecaire.id)).scalar_subquery().label('total_bibliothecaires'),
+        db.select(db.func.count(Livre.id)).scalar_subquery().label('total_livres'),
+        db.select(db.func.coalesce(db.func.sum(db.case((Livre.disponible == True, 1), else_=0)), 0))
+        .scalar_subquery().label('livres_disponibles'),
+        db.select(db.func.coalesce(db.func.sum(db.case((Livre.disponible == False, 1), else_=0)), 0))
+        .scalar_subquery().label('livres_empruntes'),
+        db.select(db.func.count(Emprunt.id)).where(
+            Emprunt.date_emprunt >= start, Emprunt.status == 'en_cours'
+        ).scalar_subquery().label('emprunts_en_cours'),
+    ).one()
+    total_livres = int(totaux.total_livres or 0)
+    livres_disponibles = int(totaux.livres_disponibles or 0)
+    emprunts_en_cours = int(totaux.emprunts_en_cours or 0)
+
+    # 2. Répartition par catégorie : un seul GROUP BY avec agrégats conditionnels ;
+    # les emprunts de la période sont lus dans les agrégats quotidiens de circulation
+    emprunts_periode = db.select(
+        CirculationJournaliere.categorie, db.func.sum(CirculationJournaliere.nb_emprunts).label('nb')
+    ).where(CirculationJournaliere.jour >= start.date()).group_by(CirculationJournaliere.categorie).subquery()
+    lignes_categories = db.session.query(
+        Livre.categorie,
+        db.func.count(Livre.id),
+        db.func.coalesce(db.func.sum(db.case((Livre.disponible == True, 1), else_=0)), 0),
+        db.func.coalesce(db.func.max(emprunts_periode.c.nb), 0),
+    ).outerjoin(
+        emprunts_periode, emprunts_periode.c.categorie == Livre.categorie
+    ).filter(Livre.categorie != None, Livre.categorie != '').group_by(Livre.categorie).all()
+
+    stats_categories = []
+    for categorie, total_livres_cat, livres_dispo_cat, emprunts_cat in lignes_categories:
+        total_livres_cat, livres_dispo_cat, emprunts_cat = int(total_livres_cat), int(livres_dispo_cat), int(emprunts_cat)
+        stats_categories.append({
+            'categorie': categorie,
+            'count_livres': total_livres_cat,
+            'count_emprunts': emprunts_cat,
+            # Pourcentage d'emprunts dans cette catégorie
+            'pourcentage_emprunts': round((emprunts_cat / emprunts_en_cours) * 100) if emprunts_en_cours > 0 else 0,
+            'livres_disponibles': livres_dispo_cat,
+            'pourcentage_dispo': round((livres_dispo_cat / total_livres_cat) * 100) if total_livres_cat > 0 else 100
+        })
+    stats_categories.sort(key=lambda x: x['count_emprunts'], reverse=True)
+
+    # 3. Adhérents les plus actifs
+    total_emprunts = db.func.count(Emprunt.id).label('total_emprunts')
+    adherents_actifs = db.session.query(
+        Adherent.id, Adherent.nom, Adherent.prenom, Adherent.email, total_emprunts
+    ).join(Emprunt, Emprunt.adherent_id == Adherent.id).filter(
+        Emprunt.date_emprunt >= start
+    ).group_by(Adherent.id, Adherent.nom, Adherent.prenom, Adherent.email).order_by(
+        total_emprunts.desc()
+    ).limit(5).all()
+
+    max_emprunts = max([a.total_emprunts for a in adherents_actifs]) if adherents_actifs else 1
+    stats_adherents = [{
+        'adherent': {'id': a.id, 'nom': a.nom, 'prenom': a.prenom, 'email': a.email},
+        'total': a.total_emprunts,
+        'pourcentage': round(a.total_emprunts / max_emprunts * 100)
+    } for a in adherents_actifs]
+
+    # 4. Livres les plus empruntés (agrégats quotidiens)
+    nb_emprunts = db.func.sum(CirculationJournaliere.nb_emprunts).label('count')
+    top_books = db.session.query(
+        Livre.titre, Livre.auteur, nb_emprunts
+    ).join(CirculationJournaliere, CirculationJournaliere.livre_id == Livre.id).filter(
+        CirculationJournaliere.jour >= start.date()
+    ).group_by(Livre.id, Livre.titre, Livre.auteur).order_by(nb_emprunts.desc()).limit(5).all()
+    top_books_data = [{'titre': b.titre, 'auteur': b.auteur, 'count': int(b.count)} for b in top_books]
+
+    # 5. Histogrammes jour / semaine / mois, issus d'une seule requête par plage de jours
+    histogrammes = histogrammes_circulation(start.date(), now_dt.date())
+    granularite = STATS_GRANULARITE.get(period, 'jour')
+
+    return {
+        'total_adherents': int(totaux.total_adherents or 0),
+        'total_livres': total_livres,
+        'total_bibliothecaires': int(totaux.total_bibliothecaires or 0),
+        'emprunts_en_cours': emprunts_en_cours,
+        'livres_disponibles': livres_disponibles,
+        'livres_empruntes': int(totaux.livres_empruntes or 0),
+        'livres_reserves': 0,  # À remplacer par votre logique de réservation
+        'taux_disponibilite': round((livres_disponibles / total_livres) * 100, 1) if total_livres > 0 else 100,
+        'stats_categories': stats_categories,
+        'stats_adherents': stats_adherents,
+        'top_books': top_books_data,
+        'stats_days': _barres_histogramme(histogrammes[granularite]) or None,
+        'histogrammes': histogrammes,
+        'granularite': granularite,
+    }
+
+
+# Cache des statistiques par période : servi tel quel pendant STATS_CACHE_TTL secondes, puis
+# encore STATS_CACHE_STALE_MAX secondes pendant qu'un seul recalcul tourne en arrière-plan.
+# Le résultat est partagé entre processus via un fichier JSON dans l'instance ; un verrou
+# par période (thread + fcntl) garantit qu'un seul worker recalcule à la fois.
+app.config.setdefault('STATS_CACHE_TTL', int(os.environ.get('STATS_CACHE_TTL', 300)))
+app.config.setdefault('STATS_CACHE_STALE_MAX', int(os.environ.get('STATS_CACHE_STALE_MAX', 3600)))
+STATS_CACHE_DIR = os.path.join(app.instance_path, 'stats_cache')
+_stats_cache = {}
+_stats_locks = {}
+_stats_locks_guard = threading.Lock()
+
+
+def _fichier_stats(period, extension):
+    return os.path.join(STATS_CACHE_DIR, f'{period}.{extension}')
+
+
+def _verrou_thread_stats(period):
+    with _stats_locks_guard:
+        return _stats_locks.setdefault(period, threading.Lock())
+
+
+@contextmanager
+def _verrou_stats(period, bloquant):
+    """Verrou de recalcul d'une période ; produit False s'il est déjà pris (mode non bloquant)."""
+    verrou = _verrou_thread_stats(period)
+    if not verrou.acquire(blocking=bloquant):
+        yield False
+        return
+    fichier = None
+    try:
+        if fcntl is not None:
+            os.makedirs(STATS_CACHE_DIR, exist_ok=True)
+            fichier = open(_fichier_stats(period, 'lock'), 'a')
+            try:
+                fcntl.flock(fichier, fcntl.LOCK_EX if bloquant else fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                yield False
+                return
+        yield True
+    finally:
+        if fichier is not None:
+            fichier.close()
+        verrou.release()
+
+
+def _entree_stats(period):
+    """Entrée de cache la plus récente entre la mémoire du processus et le fichier partagé."""
+    entree = _stats_cache.get(period)
+    try:
+        with open(_fichier_stats(period, 'json'), encoding='utf-8') as f:
+            partagee = json.load(f)
+    except (OSError, ValueError):
+        partagee = None
+    if partagee and (entree is None or partagee['calcule_le'] > entree['calcule_le']):
+        entree = _stats_cache[period] = partagee
+    return entree
+
+
+def _recalculer_stats(period):
+    entree = {'calcule_le': time.time(), 'donnees': calculer_statistiques(period)}
+    _stats_cache[period] = entree
+    try:
+        os.makedirs(STATS_CACHE_DIR, exist_ok=True)
+        chemin = _fichier_stats(period, 'json')
+        temporaire = f'{chemin}.{os.getpid()}.tmp'
+        with open(temporaire, 'w', encoding='utf-8') as f:
+            json.dump(entree, f)
+        os.replace(temporaire, chemin)
+    except OSError:
+        current_app.logger.exception('Erreur écriture du cache des statistiques')
+    return entree
+
+
+def _recalcul_stats_arriere_plan(application, period):
+    with application.app_context():
+        with _verrou_stats(period, bloquant=False) as acquis:
+            if not acquis:
+                return
+            entree = _entree_stats(period)
+            if entree and time.time() - entree['calcule_le'] < application.config['STATS_CACHE_TTL']:
+                return
+            try:
+                _recalculer_stats(period)
+            except Exception:
+                application.logger.exception('Erreur recalcul des statistiques en arrière-plan')
+
+
+def statistiques_en_cache(period):
+    """Statistiques de la période via le cache (TTL, stale-while-revalidate, recalcul unique)."""
+    ttl = app.config['STATS_CACHE_TTL']
+    if ttl <= 0:
+        return calculer_statistiques(period)
+
+    entree = _entree_stats(period)
+    age = time.time() - entree['calcule_le'] if entree else None
+    if entree and age < ttl:
+        return entree['donnees']
+    if entree and age < ttl + app.config['STATS_CACHE_STALE_MAX']:
+        if not _verrou_thread_stats(period).locked():
+            threading.Thread(target=_recalcul_stats_arriere_plan, args=(app, period), daemon=True).start()
+        return entree['donnees']
+
+    # Rien d'utilisable : un seul calcul, les requêtes concurrentes attendent son résultat
+    with _verrou_stats(period, bloquant=True):
+        entree = _entree_stats(period)
+        if entree and time.time() - entree['calcule_le'] < ttl:
+            return entree['donnees']
+        return _recalculer_stats(period)['donnees']
+
+
 @app.route("/dashboard/statistiques")
 @login_required
 def statistiques():
     if has_roles('admin', 'bibliothecaire'):
         period = request.args.get('period', 'month')
-        now_dt = datetime.utcnow()
-        if period == 'week':
-            start = now_dt - timedelta(days=7)
-        elif period == 'month':
-            start = now_dt - timedelta(days=30)
-        elif period == 'quarter':
-            start = now_dt - timedelta(days=90)
-        elif period == 'year':
-            start = now_dt - timedelta(days=365)
-        else:
-            start = now_dt - timedelta(days=30)
-
-        total_adherents = Adherent.query.count()
-        total_livres = Livre.query.count()
-        total_bibliothecaires = Bibliothecaire.query.count()
-        emprunts_en_cours = Emprunt.query.filter(Emprunt.date_emprunt >= start).filter_by(status='en_cours').count()
-        livres_disponibles = Livre.query.filter_by(disponible=True).count()
-        
-        # Récupérer TOUTES les catégories distinctes de livres
-        toutes_categories = db.session.query(Livre.categorie).distinct().all()
-        toutes_categories = [c[0] for c in toutes_categories if c[0]]  # Nettoyer les valeurs None
-        
-        # Récupérer les emprunts par catégorie pour la période
-        emprunts_par_categorie = db.session.query(
-            Livre.categorie, 
-            db.func.count(Emprunt.id).label('count')
-        ).join(Emprunt).filter(Emprunt.date_emprunt >= start).group_by(Livre.categorie).all()
-        
-        # Créer un dictionnaire pour les emprunts par catégorie
-        emprunts_dict = {categorie: count for categorie, count in emprunts_par_categorie}
-        
-        # Calculer le nombre total de livres par catégorie
-        livres_par_categorie = db.session.query(
-            Livre.categorie,
-            db.func.count(Livre.id).label('total_livres')
-        ).group_by(Livre.categorie).all()
-        
-        livres_dict = {categorie: count for categorie, count in livres_par_categorie}
-        
-        # Préparer les statistiques pour TOUTES les catégories
-        stats_categories = []
-        for categorie in toutes_categories:
-            emprunts_cat = emprunts_dict.get(categorie, 0)
-            total_livres_cat = livres_dict.get(categorie, 0)
-            
-            # Pourcentage d'emprunts dans cette catégorie
-            pourcentage_emprunts = round((emprunts_cat / max(emprunts_en_cours, 1)) * 100) if emprunts_en_cours > 0 else 0
-            
-            # Pourcentage de disponibilité par catégorie
-            livres_cat = Livre.query.filter_by(categorie=categorie).all()
-            livres_cat_ids = [l.id for l in livres_cat]
-            livres_dispo_cat = Livre.query.filter(
-                Livre.id.in_(livres_cat_ids),
-                Livre.disponible == True
-            ).count() if livres_cat_ids else 0
-            
-            pourcentage_dispo = round((livres_dispo_cat / max(total_livres_cat, 1)) * 100) if total_livres_cat > 0 else 100
-            
-            stats_categories.append({
-                'categorie': categorie,
-                'count_livres': total_livres_cat,
-                'count_emprunts': emprunts_cat,
-                'pourcentage_emprunts': pourcentage_emprunts,
-                'livres_disponibles': livres_dispo_cat,
-                'pourcentage_dispo': pourcentage_dispo
-            })
-        
-        # Trier par nombre d'emprunts décroissant
-        stats_categories.sort(key=lambda x: x['count_emprunts'], reverse=True)
-        
-        # Statistiques d'état de la collection
-        livres_empruntes = Livre.query.filter_by(disponible=False).count()
-        # Calculer les livres réservés (à adapter selon votre modèle)
-        livres_reserves = 0  # À remplacer par votre logique de réservation
-        
-        adherents_actifs = db.session.query(
-            Adherent,
-            db.func.count(Emprunt.id).label('total_emprunts')
-        ).join(Emprunt).filter(Emprunt.date_emprunt >= start).group_by(Adherent).order_by(db.text('total_emprunts DESC')).limit(5).all()
-        
-        stats_adherents = []
-        max_emprunts = max([total for _, total in adherents_actifs]) if adherents_actifs else 1
-        for adherent, total in adherents_actifs:
-            pourcentage = round((total / max_emprunts * 100))
-            stats_adherents.append({
-                'adherent': adherent,
-                'total': total,
-                'pourcentage': pourcentage
-            })
-        
-        # Livres les plus empruntés
-        top_books = db.session.query(
-            Livre,
-            db.func.count(Emprunt.id).label('count')
-        ).join(Emprunt).filter(Emprunt.date_emprunt >= start).group_by(Livre).order_by(db.text('count DESC')).limit(5).all()
-        
-        top_books_data = []
-        for livre, count in top_books:
-            top_books_data.append({
-                'titre': livre.titre,
-                'auteur': livre.auteur,
-                'count': count
-            })
-        
-        # Statistiques par jour
-        stats_days = []
-        if period == 'week':
-            for i in range(7):
-                day = start + timedelta(days=i)
-                count = Emprunt.query.filter(
-                    db.func.date(Emprunt.date_emprunt) == day.date()
-                ).count()
-                stats_days.append({
-                    'label': day.strftime('%a %d'),
-                    'bars': [{'width': min(count * 5, 100), 'color': 'var(--primary)', 'count': count}]
-                })
-        
-        # Calcul du taux de disponibilité global (en pourcentage)
-        if total_livres and total_livres > 0:
-            taux_disponibilite = round((livres_disponibles / total_livres) * 100, 1)
-        else:
-            taux_disponibilite = 100
-
-        return render_template("statistiques.html", 
+        if period not in STATS_PERIODES:
+            period = 'month'
+        return render_template("statistiques.html",
                      title="Statistiques",
                      is_admin=True,
-                     total_adherents=total_adherents,
-                     total_livres=total_livres,
-                     total_bibliothecaires=total_bibliothecaires,
-                     emprunts_en_cours=emprunts_en_cours,
-                     livres_disponibles=livres_disponibles,
-                     livres_empruntes=livres_empruntes,
-                     livres_reserves=livres_reserves,
-                     taux_disponibilite=taux_disponibilite,
-                     stats_categories=stats_categories,
-                     stats_adherents=stats_adherents,
-                     top_books=top_books_data,
-                     stats_days=stats_days if stats_days else None,
-                     period=period)
+                     period=period,
+                     **statistiques_en_cache(period))
 
     adherent_id_for_query = getattr(current_user, 'adherent_id', None) or current_user.id
 
@@ -2758,6 +5598,54 @@ def statistiques():
                          recent_emprunts=recent_emprunts)
 
 
+EXPORT_CHUNK_SIZE = 1000
+
+
+class _TamponFlux(io.RawIOBase):
+    """Destination non positionnable pour zipfile : accumule les octets écrits jusqu'à ce
+    que le générateur de la réponse les récupère."""
+
+    def __init__(self):
+        self._morceaux = []
+
+    def writable(self):
+        return True
+
+    def write(self, donnees):
+        self._morceaux.append(bytes(donnees))
+        return len(donnees)
+
+    def vider(self):
+        donnees = b''.join(self._morceaux)
+        self._morceaux.clear()
+        return donnees
+
+
+def _flux_zip_csv(fichiers):
+    """Génère une archive ZIP de fichiers CSV par morceaux.
+
+    `fichiers` : liste de (nom, en-têtes, requête select). Les lignes sont lues par paquets
+    de EXPORT_CHUNK_SIZE avec un curseur côté serveur (`yield_per`), encodées en CSV et
+    compressées au fil de l'eau : la mémoire utilisée ne dépend pas de la taille des tables.
+    """
+    tampon = _TamponFlux()
+    with zipfile.ZipFile(tampon, mode='w', compression=zipfile.ZIP_DEFLATED) as zf:
+        for nom, entetes, requete in fichiers:
+            with zf.open(nom, mode='w', force_zip64=True) as binaire:
+                texte = io.TextIOWrapper(binaire, encoding='utf-8', newline='')
+                writer = csv.writer(texte)
+                writer.writerow(entetes)
+                resultat = db.session.execute(requete.execution_options(yield_per=EXPORT_CHUNK_SIZE))
+                for lignes in resultat.partitions():
+                    writer.writerows(lignes)
+                    texte.flush()
+                    yield tampon.vider()
+                texte.flush()
+                texte.detach()
+            yield tampon.vider()
+    yield tampon.vider()
+
+
 @app.route('/dashboard/export_data')
 @login_required
 def export_data():
@@ -2765,73 +5653,365 @@ def export_data():
         flash('Accès non autorisé', 'danger')
         return redirect(url_for('dashboard'))
 
-    import csv, zipfile
-
-    mem_zip = io.BytesIO()
-    with zipfile.ZipFile(mem_zip, mode='w', compression=zipfile.ZIP_DEFLATED) as zf:
-        # Adherents
-        s = StringIO()
-        writer = csv.writer(s)
-        writer.writerow(['id', 'nom', 'prenom', 'email', 'telephone', 'classe', 'statut', 'date_inscription'])
-        for a in Adherent.query.all():
-            writer.writerow([a.id, a.nom, a.prenom, a.email, a.telephone, a.classe, a.statut, a.date_inscription])
-        zf.writestr('adherents.csv', s.getvalue())
-
-        # Livres
-        s = StringIO()
-        writer = csv.writer(s)
-        writer.writerow(['id', 'titre', 'auteur', 'isbn', 'annee_publication', 'categorie', 'disponible'])
-        for l in Livre.query.all():
-            writer.writerow([l.id, l.titre, l.auteur, l.isbn, l.annee_publication, l.categorie, l.disponible])
-        zf.writestr('livres.csv', s.getvalue())
-
-        # Emprunts
-        s = StringIO()
-        writer = csv.writer(s)
-        writer.writerow(['id', 'adherent_id', 'livre_id', 'date_emprunt', 'date_retour_prevue', 'date_retour_effective', 'status', 'prolongations', 'amende'])
-        for e in Emprunt.query.all():
-            writer.writerow([e.id, e.adherent_id, e.livre_id, e.date_emprunt, e.date_retour_prevue, e.date_retour_effective, e.status, e.prolongations, e.amende])
-        zf.writestr('emprunts.csv', s.getvalue())
-
-        # Reservations
-        s = StringIO()
-        writer = csv.writer(s)
-        writer.writerow(['id', 'adherent_id', 'livre_id', 'date_reservation', 'status'])
-        for r in Reservation.query.all():
-            writer.writerow([r.id, r.adherent_id, r.livre_id, r.date_reservation, r.status])
-        zf.writestr('reservations.csv', s.getvalue())
-
-    mem_zip.seek(0)
-    return Response(mem_zip.getvalue(), mimetype='application/zip', headers={
+    fichiers = [
+        ('adherents.csv',
+         ['id', 'nom', 'prenom', 'email', 'telephone', 'classe', 'statut', 'date_inscription'],
+         db.select(Adherent.id, Adherent.nom, Adherent.prenom, Adherent.email, Adherent.telephone,
+                   Adherent.classe, Adherent.statut, Adherent.date_inscription).order_by(Adherent.id)),
+        ('livres.csv',
+         ['id', 'titre', 'auteur', 'isbn', 'annee_publication', 'categorie', 'disponible'],
+         db.select(Livre.id, Livre.titre, Livre.auteur, Livre.isbn, Livre.annee_publication,
+                   Livre.categorie, Livre.disponible).order_by(Livre.id)),
+        ('emprunts.csv',
+         ['id', 'adherent_id', 'livre_id', 'date_emprunt', 'date_retour_prevue', 'date_retour_effective', 'status', 'prolongations', 'amende'],
+         db.select(Emprunt.id, Emprunt.adherent_id, Emprunt.livre_id, Emprunt.date_emprunt, Emprunt.date_retour_prevue,
+                   Emprunt.date_retour_effective, Emprunt.status, Emprunt.prolongations, Emprunt.amende).order_by(Emprunt.id)),
+        ('reservations.csv',
+         ['id', 'adherent_id', 'livre_id', 'date_reservation', 'status'],
+         db.select(Reservation.id, Reservation.adherent_id, Reservation.livre_id,
+                   Reservation.date_reservation, Reservation.status).order_by(Reservation.id)),
+    ]
+    return Response(stream_with_context(_flux_zip_csv(fichiers)), mimetype='application/zip', headers={
         'Content-Disposition': 'attachment; filename=bibliotheque_export.zip'
     })
 
 
+# ============================================
+# SAUVEGARDE ET RESTAURATION
+# ============================================
+# Format JSON Lines versionné :
+#   {"format": "bibliotheque-sauvegarde", "version": 2, "type": "complete", "jusqu_a": ...}
+#   {"table": "adherent", "colonnes": ["id", "nom", ...], "mode": "insertion"}
+#   [1, "Dupont", ...]                       (une ligne par enregistrement)
+#   ...
+#   {"fin": true, "lignes": {"adherent": 120, ...}}
+# Une sauvegarde incrémentale ("type": "incrementale", "depuis": {table: horodatage}) contient,
+# pour les tables suivies, les lignes modifiées (mode "maj") puis les identifiants supprimés
+# (mode "suppression") ; les autres tables, petites, y figurent en entier (mode "remplacement").
+# Dates et dates-heures sont écrites en ISO 8601 et reconverties d'après le type des colonnes.
+
+SAUVEGARDE_FORMAT = 'bibliotheque-sauvegarde'
+SAUVEGARDE_VERSION = 2
+RESTAURATION_BATCH = 5000
+# Ordre compatible avec les clés étrangères (parents d'abord)
+SAUVEGARDE_MODELES = (Adherent, Bibliothecaire, User, Livre, Emprunt, Reservation, Configuration)
+# Tables non sauvegardées qui référencent les livres ou les comptes : vidées avant une
+# restauration avec remplacement (l'index des PDF est ensuite reconstruit)
+SAUVEGARDE_DEPENDANTS = (PassagePdf, ExtractionPdf, TeleversementPdf, ImportAdherents)
+# Recouvrement appliqué aux filigranes : couvre les transactions encore ouvertes au moment
+# de la sauvegarde précédente (les lignes exportées deux fois sont simplement réécrites).
+SAUVEGARDE_MARGE = timedelta(minutes=5)
+
+
+def _json_sauvegarde(valeur):
+    if isinstance(valeur, (datetime, date)):
+        return valeur.isoformat()
+    if isinstance(valeur, Decimal):
+        return float(valeur)
+    raise TypeError(f'Valeur non sérialisable : {valeur!r}')
+
+
+def _ligne_json(objet):
+    return json.dumps(objet, default=_json_sauvegarde, ensure_ascii=False, separators=(',', ':')) + '\n'
+
+
+def _section_sauvegarde(nom, colonnes, requete, mode, compteurs):
+    yield _ligne_json({'table': nom, 'colonnes': colonnes, 'mode': mode})
+    resultat = db.session.execute(requete.execution_options(yield_per=EXPORT_CHUNK_SIZE))
+    total = 0
+    for lignes in resultat.partitions():
+        yield ''.join(_ligne_json(list(ligne)) for ligne in lignes)
+        total += len(lignes)
+    compteurs[f'{nom}:{mode}'] = total
+
+
+def lignes_sauvegarde(depuis=None, debut=None):
+    """Génère une sauvegarde ligne par ligne, en lisant chaque table par paquets.
+
+    Sans `depuis`, la sauvegarde est complète ; avec `depuis` ({table suivie: horodatage}),
+    elle est incrémentale et ne contient que les changements postérieurs à ces filigranes.
+    `debut` (par défaut maintenant) devient le filigrane de la sauvegarde produite.
+    """
+    debut = debut or datetime.utcnow()
+    entete = {'format': SAUVEGARDE_FORMAT, 'version': SAUVEGARDE_VERSION,
+              'type': 'complete' if depuis is None else 'incrementale',
+              'cree_le': debut, 'jusqu_a': debut}
+    if depuis is not None:
+        entete['depuis'] = depuis
+    yield _ligne_json(entete)
+
+    compteurs = {}
+    for modele in SAUVEGARDE_MODELES:
+        table = modele.__table__
+        requete = db.select(*table.columns).order_by(*table.primary_key.columns)
+        if depuis is None:
+            mode = 'insertion'
+        elif modele in MODELES_SUIVIS:
+            mode = 'maj'
+            requete = requete.where(table.c.date_modification >= depuis[table.name] - SAUVEGARDE_MARGE)
+        else:
+            mode = 'remplacement'
+        yield from _section_sauvegarde(table.name, [c.name for c in table.columns], requete, mode, compteurs)
+
+    if depuis is not None:
+        for modele in reversed(MODELES_SUIVIS):
+            nom = modele.__table__.name
+            requete = db.select(SuppressionJournal.ligne_id).where(
+                SuppressionJournal.table_nom == nom,
+                SuppressionJournal.date_suppression >= depuis[nom] - SAUVEGARDE_MARGE
+            ).distinct().order_by(SuppressionJournal.ligne_id)
+            yield from _section_sauvegarde(nom, ['id'], requete, 'suppression', compteurs)
+
+    yield _ligne_json({'fin': True, 'lignes': compteurs})
+
+
+def filigranes_sauvegarde():
+    """Filigranes des tables suivies ; None si aucune sauvegarde complète n'a été enregistrée."""
+    filigranes = {f.table_nom: f.horodatage for f in FiligraneSauvegarde.query.all()}
+    noms = [modele.__table__.name for modele in MODELES_SUIVIS]
+    if any(nom not in filigranes for nom in noms):
+        return None
+    return {nom: filigranes[nom] for nom in noms}
+
+
+def enregistrer_filigranes(debut, complete):
+    """Avance les filigranes après l'écriture réussie d'une sauvegarde ; après une sauvegarde
+    complète, purge le journal des suppressions qu'elle rend inutile."""
+    try:
+        for modele in MODELES_SUIVIS:
+            db.session.merge(FiligraneSauvegarde(table_nom=modele.__table__.name, horodatage=debut))
+        if complete:
+            SuppressionJournal.query.filter(
+                SuppressionJournal.date_suppression < debut - SAUVEGARDE_MARGE
+            ).delete(synchronize_session=False)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+
+def _decodeurs_colonnes(table, colonnes):
+    """Pour chaque colonne sauvegardée : (nom, conversion) ; None si la colonne n'existe plus."""
+    decodeurs = []
+    for nom in colonnes:
+        colonne = table.columns.get(nom)
+        if colonne is None:
+            decodeurs.append(None)
+        elif isinstance(colonne.type, db.DateTime):
+            decodeurs.append((nom, lambda v: datetime.fromisoformat(v) if v is not None else None))
+        elif isinstance(colonne.type, db.Date):
+            decodeurs.append((nom, lambda v: date.fromisoformat(v) if v is not None else None))
+        else:
+            decodeurs.append((nom, None))
+    return decodeurs
+
+
+def _differer_contraintes(actif):
+    """Désactive (ou réactive) la vérification immédiate des clés étrangères pour la transaction."""
+    dialect = db.engine.dialect.name
+    if dialect == 'mysql':
+        db.session.execute(text(f'SET FOREIGN_KEY_CHECKS = {0 if actif else 1}'))
+    elif dialect == 'sqlite' and actif:
+        db.session.execute(text('PRAGMA defer_foreign_keys = ON'))
+    elif dialect == 'postgresql' and actif:
+        db.session.execute(text('SET CONSTRAINTS ALL DEFERRED'))
+
+
+def _verifier_references(tables):
+    """Contrôle différé des clés étrangères : lève ValueError s'il existe des références orphelines."""
+    for table in tables:
+        for cle in table.foreign_keys:
+            enfant, parent = cle.parent, cle.column
+            orphelins = db.session.execute(
+                db.select(db.func.count()).select_from(table).where(
+                    enfant != None,
+                    ~db.exists().where(parent == enfant)
+                )
+            ).scalar()
+            if orphelins:
+                raise ValueError(f'{orphelins} référence(s) orpheline(s) dans {table.name}.{enfant.name}')
+
+
+def _apres_restauration():
+    """Caches et données dérivées à reconstruire après une restauration."""
+    invalidate_library_config()
+    invalidate_admin_exists()
+    get_search_backend().rebuild()
+    reconstruire_circulation()
+    planifier_rattrapage_pdf(forcer=True)
+
+
+def _lire_entete_sauvegarde(flux):
+    entete = json.loads(next(flux, '') or 'null')
+    if not isinstance(entete, dict) or entete.get('format') != SAUVEGARDE_FORMAT:
+        raise ValueError('Fichier de sauvegarde non reconnu')
+    if entete.get('version', 0) > SAUVEGARDE_VERSION:
+        raise ValueError(f"Version de sauvegarde {entete.get('version')} non prise en charge")
+    return entete
+
+
+def _ecrire_lot(table, mode, lot):
+    if mode in ('maj', 'suppression'):
+        ids = [enregistrement['id'] for enregistrement in lot]
+        db.session.execute(table.delete().where(table.c.id.in_(ids)))
+    if mode != 'suppression':
+        db.session.execute(table.insert(), lot)
+
+
+def _appliquer_sections(flux, tables, compteurs):
+    """Applique les sections d'une sauvegarde (après son en-tête) par lots de RESTAURATION_BATCH."""
+    table, mode, decodeurs, lot = None, None, None, []
+
+    def vider_lot():
+        if lot:
+            _ecrire_lot(table, mode, lot)
+            compteurs[table.name] = compteurs.get(table.name, 0) + len(lot)
+            lot.clear()
+
+    for ligne in flux:
+        if not ligne.strip():
+            continue
+        objet = json.loads(ligne)
+        if isinstance(objet, list):
+            if table is None:
+                raise ValueError('Enregistrement hors table')
+            enregistrement = {}
+            for decodeur, valeur in zip(decodeurs, objet):
+                if decodeur is not None:
+                    nom, conversion = decodeur
+                    enregistrement[nom] = conversion(valeur) if conversion else valeur
+            lot.append(enregistrement)
+            if len(lot) >= RESTAURATION_BATCH:
+                vider_lot()
+        elif objet.get('fin'):
+            vider_lot()
+            return
+        else:
+            vider_lot()
+            table = tables.get(objet['table'])
+            if table is None:
+                raise ValueError(f"Table inconnue : {objet['table']}")
+            mode = objet.get('mode', 'insertion')
+            if mode == 'remplacement':
+                db.session.execute(table.delete())
+            decodeurs = _decodeurs_colonnes(table, objet['colonnes'])
+    raise ValueError('Sauvegarde tronquée (marqueur de fin absent)')
+
+
+def restaurer_sauvegarde(flux_liste, remplacer=False):
+    """Restaure une chaîne de sauvegardes : une complète suivie d'incrémentales, dans l'ordre.
+
+    Chaque flux est un itérable de lignes JSON. Les enregistrements sont écrits par lots dans
+    une seule transaction, contraintes différées puis vérifiées à la fin. Avec `remplacer`,
+    les tables (et celles de SAUVEGARDE_DEPENDANTS) sont vidées au préalable ; sinon elles
+    doivent être vides. Une incrémentale dont les filigranes dépassent la fin de la sauvegarde
+    précédente (maillon manquant) est refusée. Retourne {table: lignes écrites}.
+    """
+    tables = {modele.__table__.name: modele.__table__ for modele in SAUVEGARDE_MODELES}
+    compteurs = {}
+    try:
+        _differer_contraintes(True)
+        if remplacer:
+            for modele in SAUVEGARDE_DEPENDANTS + tuple(reversed(SAUVEGARDE_MODELES)):
+                db.session.execute(modele.__table__.delete())
+        else:
+            for nom, t in tables.items():
+                if db.session.execute(db.select(db.func.count()).select_from(t)).scalar():
+                    raise ValueError(f'La table {nom} n\'est pas vide (utiliser --remplacer)')
+
+        fin_precedente = None
+        for position, flux in enumerate(flux_liste):
+            entete = _lire_entete_sauvegarde(flux)
+            if position == 0 and entete.get('type') != 'complete':
+                raise ValueError('Une restauration doit partir d\'une sauvegarde complète')
+            if position > 0:
+                if entete.get('type') != 'incrementale':
+                    raise ValueError('Seule la première sauvegarde de la chaîne peut être complète')
+                if fin_precedente is None:
+                    raise ValueError('La sauvegarde précédente ne porte pas de filigrane')
+                for nom, horodatage in entete['depuis'].items():
+                    if datetime.fromisoformat(horodatage) > fin_precedente:
+                        raise ValueError(f'Chaîne incomplète : il manque une sauvegarde avant celle n°{position + 1} ({nom})')
+            _appliquer_sections(flux, tables, compteurs)
+            fin_precedente = datetime.fromisoformat(entete['jusqu_a']) if entete.get('jusqu_a') else None
+
+        _verifier_references(tables.values())
+        _differer_contraintes(False)
+        if db.engine.dialect.name == 'postgresql':
+            for t in tables.values():
+                db.session.execute(text(
+                    f"SELECT setval(pg_get_serial_sequence('\"{t.name}\"', 'id'), "
+                    f"COALESCE((SELECT MAX(id) FROM \"{t.name}\"), 1))"
+                ))
+        db.session.commit()
+    except Exception:
+        # Réactiver les contrôles sur la même connexion avant qu'elle ne retourne au pool
+        try:
+            _differer_contraintes(False)
+        finally:
+            db.session.rollback()
+        raise
+
+    _apres_restauration()
+    return compteurs
+
+
 @app.route('/dashboard/download_backup')
 @login_required
 def download_backup():
-    if not has_roles('admin', 'bibliothecaire'):
+    # La sauvegarde complète contient les comptes (empreintes de mots de passe)
+    if not has_roles('admin'):
         flash('Accès non autorisé', 'danger')
         return redirect(url_for('dashboard'))
 
-    # Simple JSON backup of key tables
-    import json
-    data = {
-        'adherents': [
-            { 'id': a.id, 'nom': a.nom, 'prenom': a.prenom, 'email': a.email } for a in Adherent.query.all()
-        ],
-        'livres': [ { 'id': l.id, 'titre': l.titre, 'auteur': l.auteur } for l in Livre.query.all() ],
-        'emprunts': [ { 'id': e.id, 'adherent_id': e.adherent_id, 'livre_id': e.livre_id } for e in Emprunt.query.all() ]
-    }
-    payload = json.dumps(data, default=str, ensure_ascii=False)
-    return Response(payload, mimetype='application/json', headers={'Content-Disposition': 'attachment; filename=bibliotheque_backup.json'})
+    # Téléchargement ponctuel : n'avance pas les filigranes des sauvegardes planifiées
+    nom_fichier = f"bibliotheque_sauvegarde_{datetime.utcnow().strftime('%Y%m%d_%H%M%S')}.jsonl"
+    flux = (morceau.encode('utf-8') for morceau in lignes_sauvegarde())
+    return Response(stream_with_context(flux), mimetype='application/x-ndjson',
+                    headers={'Content-Disposition': f'attachment; filename={nom_fichier}'})
+
+
+@app.cli.command('sauvegarder')
+@click.argument('fichier', type=click.Path(dir_okay=False, writable=True))
+@click.option('--incrementale', is_flag=True, help='Seulement les changements depuis la dernière sauvegarde.')
+def sauvegarder_command(fichier, incrementale):
+    """Écrit une sauvegarde (JSON Lines) dans FICHIER et avance les filigranes."""
+    debut = datetime.utcnow()
+    depuis = None
+    if incrementale:
+        depuis = filigranes_sauvegarde()
+        if depuis is None:
+            raise click.ClickException('Aucune sauvegarde de référence : lancer d\'abord une sauvegarde complète')
+    temporaire = f'{fichier}.tmp'
+    with open(temporaire, 'w', encoding='utf-8') as f:
+        for morceau in lignes_sauvegarde(depuis=depuis, debut=debut):
+            f.write(morceau)
+    os.replace(temporaire, fichier)
+    enregistrer_filigranes(debut, complete=not incrementale)
+    print(f"Sauvegarde {'incrémentale' if incrementale else 'complète'} écrite dans {fichier}")
+
+
+@app.cli.command('restaurer')
+@click.argument('fichiers', nargs=-1, required=True, type=click.Path(exists=True, dir_okay=False))
+@click.option('--remplacer', is_flag=True, help='Vider les tables avant la restauration.')
+def restaurer_command(fichiers, remplacer):
+    """Restaure une sauvegarde complète puis, dans l'ordre, les incrémentales qui la suivent."""
+    ouverts = [open(fichier, encoding='utf-8') for fichier in fichiers]
+    try:
+        compteurs = restaurer_sauvegarde([iter(f) for f in ouverts], remplacer=remplacer)
+    finally:
+        for f in ouverts:
+            f.close()
+    for nom, total in compteurs.items():
+        print(f'{nom}: {total} ligne(s)')
+
 
 @app.route("/dashboard/parametres", methods=["GET", "POST"])
 @login_required
 def parametres():
     # Gestion POST pour sauvegarder la configuration
-    cfg = get_library_config()
     if request.method == 'POST':
+        cfg = get_configuration_row()
         try:
             max_emprunts = int(request.form.get('max_emprunts') or cfg.max_emprunts)
             duree_emprunt = int(request.form.get('duree_emprunt') or cfg.duree_emprunt)
@@ -2845,6 +6025,12 @@ def parametres():
             cfg.jours_prolongation = jours_prolongation
             cfg.amende_par_jour = amende_par_jour
             db.session.commit()
+            invalidate_library_config()
+            # Le tarif a pu changer : répercuter sur les amendes en cours
+            try:
+                recalculer_amendes()
+            except Exception:
+                current_app.logger.exception('Erreur recalcul amendes après sauvegarde paramètres')
             flash('Paramètres sauvegardés', 'success')
         except Exception:
             db.session.rollback()
@@ -2852,6 +6038,7 @@ def parametres():
             flash('Erreur lors de la sauvegarde des paramètres', 'danger')
         return redirect(url_for('parametres'))
 
+    cfg = get_library_config()
     library_settings = {
         'max_emprunts': cfg.max_emprunts,
         'duree_emprunt': cfg.duree_emprunt,
@@ -2885,6 +6072,22 @@ def parametres():
                            adherents=adherents)
 
 
+@app.route('/dashboard/amendes/recalculer', methods=['POST'])
+@login_required
+def recalculer_amendes_route():
+    if not has_roles('admin', 'bibliothecaire'):
+        flash('Accès non autorisé', 'danger')
+        return redirect(url_for('dashboard'))
+
+    try:
+        updated = recalculer_amendes()
+        flash(f'Amendes recalculées ({updated} emprunt(s) mis à jour)', 'success')
+    except Exception:
+        current_app.logger.exception('Erreur lors du recalcul des amendes')
+        flash('Erreur lors du recalcul des amendes', 'danger')
+    return redirect(request.referrer or url_for('parametres'))
+
+
 @app.route('/dashboard/parametres/delete_all_non_admins', methods=['POST'])
 @login_required
 def delete_all_non_admins():
@@ -3080,25 +6283,14 @@ def upload_image():
         flash("Format non autorisé. Utilisez PNG/JPG/JPEG/GIF/WEBP.", "danger")
         return redirect(url_for("parametres") + '#profil')
 
-    unique_name = f"{uuid.uuid4().hex}_{filename}"
-    profile_folder = app.config.get('PROFILE_FOLDER', PROFILE_FOLDER)
-    os.makedirs(profile_folder, exist_ok=True)
-    file_path = os.path.join(profile_folder, unique_name)
-
     try:
-        file.save(file_path)
+        nom = stocker_fichier(file, app.config.get('PROFILE_FOLDER', PROFILE_FOLDER), ext)
 
         old = current_user.image
-        if old and old != unique_name:
-            try:
-                old_path = os.path.join(profile_folder, old)
-                if os.path.exists(old_path):
-                    os.remove(old_path)
-            except Exception:
-                current_app.logger.exception("Impossible de supprimer l'ancienne image de profil")
-
-        current_user.image = unique_name
+        current_user.image = nom
         db.session.commit()
+        if old and old != nom:
+            supprimer_fichier_orphelin('PROFILE_FOLDER', old)
         flash("Photo de profil mise à jour", "success")
     except Exception:
         db.session.rollback()
@@ -3147,7 +6339,11 @@ def delete_account():
 @app.context_processor
 def inject_variables():
     """Injecte des variables utiles dans tous les templates"""
-    admin_exists = User.query.filter_by(role='admin').first() is not None
+    try:
+        admin_exists = get_admin_exists()
+    except Exception:
+        current_app.logger.exception('Erreur lecture état administrateur')
+        admin_exists = True
     return dict(
         admin_exists=admin_exists,
         current_year=datetime.now().year
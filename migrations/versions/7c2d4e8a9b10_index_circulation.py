@@ -0,0 +1,64 @@
+"""Composite indexes for circulation hot paths
+
+Revision ID: 7c2d4e8a9b10
+Revises: 49f3c9f85412
+Create Date: 2026-10-18 09:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7c2d4e8a9b10'
+down_revision = '49f3c9f85412'
+branch_labels = None
+depends_on = None
+
+
+def _index_existe(table, nom):
+    # main.py crée déjà les index au démarrage (db.create_all)
+    return nom in {ix['name'] for ix in sa.inspect(op.get_bind()).get_indexes(table)}
+
+
+def upgrade():
+    with op.batch_alter_table('emprunt', schema=None) as batch_op:
+        if not _index_existe('emprunt', 'ix_emprunt_adherent_retour'):
+            batch_op.create_index('ix_emprunt_adherent_retour', ['adherent_id', 'date_retour_effective', 'date_retour_prevue'], unique=False)
+        if not _index_existe('emprunt', 'ix_emprunt_livre_retour'):
+            batch_op.create_index('ix_emprunt_livre_retour', ['livre_id', 'date_retour_effective'], unique=False)
+        if not _index_existe('emprunt', 'ix_emprunt_retour_prevue'):
+            batch_op.create_index('ix_emprunt_retour_prevue', ['date_retour_effective', 'date_retour_prevue'], unique=False)
+        if not _index_existe('emprunt', 'ix_emprunt_date_emprunt'):
+            batch_op.create_index('ix_emprunt_date_emprunt', ['date_emprunt'], unique=False)
+
+    with op.batch_alter_table('reservation', schema=None) as batch_op:
+        if not _index_existe('reservation', 'ix_reservation_status_date'):
+            batch_op.create_index('ix_reservation_status_date', ['status', 'date_reservation'], unique=False)
+        if not _index_existe('reservation', 'ix_reservation_adherent_livre_status'):
+            batch_op.create_index('ix_reservation_adherent_livre_status', ['adherent_id', 'livre_id', 'status'], unique=False)
+
+    with op.batch_alter_table('livre', schema=None) as batch_op:
+        if not _index_existe('livre', 'ix_livre_titre_id'):
+            batch_op.create_index('ix_livre_titre_id', ['titre', 'id'], unique=False)
+        if not _index_existe('livre', 'ix_livre_disponible_titre'):
+            batch_op.create_index('ix_livre_disponible_titre', ['disponible', 'titre', 'id'], unique=False)
+        if not _index_existe('livre', 'ix_livre_categorie_titre'):
+            batch_op.create_index('ix_livre_categorie_titre', ['categorie', 'titre', 'id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('livre', schema=None) as batch_op:
+        batch_op.drop_index('ix_livre_categorie_titre')
+        batch_op.drop_index('ix_livre_disponible_titre')
+        batch_op.drop_index('ix_livre_titre_id')
+
+    with op.batch_alter_table('reservation', schema=None) as batch_op:
+        batch_op.drop_index('ix_reservation_adherent_livre_status')
+        batch_op.drop_index('ix_reservation_status_date')
+
+    with op.batch_alter_table('emprunt', schema=None) as batch_op:
+        batch_op.drop_index('ix_emprunt_date_emprunt')
+        batch_op.drop_index('ix_emprunt_retour_prevue')
+        batch_op.drop_index('ix_emprunt_livre_retour')
+        batch_op.drop_index('ix_emprunt_adherent_retour')
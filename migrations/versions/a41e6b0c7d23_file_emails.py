@@ -0,0 +1,53 @@
+"""Outbound mail queue table
+
+Revision ID: a41e6b0c7d23
+Revises: 7c2d4e8a9b10
+Create Date: 2026-10-18 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a41e6b0c7d23'
+down_revision = '7c2d4e8a9b10'
+branch_labels = None
+depends_on = None
+
+
+def _table_existe(nom):
+    # main.py crée déjà les tables au démarrage (db.create_all)
+    return sa.inspect(op.get_bind()).has_table(nom)
+
+
+def _index_existe(table, nom):
+    return nom in {ix['name'] for ix in sa.inspect(op.get_bind()).get_indexes(table)}
+
+
+def upgrade():
+    if not _table_existe('email_en_attente'):
+        op.create_table('email_en_attente',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('destinataire', sa.String(length=120), nullable=False),
+        sa.Column('sujet', sa.String(length=255), nullable=False),
+        sa.Column('corps', sa.Text(), nullable=False),
+        sa.Column('reply_to', sa.String(length=120), nullable=True),
+        sa.Column('status', sa.String(length=20), nullable=False),
+        sa.Column('tentatives', sa.Integer(), nullable=True),
+        sa.Column('derniere_erreur', sa.Text(), nullable=True),
+        sa.Column('date_creation', sa.DateTime(), nullable=True),
+        sa.Column('prochain_essai', sa.DateTime(), nullable=True),
+        sa.Column('date_envoi', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+        )
+    with op.batch_alter_table('email_en_attente', schema=None) as batch_op:
+        if not _index_existe('email_en_attente', 'ix_email_status_essai'):
+            batch_op.create_index('ix_email_status_essai', ['status', 'prochain_essai'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('email_en_attente', schema=None) as batch_op:
+        batch_op.drop_index('ix_email_status_essai')
+
+    op.drop_table('email_en_attente')
@@ -0,0 +1,32 @@
+"""Claim marker for chunked upload blocks
+
+Revision ID: a8c5f2d7e391
+Revises: f2a9c4e6d813
+Create Date: 2026-10-18 18:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a8c5f2d7e391'
+down_revision = 'f2a9c4e6d813'
+branch_labels = None
+depends_on = None
+
+
+def _colonne_existe(table, nom):
+    # main.py crée déjà les tables au démarrage (db.create_all)
+    return nom in {c['name'] for c in sa.inspect(op.get_bind()).get_columns(table)}
+
+
+def upgrade():
+    if not _colonne_existe('televersement_pdf', 'ecriture_depuis'):
+        with op.batch_alter_table('televersement_pdf', schema=None) as batch_op:
+            batch_op.add_column(sa.Column('ecriture_depuis', sa.DateTime(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('televersement_pdf', schema=None) as batch_op:
+        batch_op.drop_column('ecriture_depuis')
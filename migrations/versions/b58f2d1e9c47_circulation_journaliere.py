@@ -0,0 +1,53 @@
+"""Daily circulation rollup table
+
+Revision ID: b58f2d1e9c47
+Revises: a41e6b0c7d23
+Create Date: 2026-10-18 11:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b58f2d1e9c47'
+down_revision = 'a41e6b0c7d23'
+branch_labels = None
+depends_on = None
+
+
+def _table_existe(nom):
+    # main.py crée déjà les tables au démarrage (db.create_all)
+    return sa.inspect(op.get_bind()).has_table(nom)
+
+
+def _index_existe(table, nom):
+    return nom in {ix['name'] for ix in sa.inspect(op.get_bind()).get_indexes(table)}
+
+
+def upgrade():
+    if not _table_existe('circulation_journaliere'):
+        op.create_table('circulation_journaliere',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('jour', sa.Date(), nullable=False),
+        sa.Column('categorie', sa.String(length=50), nullable=False),
+        sa.Column('livre_id', sa.Integer(), nullable=False),
+        sa.Column('classe', sa.String(length=50), nullable=False),
+        sa.Column('nb_emprunts', sa.Integer(), nullable=False),
+        sa.Column('nb_retours', sa.Integer(), nullable=False),
+        sa.Column('nb_retards', sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('jour', 'categorie', 'livre_id', 'classe', name='uq_circulation_cle')
+        )
+    with op.batch_alter_table('circulation_journaliere', schema=None) as batch_op:
+        if not _index_existe('circulation_journaliere', 'ix_circulation_livre_jour'):
+            batch_op.create_index('ix_circulation_livre_jour', ['livre_id', 'jour'], unique=False)
+
+    # Remplir la table avec `flask reconstruire-circulation` après la migration
+
+
+def downgrade():
+    with op.batch_alter_table('circulation_journaliere', schema=None) as batch_op:
+        batch_op.drop_index('ix_circulation_livre_jour')
+
+    op.drop_table('circulation_journaliere')
@@ -0,0 +1,80 @@
+"""Change tracking for incremental backups
+
+Revision ID: c7a93e5f1b02
+Revises: b58f2d1e9c47
+Create Date: 2026-10-18 12:00:00.000000
+
+"""
+from datetime import datetime
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c7a93e5f1b02'
+down_revision = 'b58f2d1e9c47'
+branch_labels = None
+depends_on = None
+
+TABLES_SUIVIES = ('adherent', 'livre', 'emprunt', 'reservation')
+
+
+def _table_existe(nom):
+    # main.py crée déjà les tables et la colonne au démarrage
+    return sa.inspect(op.get_bind()).has_table(nom)
+
+
+def _colonne_existe(table, nom):
+    return nom in {c['name'] for c in sa.inspect(op.get_bind()).get_columns(table)}
+
+
+def _index_existe(table, nom):
+    return nom in {ix['name'] for ix in sa.inspect(op.get_bind()).get_indexes(table)}
+
+
+def upgrade():
+    for table in TABLES_SUIVIES:
+        nouvelle_colonne = not _colonne_existe(table, 'date_modification')
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            if nouvelle_colonne:
+                batch_op.add_column(sa.Column('date_modification', sa.DateTime(), nullable=True))
+            if not _index_existe(table, f'ix_{table}_date_modification'):
+                batch_op.create_index(f'ix_{table}_date_modification', ['date_modification'], unique=False)
+        # Ne pas écraser les dates déjà suivies par l'application
+        if nouvelle_colonne:
+            op.execute(
+                sa.table(table, sa.column('date_modification', sa.DateTime()))
+                .update().values(date_modification=datetime.utcnow())
+            )
+
+    if not _table_existe('filigrane_sauvegarde'):
+        op.create_table('filigrane_sauvegarde',
+        sa.Column('table_nom', sa.String(length=50), nullable=False),
+        sa.Column('horodatage', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('table_nom')
+        )
+    if not _table_existe('suppression_journal'):
+        op.create_table('suppression_journal',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('table_nom', sa.String(length=50), nullable=False),
+        sa.Column('ligne_id', sa.Integer(), nullable=False),
+        sa.Column('date_suppression', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('id')
+        )
+    with op.batch_alter_table('suppression_journal', schema=None) as batch_op:
+        if not _index_existe('suppression_journal', 'ix_suppression_table_date'):
+            batch_op.create_index('ix_suppression_table_date', ['table_nom', 'date_suppression'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('suppression_journal', schema=None) as batch_op:
+        batch_op.drop_index('ix_suppression_table_date')
+
+    op.drop_table('suppression_journal')
+    op.drop_table('filigrane_sauvegarde')
+
+    for table in reversed(TABLES_SUIVIES):
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.drop_index(f'ix_{table}_date_modification')
+            batch_op.drop_column('date_modification')
@@ -0,0 +1,76 @@
+"""Full-text extraction of book PDFs
+
+Revision ID: d3e81f4a6c25
+Revises: c7a93e5f1b02
+Create Date: 2026-10-18 15:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd3e81f4a6c25'
+down_revision = 'c7a93e5f1b02'
+branch_labels = None
+depends_on = None
+
+
+def _table_existe(nom):
+    # main.py crée déjà les tables au démarrage (db.create_all)
+    return sa.inspect(op.get_bind()).has_table(nom)
+
+
+def _index_existe(table, nom):
+    return nom in {ix['name'] for ix in sa.inspect(op.get_bind()).get_indexes(table)}
+
+
+def upgrade():
+    if not _table_existe('extraction_pdf'):
+        op.create_table('extraction_pdf',
+        sa.Column('livre_id', sa.Integer(), nullable=False),
+        sa.Column('fichier', sa.String(length=255), nullable=False),
+        sa.Column('status', sa.String(length=20), nullable=False),
+        sa.Column('tentatives', sa.Integer(), nullable=True),
+        sa.Column('nb_pages', sa.Integer(), nullable=True),
+        sa.Column('nb_passages', sa.Integer(), nullable=True),
+        sa.Column('derniere_erreur', sa.Text(), nullable=True),
+        sa.Column('date_demande', sa.DateTime(), nullable=True),
+        sa.Column('date_traitement', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['livre_id'], ['livre.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('livre_id')
+        )
+    with op.batch_alter_table('extraction_pdf', schema=None) as batch_op:
+        if not _index_existe('extraction_pdf', 'ix_extraction_pdf_status'):
+            batch_op.create_index('ix_extraction_pdf_status', ['status', 'date_demande'], unique=False)
+
+    if not _table_existe('passage_pdf'):
+        op.create_table('passage_pdf',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('livre_id', sa.Integer(), nullable=False),
+        sa.Column('page', sa.Integer(), nullable=False),
+        sa.Column('position', sa.Integer(), nullable=False),
+        sa.Column('texte', sa.Text(), nullable=False),
+        sa.Column('texte_normalise', sa.Text(), nullable=False),
+        sa.ForeignKeyConstraint(['livre_id'], ['livre.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id')
+        )
+    with op.batch_alter_table('passage_pdf', schema=None) as batch_op:
+        if not _index_existe('passage_pdf', 'ix_passage_pdf_livre_page'):
+            batch_op.create_index('ix_passage_pdf_livre_page', ['livre_id', 'page', 'position'], unique=False)
+
+    if op.get_bind().dialect.name == 'mysql' and not _index_existe('passage_pdf', 'ft_passage_pdf'):
+        op.execute('ALTER TABLE passage_pdf ADD FULLTEXT INDEX ft_passage_pdf (texte)')
+
+    # Indexer les PDF existants avec `flask indexer-pdf --rattrapage` après la migration
+
+
+def downgrade():
+    with op.batch_alter_table('passage_pdf', schema=None) as batch_op:
+        batch_op.drop_index('ix_passage_pdf_livre_page')
+
+    op.drop_table('passage_pdf')
+    with op.batch_alter_table('extraction_pdf', schema=None) as batch_op:
+        batch_op.drop_index('ix_extraction_pdf_status')
+
+    op.drop_table('extraction_pdf')
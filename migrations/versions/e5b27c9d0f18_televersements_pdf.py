@@ -0,0 +1,53 @@
+"""Chunked, resumable PDF uploads
+
+Revision ID: e5b27c9d0f18
+Revises: d3e81f4a6c25
+Create Date: 2026-10-18 16:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e5b27c9d0f18'
+down_revision = 'd3e81f4a6c25'
+branch_labels = None
+depends_on = None
+
+
+def _table_existe(nom):
+    # main.py crée déjà les tables au démarrage (db.create_all)
+    return sa.inspect(op.get_bind()).has_table(nom)
+
+
+def _index_existe(table, nom):
+    return nom in {ix['name'] for ix in sa.inspect(op.get_bind()).get_indexes(table)}
+
+
+def upgrade():
+    if not _table_existe('televersement_pdf'):
+        op.create_table('televersement_pdf',
+        sa.Column('id', sa.String(length=32), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('nom_original', sa.String(length=255), nullable=True),
+        sa.Column('taille', sa.BigInteger(), nullable=False),
+        sa.Column('recu', sa.BigInteger(), nullable=False),
+        sa.Column('sha256', sa.String(length=64), nullable=True),
+        sa.Column('status', sa.String(length=20), nullable=False),
+        sa.Column('fichier', sa.String(length=255), nullable=True),
+        sa.Column('date_creation', sa.DateTime(), nullable=True),
+        sa.Column('date_maj', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+        sa.PrimaryKeyConstraint('id')
+        )
+    with op.batch_alter_table('televersement_pdf', schema=None) as batch_op:
+        if not _index_existe('televersement_pdf', 'ix_televersement_status_maj'):
+            batch_op.create_index('ix_televersement_status_maj', ['status', 'date_maj'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('televersement_pdf', schema=None) as batch_op:
+        batch_op.drop_index('ix_televersement_status_maj')
+
+    op.drop_table('televersement_pdf')
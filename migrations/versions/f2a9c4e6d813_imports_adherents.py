@@ -0,0 +1,59 @@
+"""Queued member imports
+
+Revision ID: f2a9c4e6d813
+Revises: e5b27c9d0f18
+Create Date: 2026-10-18 17:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f2a9c4e6d813'
+down_revision = 'e5b27c9d0f18'
+branch_labels = None
+depends_on = None
+
+
+def _table_existe(nom):
+    # main.py crée déjà les tables au démarrage (db.create_all)
+    return sa.inspect(op.get_bind()).has_table(nom)
+
+
+def _index_existe(table, nom):
+    return nom in {ix['name'] for ix in sa.inspect(op.get_bind()).get_indexes(table)}
+
+
+def upgrade():
+    if not _table_existe('import_adherents'):
+        op.create_table('import_adherents',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('fichier', sa.String(length=255), nullable=False),
+        sa.Column('nom_original', sa.String(length=255), nullable=True),
+        sa.Column('creer_comptes', sa.Boolean(), nullable=False),
+        sa.Column('classe_defaut', sa.String(length=50), nullable=True),
+        sa.Column('status', sa.String(length=20), nullable=False),
+        sa.Column('lues', sa.Integer(), nullable=True),
+        sa.Column('importees', sa.Integer(), nullable=True),
+        sa.Column('doublons', sa.Integer(), nullable=True),
+        sa.Column('nb_erreurs', sa.Integer(), nullable=True),
+        sa.Column('erreurs', sa.Text(), nullable=True),
+        sa.Column('derniere_erreur', sa.Text(), nullable=True),
+        sa.Column('date_demande', sa.DateTime(), nullable=True),
+        sa.Column('date_debut', sa.DateTime(), nullable=True),
+        sa.Column('date_fin', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+        sa.PrimaryKeyConstraint('id')
+        )
+    with op.batch_alter_table('import_adherents', schema=None) as batch_op:
+        if not _index_existe('import_adherents', 'ix_import_adherents_status'):
+            batch_op.create_index('ix_import_adherents_status', ['status', 'date_demande'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('import_adherents', schema=None) as batch_op:
+        batch_op.drop_index('ix_import_adherents_status')
+
+    op.drop_table('import_adherents')
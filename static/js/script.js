@@ -12,6 +12,7 @@ document.addEventListener('DOMContentLoaded', function () {
     initializeButtonLoaders();
     initializeServiceIcons();
     initializeDashboardIcons();
+    initializeLazySelects();
 
     console.log('✅ Scripts initialisés avec succès');
 });
@@ -250,4 +251,30 @@ window.App = {
             button.innerHTML = originalText;
         }
     }
-};
\ No newline at end of file
+};
+
+/* ===== LISTES DÉROULANTES CHARGÉES À L'OUVERTURE DES MODALS ===== */
+function initializeLazySelects() {
+    // Les options (adhérents, livres disponibles) ne sont demandées au serveur
+    // qu'à la première ouverture du modal qui contient la liste.
+    document.querySelectorAll('select[data-choix-url]').forEach(select => {
+        const modal = select.closest('.modal');
+        const load = () => {
+            if (select.dataset.loaded) return;
+            select.dataset.loaded = '1';
+            fetch(select.dataset.choixUrl)
+                .then(response => response.json())
+                .then(data => {
+                    (data.options || []).forEach(option => {
+                        select.add(new Option(option.label, option.id));
+                    });
+                })
+                .catch(() => { delete select.dataset.loaded; });
+        };
+        if (modal) {
+            modal.addEventListener('show.bs.modal', load);
+        } else {
+            load();
+        }
+    });
+}
@@ -0,0 +1,45 @@
+import os
+import tempfile
+
+import pytest
+
+pytest.importorskip('flask_sqlalchemy')
+
+
+@pytest.fixture(scope='module')
+def main():
+    base = os.path.join(tempfile.mkdtemp(), 'bibliotheque.db')
+    os.environ.setdefault('DATABASE_URL', f'sqlite:///{base}')
+    os.environ.setdefault('MAIL_QUEUE_WORKER', 'externe')
+    os.environ.setdefault('IMPORT_ADHERENTS_WORKER', 'externe')
+    import main as module
+    with module.app.app_context():
+        yield module
+
+
+def test_import_en_file_traite_par_le_worker(main):
+    db = main.db
+    admin = main.User(username='import_admin', email='import_admin@example.org', role='admin', confirmed=True)
+    admin.set_password('secret')
+    db.session.add(admin)
+    db.session.commit()
+
+    os.makedirs(main.IMPORTS_FOLDER, exist_ok=True)
+    with open(os.path.join(main.IMPORTS_FOLDER, 'test.csv'), 'w', encoding='utf-8') as f:
+        f.write('nom,prenom,email\nDiallo,Fatou,fatou@example.org\nSow,Ali,pas-un-email\n')
+    db.session.add(main.ImportAdherents(user_id=admin.id, fichier='test.csv', creer_comptes=True))
+    db.session.commit()
+
+    assert main.traiter_imports_en_attente() == 1
+
+    tache = main.ImportAdherents.query.one()
+    assert tache.status == 'termine'
+    assert (tache.lues, tache.importees, tache.nb_erreurs) == (2, 1, 1)
+    assert tache.liste_erreurs()[0][0] == 3
+    assert main.User.query.filter_by(email='fatou@example.org').one().confirmed is False
+    assert not os.path.exists(os.path.join(main.IMPORTS_FOLDER, 'test.csv'))
+
+    # Base partagée avec les autres modules de test
+    for modele in (main.ImportAdherents, main.EmailEnAttente, main.User, main.Adherent):
+        db.session.query(modele).delete()
+    db.session.commit()
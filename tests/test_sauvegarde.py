@@ -0,0 +1,70 @@
+import os
+import tempfile
+from datetime import datetime, timedelta
+
+import pytest
+
+pytest.importorskip('flask_sqlalchemy')
+
+
+@pytest.fixture(scope='module')
+def main():
+    base = os.path.join(tempfile.mkdtemp(), 'bibliotheque.db')
+    os.environ['DATABASE_URL'] = f'sqlite:///{base}'
+    os.environ.setdefault('MAIL_QUEUE_WORKER', 'externe')
+    import main as module
+    with module.app.app_context():
+        yield module
+
+
+def test_restauration_apres_suppression_adherent_avec_emprunts(main):
+    db = main.db
+    adherent = main.Adherent(nom='Dupont', prenom='Awa', email='awa@example.org')
+    livre = main.Livre(titre='Les Misérables', auteur='Victor Hugo')
+    db.session.add_all([adherent, livre])
+    db.session.flush()
+    db.session.add_all([
+        main.Emprunt(adherent_id=adherent.id, livre_id=livre.id,
+                     date_retour_prevue=datetime.utcnow() + timedelta(days=14)),
+        main.Reservation(adherent_id=adherent.id, livre_id=livre.id),
+    ])
+    db.session.commit()
+
+    debut = datetime.utcnow()
+    complete = list(main.lignes_sauvegarde(debut=debut))
+    main.enregistrer_filigranes(debut, complete=True)
+
+    # Même séquence que delete_adherent : suppressions en masse puis l'adhérent
+    db.session.query(main.Emprunt).filter(main.Emprunt.adherent_id == adherent.id).delete(synchronize_session=False)
+    db.session.query(main.Reservation).filter(main.Reservation.adherent_id == adherent.id).delete(synchronize_session=False)
+    db.session.delete(adherent)
+    db.session.commit()
+
+    journal = {(s.table_nom, s.ligne_id) for s in main.SuppressionJournal.query.all()}
+    assert {t for t, _ in journal} >= {'adherent', 'emprunt', 'reservation'}
+
+    incrementale = list(main.lignes_sauvegarde(depuis=main.filigranes_sauvegarde()))
+    compteurs = main.restaurer_sauvegarde([iter(complete), iter(incrementale)], remplacer=True)
+
+    assert compteurs
+    assert main.Adherent.query.count() == 0
+    assert main.Emprunt.query.count() == 0
+    assert main.Reservation.query.count() == 0
+    assert main.Livre.query.count() == 1
+
+
+def test_restauration_remplacer_vide_les_passages_pdf(main):
+    db = main.db
+    livre = main.Livre(titre='Germinal', auteur='Émile Zola')
+    db.session.add(livre)
+    db.session.flush()
+    db.session.add(main.PassagePdf(livre_id=livre.id, page=1, position=0,
+                                   texte='Au milieu de la plaine rase', texte_normalise='au milieu de la plaine rase'))
+    db.session.commit()
+
+    # Relue comme depuis un fichier : une ligne JSON par élément
+    complete = ''.join(main.lignes_sauvegarde()).splitlines(keepends=True)
+    main.restaurer_sauvegarde([iter(complete)], remplacer=True)
+
+    assert main.PassagePdf.query.count() == 0
+    assert main.Livre.query.filter_by(titre='Germinal').count() == 1